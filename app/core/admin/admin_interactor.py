@@ -1,8 +1,16 @@
+import time
 from dataclasses import dataclass
-from typing import Optional, Protocol
+from typing import Callable, FrozenSet, List, Optional, Protocol
 
-from app.core.admin.admin_repository import IAdminRepository
-from app.core.entities import Response, StatisticsInfo
+from app.core.admin.admin_repository import BUCKET_WIDTHS, IAdminRepository
+from app.core.cache_version import CACHE_NAMES
+from app.core.entities import Response, StatisticsBucket, StatisticsInfo
+from app.core.profiling import IProfiler, RequestProfiler, RouteProfile
+
+DEFAULT_BUCKET_COUNT = 60
+MAX_BUCKET_COUNT = 1440
+MAX_PROFILE_SECONDS = 60.0
+MAX_PROFILED_REQUESTS = 1000
 
 
 @dataclass
@@ -15,32 +23,264 @@ class StatisticsResponse(Response):
     statistics_info: Optional[StatisticsInfo]
 
 
+@dataclass
+class TimeSeriesRequest:
+    api_key: str
+    granularity: str = "hour"
+    wallet_address: Optional[str] = None
+    user_email: Optional[str] = None
+    since: Optional[int] = None
+    until: Optional[int] = None
+
+
+@dataclass
+class TimeSeriesResponse(Response):
+    buckets: Optional[List[StatisticsBucket]]
+
+
+@dataclass
+class ProfileRequest:
+    api_key: str
+    seconds: float = 10.0
+
+
+@dataclass
+class ProfileResponse(Response):
+    collapsed_stacks: Optional[str]
+
+
+@dataclass
+class RequestProfileRequest:
+    api_key: str
+    # method and path template, e.g. "POST /transactions"
+    route: str
+    count: int = 10
+    # routes that can be profiled, checked once the key is; None for any
+    known_routes: Optional[FrozenSet[str]] = None
+
+
+@dataclass
+class RequestProfilesResponse(Response):
+    profiles: Optional[List[RouteProfile]]
+
+
 class IAdminInteractor(Protocol):
     def get_statistics(self, request: StatisticsRequest) -> StatisticsResponse:
         pass
 
+    def reconcile_statistics(self, request: StatisticsRequest) -> StatisticsResponse:
+        pass
+
+    def get_time_series(self, request: TimeSeriesRequest) -> TimeSeriesResponse:
+        pass
+
+    def invalidate_caches(self, request: StatisticsRequest) -> Response:
+        pass
+
+    def profile(self, request: ProfileRequest) -> ProfileResponse:
+        pass
+
+    def profile_requests(self, request: RequestProfileRequest) -> Response:
+        pass
+
+    def get_request_profiles(
+        self, request: StatisticsRequest
+    ) -> RequestProfilesResponse:
+        pass
+
 
 class AdminInteractor:
     __admin_key = "Stephane27"
 
-    def __init__(self, admin_repository: IAdminRepository):
+    def __init__(
+        self,
+        admin_repository: IAdminRepository,
+        clock: Callable[[], float] = time.time,
+        profiler: Optional[IProfiler] = None,
+        request_profiler: Optional[RequestProfiler] = None,
+    ):
         self.admin_repository = admin_repository
+        self.clock = clock
+        self.profiler = profiler
+        self.request_profiler = request_profiler
 
     def get_statistics(self, request: StatisticsRequest) -> StatisticsResponse:
         if request.api_key != self.__admin_key:
-            return StatisticsResponse(
+            return self.__invalid_api_key()
+
+        return StatisticsResponse(
+            success=True,
+            message="OK",
+            status_code=200,
+            statistics_info=self.admin_repository.get_statistics(),
+        )
+
+    def reconcile_statistics(self, request: StatisticsRequest) -> StatisticsResponse:
+        if request.api_key != self.__admin_key:
+            return self.__invalid_api_key()
+
+        return StatisticsResponse(
+            success=True,
+            message="Statistics reconciled with the ledger",
+            status_code=200,
+            statistics_info=self.admin_repository.reconcile_statistics(),
+        )
+
+    def get_time_series(self, request: TimeSeriesRequest) -> TimeSeriesResponse:
+        if request.api_key != self.__admin_key:
+            return TimeSeriesResponse(
                 success=False,
                 message="Invalid API key",
                 status_code=401,
-                statistics_info=None,
+                buckets=None,
             )
 
-        all_transactions = self.admin_repository.fetch_all_transactions()
-        transaction_count = len(all_transactions)
-        profit = sum([t.btc_amount * t.fee_pct for t in all_transactions])
-        return StatisticsResponse(
+        width = BUCKET_WIDTHS.get(request.granularity)
+        if width is None:
+            return TimeSeriesResponse(
+                success=False,
+                message=f"Granularity must be one of {', '.join(BUCKET_WIDTHS)}",
+                status_code=400,
+                buckets=None,
+            )
+        if request.wallet_address is not None and request.user_email is not None:
+            return TimeSeriesResponse(
+                success=False,
+                message="Filter by wallet or by user, not both",
+                status_code=400,
+                buckets=None,
+            )
+
+        until = request.until if request.until is not None else int(self.clock())
+        since = (
+            request.since
+            if request.since is not None
+            else until - width * (DEFAULT_BUCKET_COUNT - 1)
+        )
+        since -= since % width
+        if since > until or (until - since) // width >= MAX_BUCKET_COUNT:
+            return TimeSeriesResponse(
+                success=False,
+                message=f"At most {MAX_BUCKET_COUNT} buckets can be requested",
+                status_code=400,
+                buckets=None,
+            )
+
+        return TimeSeriesResponse(
+            success=True,
+            message="OK",
+            status_code=200,
+            buckets=self.admin_repository.get_statistics_buckets(
+                request.granularity,
+                since,
+                until,
+                wallet_address=request.wallet_address,
+                user_email=request.user_email,
+            ),
+        )
+
+    def invalidate_caches(self, request: StatisticsRequest) -> Response:
+        if request.api_key != self.__admin_key:
+            return Response(success=False, message="Invalid API key", status_code=401)
+
+        for name in CACHE_NAMES:
+            self.admin_repository.bump_cache_version(name)
+        return Response(
+            success=True,
+            message="Caches invalidated in every worker",
+            status_code=200,
+        )
+
+    def profile(self, request: ProfileRequest) -> ProfileResponse:
+        if request.api_key != self.__admin_key:
+            return ProfileResponse(
+                success=False,
+                message="Invalid API key",
+                status_code=401,
+                collapsed_stacks=None,
+            )
+        if self.profiler is None:
+            return ProfileResponse(
+                success=False,
+                message="Profiling is not enabled",
+                status_code=501,
+                collapsed_stacks=None,
+            )
+        if not 0 < request.seconds <= MAX_PROFILE_SECONDS:
+            return ProfileResponse(
+                success=False,
+                message=f"Seconds must be between 0 and {MAX_PROFILE_SECONDS:g}",
+                status_code=400,
+                collapsed_stacks=None,
+            )
+
+        collapsed_stacks = self.profiler.sample(request.seconds)
+        if collapsed_stacks is None:
+            return ProfileResponse(
+                success=False,
+                message="A profile is already being taken",
+                status_code=409,
+                collapsed_stacks=None,
+            )
+        return ProfileResponse(
+            success=True,
+            message="OK",
+            status_code=200,
+            collapsed_stacks=collapsed_stacks,
+        )
+
+    def profile_requests(self, request: RequestProfileRequest) -> Response:
+        if request.api_key != self.__admin_key:
+            return Response(success=False, message="Invalid API key", status_code=401)
+        if self.request_profiler is None:
+            return Response(
+                success=False, message="Profiling is not enabled", status_code=501
+            )
+        if request.known_routes is not None and request.route not in (
+            request.known_routes
+        ):
+            return Response(success=False, message="Unknown route", status_code=400)
+        if not 0 < request.count <= MAX_PROFILED_REQUESTS:
+            return Response(
+                success=False,
+                message=f"Count must be between 1 and {MAX_PROFILED_REQUESTS}",
+                status_code=400,
+            )
+
+        self.request_profiler.arm(request.route, request.count)
+        return Response(
+            success=True,
+            message=f"Profiling the next {request.count} {request.route} requests",
+            status_code=200,
+        )
+
+    def get_request_profiles(
+        self, request: StatisticsRequest
+    ) -> RequestProfilesResponse:
+        if request.api_key != self.__admin_key:
+            return RequestProfilesResponse(
+                success=False,
+                message="Invalid API key",
+                status_code=401,
+                profiles=None,
+            )
+
+        return RequestProfilesResponse(
             success=True,
             message="OK",
             status_code=200,
-            statistics_info=StatisticsInfo(transaction_count, profit),
+            profiles=(
+                self.request_profiler.profiles()
+                if self.request_profiler is not None
+                else []
+            ),
+        )
+
+    @staticmethod
+    def __invalid_api_key() -> StatisticsResponse:
+        return StatisticsResponse(
+            success=False,
+            message="Invalid API key",
+            status_code=401,
+            statistics_info=None,
         )
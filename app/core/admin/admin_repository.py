@@ -1,8 +1,35 @@
-from typing import List, Protocol
+from typing import List, Optional, Protocol
 
-from app.core.entities import Transaction
+from app.core.entities import StatisticsBucket, StatisticsInfo, Transaction
+
+# bucket widths in seconds, also the values accepted for ``granularity``;
+# repositories keep a rollup per width, so the SQLite schema needs a
+# migration when these change
+BUCKET_WIDTHS = {"minute": 60, "hour": 3600, "day": 86400}
 
 
 class IAdminRepository(Protocol):
     def fetch_all_transactions(self) -> List[Transaction]:
         pass
+
+    def get_statistics(self) -> StatisticsInfo:
+        pass
+
+    # recomputes the statistics from the ledger and stores them
+    def reconcile_statistics(self) -> StatisticsInfo:
+        pass
+
+    # non-empty buckets starting between since and until, oldest first
+    def get_statistics_buckets(
+        self,
+        granularity: str,
+        since: int,
+        until: int,
+        wallet_address: Optional[str] = None,
+        user_email: Optional[str] = None,
+    ) -> List[StatisticsBucket]:
+        pass
+
+    # invalidates the named in-process cache in every worker
+    def bump_cache_version(self, name: str) -> int:
+        pass
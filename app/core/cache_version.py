@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Callable, Optional, Protocol
+
+PRINCIPALS_CACHE = "principals"
+EXCHANGE_RATE_CACHE = "exchange_rate"
+CACHE_NAMES = (PRINCIPALS_CACHE, EXCHANGE_RATE_CACHE)
+
+
+class ICacheVersionRepository(Protocol):
+    # 0 for a cache whose version was never bumped
+    def get_cache_version(self, name: str) -> int:
+        pass
+
+    def bump_cache_version(self, name: str) -> int:
+        pass
+
+
+class CacheVersionWatcher:
+    """Notices bumps of a version counter shared by every worker process.
+
+    In-process caches cannot see each other; a bump of the counter stored
+    next to the data tells all of them to drop what they hold. The counter
+    is read at most once per ``interval`` seconds, which bounds how long a
+    worker keeps serving entries invalidated elsewhere.
+    """
+
+    def __init__(
+        self,
+        repository: ICacheVersionRepository,
+        name: str,
+        interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.repository = repository
+        self.name = name
+        self.interval = interval
+        self.clock = clock
+        self.__lock = threading.Lock()
+        self.__version: Optional[int] = None
+        self.__next_check = float("-inf")
+
+    def changed(self) -> bool:
+        """True once per bump seen since the previous check."""
+        with self.__lock:
+            now = self.clock()
+            if now < self.__next_check:
+                return False
+            self.__next_check = now + self.interval
+
+        version = self.repository.get_cache_version(self.name)
+        with self.__lock:
+            seen, self.__version = self.__version, version
+        return seen is not None and seen != version
+
+    def bump(self) -> int:
+        """Invalidates the cache in every process, this one included."""
+        return self.repository.bump_cache_version(self.name)
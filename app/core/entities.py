@@ -1,4 +1,39 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional, Tuple, Type, TypeVar, cast
+
+T = TypeVar("T")
+
+
+def slotted(cls: Type[T]) -> Type[T]:
+    """Recreates a dataclass with ``__slots__`` for its fields, dropping the
+    per-instance ``__dict__``; ``dataclass(slots=True)`` needs Python 3.10.
+
+    Apply it above ``@dataclass``, frozen or not. Field defaults keep working,
+    as the generated ``__init__`` already holds them.
+    """
+    names = tuple(f.name for f in fields(cast(Any, cls)))
+    namespace = {
+        key: value
+        for key, value in cls.__dict__.items()
+        if key not in names and key not in ("__dict__", "__weakref__")
+    }
+    namespace["__slots__"] = names
+    # the default slot restore goes through __setattr__, which frozen
+    # dataclasses refuse
+    namespace["__getstate__"] = _get_slots_state
+    namespace["__setstate__"] = _set_slots_state
+    metaclass: Any = type(cls)
+    slotted_cls: Type[T] = metaclass(cls.__name__, cls.__bases__, namespace)
+    return slotted_cls
+
+
+def _get_slots_state(self: Any) -> Tuple[Any, ...]:
+    return tuple(getattr(self, f.name) for f in fields(self))
+
+
+def _set_slots_state(self: Any, state: Tuple[Any, ...]) -> None:
+    for f, value in zip(fields(self), state):
+        object.__setattr__(self, f.name, value)
 
 
 @dataclass
@@ -8,22 +43,40 @@ class Response:
     status_code: int
 
 
+@slotted
 @dataclass
 class Transaction:
     wallet_address_from: str
     wallet_address_to: str
-    btc_amount: float
-    fee_pct: float
+    # satoshis sent; the receiver gets them less the fee
+    amount_sat: int
+    fee_bps: int
     exchange_rate: float
+    # ledger position, set on rows read back from the repository; histories
+    # are ordered by it and paged with it
+    transaction_id: Optional[int] = field(default=None, compare=False)
 
 
 @dataclass
 class StatisticsInfo:
     total_transaction_count: int
-    total_btc_profit: float
+    total_profit_sat: int
 
 
+@slotted
 @dataclass
+class StatisticsBucket:
+    # unix time at which the bucket starts
+    bucket_start: int
+    transfer_count: int
+    volume_sat: int
+    usd_volume: float
+    profit_sat: int
+
+
+# frozen, as cached users are shared between requests and threads
+@slotted
+@dataclass(frozen=True)
 class UserInfo:
     api_key: str
     email: str
@@ -33,13 +86,53 @@ class UserInfo:
             return self.api_key == other.api_key
         return False
 
+    def __hash__(self) -> int:
+        return hash(self.api_key)
+
 
+@slotted
 @dataclass
 class Wallet:
     wallet_address: str
-    btc_balance: float
+    balance_sat: int
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, Wallet):
             return self.wallet_address == other.wallet_address
         return False
+
+
+# A transfer made with an idempotency key is recorded under it in the same
+# database transaction, and a retry with the key is answered from the record.
+@slotted
+@dataclass(frozen=True)
+class IdempotencyRecord:
+    api_key: str
+    key: str
+    # the transfer first made with the key, which a retry must repeat
+    wallet_address_from: str
+    wallet_address_to: str
+    amount_sat: int
+    # set on records read back from the repository
+    transaction_id: Optional[int] = field(default=None, compare=False)
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+
+
+@dataclass
+class TransferJob:
+    api_key: str
+    wallet_address_from: str
+    wallet_address_to: str
+    amount_sat: int
+    idempotency_key: Optional[str] = None
+    status: str = JOB_QUEUED
+    # the response of the transfer, once done
+    success: Optional[bool] = None
+    message: Optional[str] = None
+    status_code: Optional[int] = None
+    # set by the repository on enqueue
+    job_id: Optional[int] = field(default=None, compare=False)
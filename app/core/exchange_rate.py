@@ -0,0 +1,259 @@
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Callable, Optional, Protocol, Tuple
+
+from app.core.cache_version import CacheVersionWatcher
+from app.core.metrics import RATE_FETCH_SECONDS
+from app.core.tracing import CLIENT, child_span
+from app.core.utils import get_btc_to_usd_rate, get_btc_to_usd_rate_async
+
+
+class IExchangeRateProvider(Protocol):
+    def get_btc_to_usd_rate(self) -> Optional[float]:
+        pass
+
+
+class IAsyncExchangeRateProvider(Protocol):
+    async def get_btc_to_usd_rate(self) -> Optional[float]:
+        pass
+
+
+class CoindeskExchangeRateProvider:
+    def __init__(self, timeout: float = 2.0):
+        self.timeout = timeout
+
+    def get_btc_to_usd_rate(self) -> Optional[float]:
+        return get_btc_to_usd_rate(timeout=self.timeout)
+
+
+class AsyncCoindeskExchangeRateProvider:
+    def __init__(self, timeout: float = 2.0):
+        self.timeout = timeout
+
+    async def get_btc_to_usd_rate(self) -> Optional[float]:
+        return await get_btc_to_usd_rate_async(timeout=self.timeout)
+
+
+class TimedExchangeRateProvider:
+    def __init__(self, upstream: IExchangeRateProvider, name: str):
+        self.upstream = upstream
+        self.name = name
+        self.series = RATE_FETCH_SECONDS.labels(name)
+
+    def get_btc_to_usd_rate(self) -> Optional[float]:
+        started = time.perf_counter()
+        try:
+            with child_span(f"rate.{self.name}", CLIENT):
+                return self.upstream.get_btc_to_usd_rate()
+        finally:
+            self.series.observe(time.perf_counter() - started)
+
+
+class AsyncTimedExchangeRateProvider:
+    def __init__(self, upstream: IAsyncExchangeRateProvider, name: str):
+        self.upstream = upstream
+        self.name = name
+        self.series = RATE_FETCH_SECONDS.labels(name)
+
+    async def get_btc_to_usd_rate(self) -> Optional[float]:
+        started = time.perf_counter()
+        try:
+            with child_span(f"rate.{self.name}", CLIENT):
+                return await self.upstream.get_btc_to_usd_rate()
+        finally:
+            self.series.observe(time.perf_counter() - started)
+
+
+class StubExchangeRateProvider:
+    def __init__(self, rate: Optional[float] = 40000.0):
+        self.rate = rate
+
+    def get_btc_to_usd_rate(self) -> Optional[float]:
+        return self.rate
+
+
+class CachedExchangeRateProvider:
+    """Serves the rate from memory and refreshes it in the background.
+
+    A cached rate younger than ``ttl - refresh_ahead`` is returned as is.
+    Past that, and up to ``max_staleness``, it is still returned while one
+    background fetch replaces it. Callers only wait, for at most
+    ``fetch_timeout``, when there is no usable rate at all; concurrent callers
+    then share the same in-flight fetch. After a failed fetch the upstream is
+    left alone for ``retry_interval``. With a ``version`` watcher, a bump from
+    any process discards the rate, so it is fetched again before use.
+    """
+
+    def __init__(
+        self,
+        upstream: IExchangeRateProvider,
+        ttl: float = 60.0,
+        refresh_ahead: float = 10.0,
+        max_staleness: float = 300.0,
+        fetch_timeout: float = 2.0,
+        retry_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        version: Optional[CacheVersionWatcher] = None,
+    ):
+        self.upstream = upstream
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl)
+        self.max_staleness = max(max_staleness, ttl)
+        self.fetch_timeout = fetch_timeout
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.version = version
+        self.__lock = threading.Lock()
+        self.__rate: Optional[float] = None
+        self.__fetched_at = 0.0
+        self.__failed_at = float("-inf")
+        self.__in_flight: Optional[threading.Event] = None
+        self.__stopped = threading.Event()
+        self.__refresher: Optional[threading.Thread] = None
+
+    def get_btc_to_usd_rate(self) -> Optional[float]:
+        if self.version is not None and self.version.changed():
+            self.discard()
+        rate, age = self.__cached()
+        if rate is not None and age < self.ttl - self.refresh_ahead:
+            return rate
+
+        in_flight = self.__fetch_in_background()
+        if rate is not None and age < self.max_staleness:
+            return rate
+        if in_flight is None:
+            return None
+
+        in_flight.wait(self.fetch_timeout)
+        rate, age = self.__cached()
+        return rate if rate is not None and age < self.max_staleness else None
+
+    def refresh(self) -> Optional[float]:
+        """Fetches now, or joins the fetch already running, and waits for it."""
+        in_flight = self.__fetch_in_background()
+        if in_flight is not None:
+            in_flight.wait(self.fetch_timeout)
+        return self.__cached()[0]
+
+    def store(self, rate: Optional[float]) -> None:
+        """Records the outcome of a fetch made elsewhere, e.g. on an event loop."""
+        with self.__lock:
+            if rate is not None:
+                self.__rate = rate
+                self.__fetched_at = self.clock()
+            else:
+                self.__failed_at = self.clock()
+
+    def discard(self) -> None:
+        with self.__lock:
+            self.__rate = None
+            self.__failed_at = float("-inf")
+
+    def start(self) -> None:
+        """Keeps the rate warm so requests never hit an empty cache."""
+        if self.__refresher is not None:
+            return
+        self.__stopped.clear()
+        self.__refresher = threading.Thread(
+            target=self.__refresh_periodically, name="exchange-rate", daemon=True
+        )
+        self.__refresher.start()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        if self.__refresher is not None:
+            self.__refresher.join()
+            self.__refresher = None
+
+    def __cached(self) -> Tuple[Optional[float], float]:
+        with self.__lock:
+            return self.__rate, self.clock() - self.__fetched_at
+
+    def __fetch_in_background(self) -> Optional[threading.Event]:
+        with self.__lock:
+            if self.__in_flight is not None:
+                return self.__in_flight
+            if self.clock() - self.__failed_at < self.retry_interval:
+                return None
+            in_flight = self.__in_flight = threading.Event()
+
+        # in the caller's context, so a request that triggers the fetch
+        # traces it
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self.__fetch, in_flight),
+            name="exchange-rate-fetch",
+            daemon=True,
+        ).start()
+        return in_flight
+
+    def __fetch(self, in_flight: threading.Event) -> None:
+        rate = None
+        try:
+            rate = self.upstream.get_btc_to_usd_rate()
+        except Exception as e:
+            print("Error refreshing BTC to USD rate", e)
+        finally:
+            self.store(rate)
+            with self.__lock:
+                self.__in_flight = None
+            in_flight.set()
+
+    def __refresh_periodically(self) -> None:
+        interval = max(self.ttl - self.refresh_ahead, 1.0)
+        self.refresh()
+        while not self.__stopped.wait(interval):
+            self.refresh()
+
+
+class AsyncExchangeRateRefresher:
+    """Keeps a CachedExchangeRateProvider warm from the event loop.
+
+    The upstream is awaited instead of being called on a thread, so an async
+    application spends no threads on the rate. The cache's own background
+    fetch is left in place as the fallback when the refresher falls behind.
+    """
+
+    def __init__(
+        self,
+        cache: CachedExchangeRateProvider,
+        upstream: IAsyncExchangeRateProvider,
+    ):
+        self.cache = cache
+        self.upstream = upstream
+        self.__task: Optional["asyncio.Task[None]"] = None
+
+    async def refresh(self) -> Optional[float]:
+        rate = None
+        try:
+            rate = await self.upstream.get_btc_to_usd_rate()
+        except Exception as e:
+            print("Error refreshing BTC to USD rate", e)
+        self.cache.store(rate)
+        return rate
+
+    async def start(self) -> None:
+        if self.__task is not None:
+            return
+        await self.refresh()
+        self.__task = asyncio.get_running_loop().create_task(
+            self.__refresh_periodically()
+        )
+
+    async def stop(self) -> None:
+        if self.__task is None:
+            return
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__task = None
+
+    async def __refresh_periodically(self) -> None:
+        interval = max(self.cache.ttl - self.cache.refresh_ahead, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh()
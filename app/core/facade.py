@@ -1,18 +1,49 @@
+import asyncio
+import contextvars
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from functools import partial
+from typing import AsyncIterator, Callable, Iterator, List, Optional, TypeVar
+
 from app.core.admin.admin_interactor import (
     AdminInteractor,
     IAdminInteractor,
+    ProfileRequest,
+    ProfileResponse,
+    RequestProfileRequest,
+    RequestProfilesResponse,
     StatisticsRequest,
     StatisticsResponse,
+    TimeSeriesRequest,
+    TimeSeriesResponse,
 )
 from app.core.admin.admin_repository import IAdminRepository
-from app.core.entities import Response
-from app.core.transaction.transaction_CoR import MakeTransactionRequest
+from app.core.entities import Response, Transaction
+from app.core.exchange_rate import (
+    CachedExchangeRateProvider,
+    CoindeskExchangeRateProvider,
+    IExchangeRateProvider,
+)
+from app.core.principal_cache import PrincipalCache
+from app.core.profiling import IProfiler, RequestProfiler, run_profiled
+from app.core.transaction.transaction_CoR import (
+    MakeTransactionRequest,
+    TransactionPipelines,
+    default_transaction_pipelines,
+)
 from app.core.transaction.transaction_interactor import (
     ITransactionInteractor,
     TransactionInteractor,
+    TransactionPagesResponse,
     TransactionsResponse,
+    TransferJobResponse,
+)
+from app.core.transaction.transaction_repository import ITransferQueueRepository
+from app.core.transaction.transfer_workers import (
+    TransferWorkerConfig,
+    TransferWorkers,
 )
-from app.core.transaction.transaction_repository import ITransactionRepository
+from app.core.unit_of_work import count_stats
 from app.core.user.user_interactor import (
     IUserInteractor,
     RegisterUserRequest,
@@ -20,6 +51,7 @@ from app.core.user.user_interactor import (
     UserInteractor,
 )
 from app.core.user.user_repository import IUserRepository
+from app.core.wallet.wallet_CoR import WalletPipelines, default_wallet_pipelines
 from app.core.wallet.wallet_interactor import (
     AddWalletRequest,
     FetchWalletTransactionsRequest,
@@ -30,6 +62,13 @@ from app.core.wallet.wallet_interactor import (
 )
 from app.core.wallet.wallet_repository import IWalletRepository
 
+R = TypeVar("R")
+
+
+@dataclass
+class AsyncTransactionPagesResponse(Response):
+    pages: Optional[AsyncIterator[List[Transaction]]]
+
 
 class BTCWalletService:
     _admin_interactor: IAdminInteractor
@@ -43,30 +82,95 @@ class BTCWalletService:
         transaction_interactor: ITransactionInteractor,
         user_interactor: IUserInteractor,
         wallet_interactor: IWalletInteractor,
+        transfer_workers: Optional[TransferWorkers] = None,
     ):
         self._admin_interactor = admin_interactor
         self._transaction_interactor = transaction_interactor
         self._user_interactor = user_interactor
         self._wallet_interactor = wallet_interactor
+        # started and stopped by the caller, with the application
+        self.transfer_workers = transfer_workers
 
     @classmethod
     def create(
         cls,
         admin_repository: IAdminRepository,
-        transaction_repository: ITransactionRepository,
+        transaction_repository: ITransferQueueRepository,
         user_repository: IUserRepository,
         wallet_reporsitory: IWalletRepository,
+        rate_provider: Optional[IExchangeRateProvider] = None,
+        principal_cache: Optional[PrincipalCache] = None,
+        profiler: Optional[IProfiler] = None,
+        request_profiler: Optional[RequestProfiler] = None,
+        transaction_pipelines: Optional[TransactionPipelines] = None,
+        wallet_pipelines: Optional[WalletPipelines] = None,
+        transfer_workers: Optional[TransferWorkerConfig] = None,
     ) -> "BTCWalletService":
+        if rate_provider is None:
+            rate_provider = CachedExchangeRateProvider(CoindeskExchangeRateProvider())
+        if principal_cache is None:
+            principal_cache = PrincipalCache()
+        # handler chains are linked here, once, and shared by every request
+        if transaction_pipelines is None:
+            transaction_pipelines = default_transaction_pipelines()
+        if wallet_pipelines is None:
+            wallet_pipelines = default_wallet_pipelines()
+        transaction_interactor = TransactionInteractor(
+            transaction_repository,
+            rate_provider,
+            principal_cache,
+            pipelines=transaction_pipelines,
+            on_stats=count_stats("transaction"),
+        )
+        workers = None
+        if transfer_workers is not None:
+            workers = TransferWorkers(
+                transaction_repository,
+                transaction_interactor.make_transactions,
+                transfer_workers,
+            )
+            transaction_interactor.on_enqueue = workers.notify
         return cls(
-            AdminInteractor(admin_repository),
-            TransactionInteractor(transaction_repository),
-            UserInteractor(user_repository),
-            WalletInteractor(wallet_reporsitory),
+            AdminInteractor(
+                admin_repository,
+                profiler=profiler,
+                request_profiler=request_profiler,
+            ),
+            transaction_interactor,
+            UserInteractor(user_repository, principal_cache),
+            WalletInteractor(
+                wallet_reporsitory,
+                rate_provider,
+                principal_cache,
+                pipelines=wallet_pipelines,
+                on_stats=count_stats("wallet"),
+            ),
+            workers,
         )
 
     def get_statistics(self, request: StatisticsRequest) -> StatisticsResponse:
         return self._admin_interactor.get_statistics(request)
 
+    def reconcile_statistics(self, request: StatisticsRequest) -> StatisticsResponse:
+        return self._admin_interactor.reconcile_statistics(request)
+
+    def get_time_series(self, request: TimeSeriesRequest) -> TimeSeriesResponse:
+        return self._admin_interactor.get_time_series(request)
+
+    def invalidate_caches(self, request: StatisticsRequest) -> Response:
+        return self._admin_interactor.invalidate_caches(request)
+
+    def profile(self, request: ProfileRequest) -> ProfileResponse:
+        return self._admin_interactor.profile(request)
+
+    def profile_requests(self, request: RequestProfileRequest) -> Response:
+        return self._admin_interactor.profile_requests(request)
+
+    def get_request_profiles(
+        self, request: StatisticsRequest
+    ) -> RequestProfilesResponse:
+        return self._admin_interactor.get_request_profiles(request)
+
     def add_wallet(self, request: AddWalletRequest) -> WalletResponse:
         return self._wallet_interactor.add_wallet(request)
 
@@ -81,8 +185,157 @@ class BTCWalletService:
     def register_user(self, request: RegisterUserRequest) -> RegisterUserResponse:
         return self._user_interactor.register_user(request)
 
-    def get_transactions(self, api_key: str) -> TransactionsResponse:
-        return self._transaction_interactor.get_user_transactions(api_key)
+    def stream_wallet_transactions(
+        self, request: FetchWalletTransactionsRequest
+    ) -> TransactionPagesResponse:
+        return self._wallet_interactor.stream_wallet_transactions(request)
+
+    def get_transactions(
+        self, api_key: str, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> TransactionsResponse:
+        return self._transaction_interactor.get_user_transactions(api_key, since, limit)
+
+    def stream_transactions(
+        self, api_key: str, since: Optional[int] = None
+    ) -> TransactionPagesResponse:
+        return self._transaction_interactor.stream_user_transactions(api_key, since)
 
     def make_transaction(self, request: MakeTransactionRequest) -> Response:
         return self._transaction_interactor.make_transaction(request)
+
+    def make_transactions(
+        self, requests: List[MakeTransactionRequest]
+    ) -> List[Response]:
+        return self._transaction_interactor.make_transactions(requests)
+
+    def submit_transaction(
+        self, request: MakeTransactionRequest
+    ) -> TransferJobResponse:
+        return self._transaction_interactor.submit_transaction(request)
+
+    def get_transfer_job(self, api_key: str, job_id: int) -> TransferJobResponse:
+        return self._transaction_interactor.get_transfer_job(api_key, job_id)
+
+
+class AsyncBTCWalletService:
+    """Awaitable front of BTCWalletService for async routes.
+
+    Each call runs the whole interactor on ``executor``, a pool dedicated to
+    database work, in one hop: the event loop never blocks on SQLite and the
+    default threadpool is left to the framework. Size the executor to the
+    connection pool; extra threads would only queue for connections.
+    """
+
+    def __init__(self, service: BTCWalletService, executor: Executor):
+        self._service = service
+        self._executor = executor
+
+    async def get_statistics(self, request: StatisticsRequest) -> StatisticsResponse:
+        return await self._run(partial(self._service.get_statistics, request))
+
+    async def reconcile_statistics(
+        self, request: StatisticsRequest
+    ) -> StatisticsResponse:
+        return await self._run(partial(self._service.reconcile_statistics, request))
+
+    async def get_time_series(self, request: TimeSeriesRequest) -> TimeSeriesResponse:
+        return await self._run(partial(self._service.get_time_series, request))
+
+    async def invalidate_caches(self, request: StatisticsRequest) -> Response:
+        return await self._run(partial(self._service.invalidate_caches, request))
+
+    async def profile(self, request: ProfileRequest) -> ProfileResponse:
+        # sampling takes seconds: kept off the executor, whose threads are
+        # sized to the connections
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self._service.profile, request))
+
+    async def profile_requests(self, request: RequestProfileRequest) -> Response:
+        return await self._run(partial(self._service.profile_requests, request))
+
+    async def get_request_profiles(
+        self, request: StatisticsRequest
+    ) -> RequestProfilesResponse:
+        return await self._run(partial(self._service.get_request_profiles, request))
+
+    async def add_wallet(self, request: AddWalletRequest) -> WalletResponse:
+        return await self._run(partial(self._service.add_wallet, request))
+
+    async def get_wallet(self, request: GetWalletRequest) -> WalletResponse:
+        return await self._run(partial(self._service.get_wallet, request))
+
+    async def get_wallet_transactions(
+        self, request: FetchWalletTransactionsRequest
+    ) -> TransactionsResponse:
+        return await self._run(partial(self._service.get_wallet_transactions, request))
+
+    async def register_user(self, request: RegisterUserRequest) -> RegisterUserResponse:
+        return await self._run(partial(self._service.register_user, request))
+
+    async def stream_wallet_transactions(
+        self, request: FetchWalletTransactionsRequest
+    ) -> AsyncTransactionPagesResponse:
+        return self._pages(
+            await self._run(partial(self._service.stream_wallet_transactions, request))
+        )
+
+    async def get_transactions(
+        self, api_key: str, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> TransactionsResponse:
+        return await self._run(
+            partial(self._service.get_transactions, api_key, since, limit)
+        )
+
+    async def stream_transactions(
+        self, api_key: str, since: Optional[int] = None
+    ) -> AsyncTransactionPagesResponse:
+        return self._pages(
+            await self._run(partial(self._service.stream_transactions, api_key, since))
+        )
+
+    async def make_transaction(self, request: MakeTransactionRequest) -> Response:
+        return await self._run(partial(self._service.make_transaction, request))
+
+    async def make_transactions(
+        self, requests: List[MakeTransactionRequest]
+    ) -> List[Response]:
+        return await self._run(partial(self._service.make_transactions, requests))
+
+    async def submit_transaction(
+        self, request: MakeTransactionRequest
+    ) -> TransferJobResponse:
+        return await self._run(partial(self._service.submit_transaction, request))
+
+    async def get_transfer_job(self, api_key: str, job_id: int) -> TransferJobResponse:
+        return await self._run(partial(self._service.get_transfer_job, api_key, job_id))
+
+    async def _run(self, call: Callable[[], R]) -> R:
+        loop = asyncio.get_running_loop()
+        # run_in_executor does not carry context variables, such as the
+        # current span or the request's profile, over to the thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, context.run, run_profiled, call
+        )
+
+    def _pages(
+        self, response: TransactionPagesResponse
+    ) -> AsyncTransactionPagesResponse:
+        return AsyncTransactionPagesResponse(
+            success=response.success,
+            message=response.message,
+            status_code=response.status_code,
+            pages=(
+                self._iterate(response.pages) if response.pages is not None else None
+            ),
+        )
+
+    async def _iterate(
+        self, pages: Iterator[List[Transaction]]
+    ) -> AsyncIterator[List[Transaction]]:
+        # every page is read on the executor, one hop per page
+        while True:
+            page = await self._run(partial(next, pages, None))
+            if page is None:
+                return
+            yield page
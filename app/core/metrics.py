@@ -0,0 +1,302 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Sequence, Tuple, TypeVar, Union
+
+from app.core.tracing import child_span, current_span
+
+# upper bounds in seconds, from a cached lookup to a slow upstream call
+DEFAULT_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+T = TypeVar("T", bound=type)
+
+
+class HistogramSeries:
+    """One labelled series of a histogram; ``observe`` is safe to call from
+    any thread."""
+
+    __slots__ = ("bounds", "counts", "sum", "__lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # the last count is for values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        # nothing in between can raise; a with block costs twice as much
+        self.__lock.acquire()
+        self.counts[i] += 1
+        self.sum += value
+        self.__lock.release()
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self.__lock:
+            return list(self.counts), self.sum
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.__series: Dict[Tuple[str, ...], HistogramSeries] = {}
+        self.__lock = threading.Lock()
+
+    def labels(self, *values: str) -> HistogramSeries:
+        """The series for these label values; callers on a hot path look it
+        up once and keep it."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        series = self.__series.get(values)
+        if series is None:
+            with self.__lock:
+                series = self.__series.setdefault(values, HistogramSeries(self.buckets))
+        return series
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.__lock:
+            entries = sorted(self.__series.items())
+        for values, series in entries:
+            counts, total = series.snapshot()
+            labels = [
+                f'{name}="{escape(value)}"'
+                for name, value in zip(self.labelnames, values)
+            ]
+            cumulative = 0
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += count
+                le = ",".join([*labels, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total!r}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class CounterSeries:
+    """One labelled series of a counter; ``inc`` is safe to call from any
+    thread."""
+
+    __slots__ = ("value", "__lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.__lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        self.__lock.acquire()
+        self.value += amount
+        self.__lock.release()
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.__series: Dict[Tuple[str, ...], CounterSeries] = {}
+        self.__lock = threading.Lock()
+
+    def labels(self, *values: str) -> CounterSeries:
+        """The series for these label values; callers on a hot path look it
+        up once and keep it."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        series = self.__series.get(values)
+        if series is None:
+            with self.__lock:
+                series = self.__series.setdefault(values, CounterSeries())
+        return series
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self.__lock:
+            entries = sorted(self.__series.items())
+        for values, series in entries:
+            labels = ",".join(
+                f'{name}="{escape(value)}"'
+                for name, value in zip(self.labelnames, values)
+            )
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}{suffix} {series.value!r}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.__metrics: Dict[str, Union[Histogram, Counter]] = {}
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        if name in self.__metrics:
+            raise ValueError(f"Metric {name} is already registered")
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self.__metrics[name] = histogram
+        return histogram
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        if name in self.__metrics:
+            raise ValueError(f"Metric {name} is already registered")
+        counter = Counter(name, documentation, labelnames)
+        self.__metrics[name] = counter
+        return counter
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.__metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Metrics are per process: with several workers, each serves its own.
+REGISTRY = MetricsRegistry()
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bw_handler_seconds",
+    "Time spent in a handler of a chain, excluding the handlers after it.",
+    ("chain", "handler"),
+)
+REPOSITORY_SECONDS = REGISTRY.histogram(
+    "bw_repository_seconds",
+    "Duration of repository method calls.",
+    ("method",),
+)
+RATE_FETCH_SECONDS = REGISTRY.histogram(
+    "bw_rate_fetch_seconds",
+    "Duration of exchange rate fetches from the upstream provider.",
+    ("provider",),
+)
+PRINCIPAL_CACHE_LOOKUPS = REGISTRY.counter(
+    "bw_principal_cache_lookups_total",
+    "API key lookups in the principal cache, by whether it had the user.",
+    ("result",),
+)
+PRINCIPAL_CACHE_EVICTIONS = REGISTRY.counter(
+    "bw_principal_cache_evictions_total",
+    "Users dropped from a full principal cache.",
+)
+UNIT_OF_WORK_LOOKUPS = REGISTRY.counter(
+    "bw_unit_of_work_lookups_total",
+    "Entity lookups of units of work, by whether the identity map had them.",
+    ("interactor", "result"),
+)
+UNIT_OF_WORK_FLUSHED = REGISTRY.counter(
+    "bw_unit_of_work_flushed_total",
+    "Writes sent to the repository by unit of work commits.",
+    ("interactor",),
+)
+
+# time spent in nested timed handlers, subtracted from the enclosing one
+_nested = threading.local()
+
+
+def timed_handler(chain: str) -> Callable[[T], T]:
+    """Class decorator timing ``handle`` of a chain-of-responsibility
+    handler. A handler calls the next one from inside its own ``handle``,
+    so the time of the handlers after it is taken out. Within a sampled
+    trace the handler also gets a span, with the next handler's inside it."""
+
+    def decorate(cls: T) -> T:
+        handle = getattr(cls, "handle")
+        series = HANDLER_SECONDS.labels(chain, cls.__name__)
+        span_name = f"{chain}.{cls.__name__}"
+
+        @functools.wraps(handle)
+        def timed(self: Any, args: Any, next_handler: Any) -> Any:
+            outer = getattr(_nested, "seconds", 0.0)
+            _nested.seconds = 0.0
+            started = time.perf_counter()
+            try:
+                if current_span() is None:
+                    return handle(self, args, next_handler)
+                with child_span(span_name):
+                    return handle(self, args, next_handler)
+            finally:
+                elapsed = time.perf_counter() - started
+                series.observe(elapsed - _nested.seconds)
+                _nested.seconds = outer + elapsed
+
+        setattr(cls, "handle", timed)
+        return cls
+
+    return decorate
+
+
+class TimedRepository:
+    """Times every public method called on the wrapped repository, and
+    within a sampled trace records each call as a span."""
+
+    def __init__(self, repository: Any, histogram: Histogram = REPOSITORY_SECONDS):
+        self.__repository = repository
+        self.__histogram = histogram
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.__repository, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+        series = self.__histogram.labels(name)
+        span_name = f"repository.{name}"
+
+        @functools.wraps(attribute)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                if current_span() is None:
+                    return attribute(*args, **kwargs)
+                with child_span(span_name):
+                    return attribute(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - started)
+
+        # later calls find it on the instance, without coming through here
+        setattr(self, name, timed)
+        return timed
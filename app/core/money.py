@@ -0,0 +1,30 @@
+import math
+from decimal import Decimal
+
+SATOSHIS_PER_BTC = 100_000_000
+# fees are whole basis points of the amount sent
+BASIS_POINTS = 10_000
+
+
+def transfer_fee(amount: int, fee_bps: int) -> int:
+    """Fee on ``amount`` satoshis, rounded down to a whole satoshi."""
+    return amount * fee_bps // BASIS_POINTS
+
+
+def to_usd(satoshis: int, exchange_rate: float) -> float:
+    return satoshis * exchange_rate / SATOSHIS_PER_BTC
+
+
+def to_satoshis(btc: float) -> int:
+    """Converts a BTC amount as written by a client; amounts that are not
+    positive, or not a whole number of satoshis, are rejected."""
+    if not math.isfinite(btc) or btc <= 0:
+        raise ValueError("Amount must be positive")
+    satoshis = Decimal(str(btc)) * SATOSHIS_PER_BTC
+    if satoshis != satoshis.to_integral_value():
+        raise ValueError("Amount must be a whole number of satoshis")
+    return int(satoshis)
+
+
+def to_btc(satoshis: int) -> float:
+    return float(Decimal(satoshis) / SATOSHIS_PER_BTC)
@@ -0,0 +1,90 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Generic, List, Optional, Sequence, Type, TypeVar
+
+from app.core.entities import Response
+
+A = TypeVar("A")
+Next = Callable[[A], Response]
+
+
+class Handler(ABC, Generic[A]):
+    """A stage of a pipeline. Handlers keep nothing per request: the request
+    travels in ``args`` and the rest of the pipeline comes in as
+    ``next_handler``, which a handler calls to go on or skips to answer
+    itself. One instance serves every request, from any thread."""
+
+    @abstractmethod
+    def handle(self, args: A, next_handler: Next[A]) -> Response:
+        pass
+
+
+class Pipeline(Generic[A]):
+    """Handlers linked once, when the pipeline is made, into a single
+    callable. A request that passes every stage gets a success response
+    with ``message``.
+
+    Pipelines are immutable; ``inserted`` and ``removed`` give a modified
+    copy, which is how a deployment adds stages such as caching or rate
+    limiting to the defaults.
+    """
+
+    def __init__(self, stages: Sequence[Handler[A]], message: str = "OK"):
+        self.stages = tuple(stages)
+        self.message = message
+        self.__run = link(self.stages, message)
+
+    def __call__(self, args: A) -> Response:
+        return self.__run(args)
+
+    def names(self) -> List[str]:
+        return [type(stage).__name__ for stage in self.stages]
+
+    def inserted(
+        self,
+        stage: Handler[A],
+        before: Optional[Type[Handler[A]]] = None,
+        after: Optional[Type[Handler[A]]] = None,
+    ) -> "Pipeline[A]":
+        """A copy with ``stage`` before or after the stage of the given
+        type; with neither, at the end."""
+        if before is not None and after is not None:
+            raise ValueError("Give one of before and after")
+        if before is not None:
+            i = self.__index(before)
+        elif after is not None:
+            i = self.__index(after) + 1
+        else:
+            i = len(self.stages)
+        stages = list(self.stages)
+        stages.insert(i, stage)
+        return Pipeline(stages, self.message)
+
+    def removed(self, stage_type: Type[Handler[A]]) -> "Pipeline[A]":
+        stages = list(self.stages)
+        del stages[self.__index(stage_type)]
+        return Pipeline(stages, self.message)
+
+    def __index(self, stage_type: Type[Handler[A]]) -> int:
+        for i, stage in enumerate(self.stages):
+            if type(stage) is stage_type:
+                return i
+        raise ValueError(f"No {stage_type.__name__} in {self.names()}")
+
+
+def link(stages: Sequence[Handler[A]], message: str) -> Next[A]:
+    def finish(args: A) -> Response:
+        return Response(success=True, message=message, status_code=200)
+
+    run: Next[A] = finish
+    for stage in reversed(stages):
+        run = bind(stage, run)
+    return run
+
+
+def bind(stage: Handler[A], next_handler: Next[A]) -> Next[A]:
+    handle = stage.handle
+
+    def run(args: A) -> Response:
+        return handle(args, next_handler)
+
+    return run
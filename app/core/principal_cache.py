@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from app.core.cache_version import CacheVersionWatcher
+from app.core.entities import UserInfo
+from app.core.metrics import PRINCIPAL_CACHE_EVICTIONS, PRINCIPAL_CACHE_LOOKUPS
+
+_HITS = PRINCIPAL_CACHE_LOOKUPS.labels("hit")
+_MISSES = PRINCIPAL_CACHE_LOOKUPS.labels("miss")
+_EVICTIONS = PRINCIPAL_CACHE_EVICTIONS.labels()
+
+
+@dataclass(frozen=True)
+class PrincipalCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+
+class PrincipalCache:
+    """LRU cache of authenticated users keyed by API key.
+
+    Entries expire ``ttl`` seconds after they were loaded. Unknown keys are
+    never cached, so a key registered after a failed lookup works at once
+    and guessing keys cannot flush the hot ones out. With a ``version``
+    watcher, a bump from any process empties the cache. Hits, misses and
+    evictions are also counted in the process metrics.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        version: Optional[CacheVersionWatcher] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be positive")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.version = version
+        self.__lock = threading.Lock()
+        self.__entries: "OrderedDict[str, Tuple[UserInfo, float]]" = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(
+        self, api_key: str, load: Callable[[str], Optional[UserInfo]]
+    ) -> Optional[UserInfo]:
+        if self.version is not None and self.version.changed():
+            self.clear()
+        with self.__lock:
+            entry = self.__entries.get(api_key)
+            if entry is not None and self.clock() < entry[1]:
+                self.__entries.move_to_end(api_key)
+                self.__hits += 1
+                _HITS.inc()
+                return entry[0]
+            self.__misses += 1
+        _MISSES.inc()
+
+        user = load(api_key)
+        if user is not None:
+            self.put(user)
+        else:
+            self.invalidate(api_key)
+        return user
+
+    def put(self, user: UserInfo) -> None:
+        with self.__lock:
+            self.__entries[user.api_key] = (user, self.clock() + self.ttl)
+            self.__entries.move_to_end(user.api_key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+                _EVICTIONS.inc()
+
+    def invalidate(self, api_key: str) -> None:
+        with self.__lock:
+            self.__entries.pop(api_key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    @property
+    def stats(self) -> PrincipalCacheStats:
+        with self.__lock:
+            return PrincipalCacheStats(
+                hits=self.__hits,
+                misses=self.__misses,
+                evictions=self.__evictions,
+                size=len(self.__entries),
+            )
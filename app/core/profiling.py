@@ -0,0 +1,167 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from types import FrameType
+from typing import Callable, Dict, Iterator, List, Optional, Protocol, TypeVar
+
+R = TypeVar("R")
+
+# functions listed in a request profile report
+REPORT_LINES = 40
+
+
+class IProfiler(Protocol):
+    def sample(self, seconds: float) -> Optional[str]:
+        """Profiles every thread of the process for ``seconds`` and returns
+        collapsed stacks, or None if a profile is already being taken."""
+
+
+class StackSampler:
+    """Sampling profiler on the standard library: every ``interval`` it
+    records the stack of each thread but its own. The result is in the
+    collapsed format read by flamegraph.pl and speedscope: one line per
+    distinct stack, thread name first and frames from the root, followed
+    by the number of samples."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.__lock = threading.Lock()
+
+    def sample(self, seconds: float) -> Optional[str]:
+        if not self.__lock.acquire(blocking=False):
+            return None
+        try:
+            stacks: Counter[str] = Counter()
+            own = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != own:
+                        stacks[collapse(names.get(ident, str(ident)), frame)] += 1
+                time.sleep(self.interval)
+        finally:
+            self.__lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+def collapse(thread_name: str, frame: Optional[FrameType]) -> str:
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        labels.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+@dataclass
+class RouteProfile:
+    # method and path template, e.g. "POST /transactions"
+    route: str
+    requested: int
+    captured: int
+    # pstats listing, by cumulative time
+    report: Optional[str]
+
+
+class RequestProfiler:
+    """cProfile of the next requests to chosen routes.
+
+    The request handling marks a request of an armed route with
+    ``profiling``; the work it then hands to ``run_profiled`` is profiled,
+    and the profiles of a route are added up until the requested number of
+    requests is captured. Each request gets its own cProfile, which is not
+    safe to share between threads.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__remaining: Dict[str, int] = {}
+        self.__profiles: Dict[str, RouteProfile] = {}
+        self.__stats: Dict[str, pstats.Stats] = {}
+
+    @property
+    def armed(self) -> bool:
+        return bool(self.__remaining)
+
+    def arm(self, route: str, count: int) -> None:
+        """Profiles the next ``count`` requests to ``route``, replacing any
+        earlier capture of it."""
+        with self.__lock:
+            self.__remaining[route] = count
+            self.__profiles[route] = RouteProfile(route, count, 0, None)
+            self.__stats.pop(route, None)
+
+    def claim(self, route: str) -> Optional[cProfile.Profile]:
+        with self.__lock:
+            remaining = self.__remaining.get(route, 0)
+            if remaining == 0:
+                return None
+            if remaining == 1:
+                del self.__remaining[route]
+            else:
+                self.__remaining[route] = remaining - 1
+        return cProfile.Profile()
+
+    def finish(self, route: str, profile: cProfile.Profile) -> None:
+        with self.__lock:
+            capture = self.__profiles.get(route)
+            if capture is None:
+                return
+            stats = self.__stats.get(route)
+            if stats is None:
+                self.__stats[route] = stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            capture.captured += 1
+
+    def profiles(self) -> List[RouteProfile]:
+        with self.__lock:
+            return [
+                RouteProfile(
+                    p.route,
+                    p.requested,
+                    p.captured,
+                    report(self.__stats[p.route]) if p.captured else None,
+                )
+                for p in self.__profiles.values()
+            ]
+
+
+def report(stats: pstats.Stats) -> str:
+    stream = io.StringIO()
+    stats.stream = stream  # type: ignore
+    stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+    return stream.getvalue()
+
+
+_profile: ContextVar[Optional[cProfile.Profile]] = ContextVar("profile", default=None)
+
+
+@contextmanager
+def profiling(profile: cProfile.Profile) -> Iterator[None]:
+    """Marks the work of the current request to be profiled into
+    ``profile``."""
+    token = _profile.set(profile)
+    try:
+        yield
+    finally:
+        _profile.reset(token)
+
+
+def run_profiled(call: Callable[[], R]) -> R:
+    profile = _profile.get()
+    if profile is None:
+        return call()
+    result: R = profile.runcall(call)
+    return result
@@ -0,0 +1,218 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar, Token
+from types import TracebackType
+from typing import (
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Type,
+    Union,
+)
+
+# span kinds, numbered as in OTLP
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+AttributeValue = Union[str, int, float, bool]
+Attributes = Dict[str, AttributeValue]
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = (
+        "tracer",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        trace_id: str,
+        parent_id: Optional[str],
+        name: str,
+        kind: int,
+        attributes: Optional[Attributes],
+    ):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes if attributes is not None else {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        """W3C trace context of this span, for responses and outbound calls."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        self.tracer.record(self)
+
+
+class ISpanExporter(Protocol):
+    def export(self, spans: Sequence[Span]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+class _Scope:
+    """Makes a span current until the block exits, then ends it."""
+
+    __slots__ = ("span", "token")
+
+    def __init__(self, span: Span):
+        self.span = span
+        self.token: Optional[Token[Optional[Span]]] = None
+
+    def __enter__(self) -> Optional[Span]:
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        assert self.token is not None
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        self.span.end()
+
+
+class _NoScope:
+    def __enter__(self) -> Optional[Span]:
+        return None
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+NO_SCOPE = _NoScope()
+
+
+def child_span(
+    name: str, kind: int = INTERNAL, attributes: Optional[Attributes] = None
+) -> ContextManager[Optional[Span]]:
+    """A span under the current one; outside a sampled trace, nothing."""
+    parent = _current.get()
+    if parent is None:
+        return NO_SCOPE
+    return _Scope(
+        Span(parent.tracer, parent.trace_id, parent.span_id, name, kind, attributes)
+    )
+
+
+class Tracer:
+    """Starts request traces and hands finished spans to an exporter.
+
+    A request is traced when its ``traceparent`` header says the caller
+    sampled it or, without one, with probability ``sample_ratio``. Spans of
+    requests that are not traced cost a context variable lookup. Finished
+    spans are queued, at most ``max_pending`` of them, and exported in
+    batches every ``flush_interval`` seconds from a background thread, so
+    requests never wait for the exporter.
+    """
+
+    def __init__(
+        self,
+        exporter: ISpanExporter,
+        sample_ratio: float = 0.01,
+        flush_interval: float = 1.0,
+        max_pending: int = 10_000,
+        sample: Callable[[], float] = random.random,
+    ):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+        self.flush_interval = flush_interval
+        self.sample = sample
+        self.__pending: Deque[Span] = deque(maxlen=max_pending)
+        self.__stopped = threading.Event()
+        self.__flusher: Optional[threading.Thread] = None
+
+    def request_span(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Attributes] = None,
+    ) -> ContextManager[Optional[Span]]:
+        parent = TRACEPARENT.match(traceparent) if traceparent else None
+        if parent is not None:
+            if not int(parent.group(3), 16) & 1:
+                return NO_SCOPE
+            trace_id, parent_id = parent.group(1), parent.group(2)
+        elif self.sample() < self.sample_ratio:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        else:
+            return NO_SCOPE
+        return _Scope(Span(self, trace_id, parent_id, name, SERVER, attributes))
+
+    def record(self, span: Span) -> None:
+        self.__pending.append(span)
+
+    def flush(self) -> None:
+        spans: List[Span] = []
+        while self.__pending:
+            spans.append(self.__pending.popleft())
+        if spans:
+            self.exporter.export(spans)
+
+    def start(self) -> None:
+        if self.__flusher is not None:
+            return
+        self.__stopped.clear()
+        self.__flusher = threading.Thread(
+            target=self.__flush_periodically, name="trace-export", daemon=True
+        )
+        self.__flusher.start()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        if self.__flusher is not None:
+            self.__flusher.join()
+            self.__flusher = None
+        self.flush()
+        self.exporter.close()
+
+    def __flush_periodically(self) -> None:
+        while not self.__stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("Error exporting spans", e)
@@ -1,12 +1,16 @@
-from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import Optional
 
 from app.core.entities import Response, Transaction, UserInfo, Wallet
+from app.core.exchange_rate import IExchangeRateProvider
+from app.core.metrics import timed_handler
+from app.core.pipeline import Handler, Next, Pipeline
 from app.core.transaction.transaction_repository import ITransactionRepository
-from app.core.utils import get_btc_to_usd_rate
 
-FEE_PERCENTAGE = 0.015
+FEE_BASIS_POINTS = 150
+# idempotency keys of queued jobs without one of their own; refused from
+# clients, so that none can collide with a job's
+JOB_KEY_PREFIX = "bw-job:"
 
 
 @dataclass
@@ -14,48 +18,33 @@ class MakeTransactionRequest:
     api_key: str
     wallet_address_from: str
     wallet_address_to: str
-    btc_amount: float
+    amount_sat: int
+    # a retry with the same key is answered without transferring again
+    idempotency_key: Optional[str] = None
 
 
 @dataclass
 class MakeTransactionArgs:
     repository: ITransactionRepository
     request: MakeTransactionRequest
+    rate_provider: IExchangeRateProvider
     wallet_from: Optional[Wallet] = None
     wallet_to: Optional[Wallet] = None
     user_from: Optional[UserInfo] = None
     user_to: Optional[UserInfo] = None
     exchange_rate: Optional[float] = None
+    transaction: Optional[Transaction] = None
 
 
-class ITransactionHandler(ABC):
-    @abstractmethod
-    def set_next(self, handler: "ITransactionHandler") -> "ITransactionHandler":
-        pass
-
-    @abstractmethod
-    def handle(self, args: MakeTransactionArgs) -> Response:
-        pass
-
-
-class TransactionHandler(ITransactionHandler):
-
-    _next_handler: Optional[ITransactionHandler] = None
-
-    def set_next(self, handler: ITransactionHandler) -> ITransactionHandler:
-        self._next_handler = handler
-        return handler
-
-    @abstractmethod
-    def handle(self, args: MakeTransactionArgs) -> Response:
-        if self._next_handler:
-            return self._next_handler.handle(args)
-
-        return Response(success=True, message="Transaction successful", status_code=200)
+class TransactionHandler(Handler[MakeTransactionArgs]):
+    pass
 
 
+@timed_handler("transaction")
 class WalletCheckHandler(TransactionHandler):
-    def handle(self, args: MakeTransactionArgs) -> Response:
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
         wallet_from = args.repository.get_wallet(args.request.wallet_address_from)
         wallet_to = args.repository.get_wallet(args.request.wallet_address_to)
 
@@ -67,11 +56,14 @@ class WalletCheckHandler(TransactionHandler):
             )
         args.wallet_from = wallet_from
         args.wallet_to = wallet_to
-        return super().handle(args)
+        return next_handler(args)
 
 
+@timed_handler("transaction")
 class UserCheckHandler(TransactionHandler):
-    def handle(self, args: MakeTransactionArgs) -> Response:
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
         assert args.wallet_from is not None
         assert args.wallet_to is not None
         user_from = args.repository.get_wallet_user(args.wallet_from)
@@ -85,24 +77,41 @@ class UserCheckHandler(TransactionHandler):
             )
         args.user_from = user_from
         args.user_to = user_to
-        return super().handle(args)
+        return next_handler(args)
 
 
+@timed_handler("transaction")
 class BalanceCheckHandler(TransactionHandler):
-    def handle(self, args: MakeTransactionArgs) -> Response:
+    # rejects early, before the exchange rate lookup; the authoritative
+    # check happens atomically in execute_transfer
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
         assert args.wallet_from is not None
-        if args.wallet_from.btc_balance < args.request.btc_amount:
+        if args.request.amount_sat <= 0:
+            return Response(
+                success=False,
+                message="Amount must be positive",
+                status_code=400,
+            )
+        if args.wallet_from.balance_sat < args.request.amount_sat:
             return Response(
                 success=False,
                 message="Insufficient funds",
                 status_code=402,
             )
-        return super().handle(args)
+        return next_handler(args)
 
 
+@timed_handler("transaction")
 class ExchangeRateHandler(TransactionHandler):
-    def handle(self, args: MakeTransactionArgs) -> Response:
-        exchange_rate = get_btc_to_usd_rate()
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
+        if args.exchange_rate is not None:
+            return next_handler(args)
+
+        exchange_rate = args.rate_provider.get_btc_to_usd_rate()
         if exchange_rate is None:
             return Response(
                 success=False,
@@ -110,34 +119,78 @@ class ExchangeRateHandler(TransactionHandler):
                 status_code=500,
             )
         args.exchange_rate = exchange_rate
-        return super().handle(args)
+        return next_handler(args)
 
 
-class MakeTransactionHandler(TransactionHandler):
-    def handle(self, args: MakeTransactionArgs) -> Response:
-        transaction_fee_pct = FEE_PERCENTAGE if args.user_from != args.user_to else 0
+@timed_handler("transaction")
+class PrepareTransactionHandler(TransactionHandler):
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
+        fee_bps = FEE_BASIS_POINTS if args.user_from != args.user_to else 0
 
         assert args.wallet_from is not None
         assert args.wallet_to is not None
         assert args.exchange_rate is not None
 
-        transaction = Transaction(
+        args.transaction = Transaction(
             args.wallet_from.wallet_address,
             args.wallet_to.wallet_address,
-            args.request.btc_amount,
-            transaction_fee_pct,
+            args.request.amount_sat,
+            fee_bps,
             args.exchange_rate,
         )
+        return next_handler(args)
 
-        args.repository.add_transaction(transaction)
 
-        args.repository.update_wallet_balance(
-            args.wallet_from.wallet_address,
-            args.wallet_from.btc_balance - args.request.btc_amount,
-        )
-        args.repository.update_wallet_balance(
-            args.wallet_to.wallet_address,
-            args.wallet_to.btc_balance
-            + args.request.btc_amount * (1 - transaction_fee_pct),
-        )
-        return super().handle(args)
+@timed_handler("transaction")
+class MakeTransactionHandler(TransactionHandler):
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
+        assert args.transaction is not None
+
+        if not args.repository.execute_transfer(args.transaction):
+            return Response(
+                success=False,
+                message="Insufficient funds",
+                status_code=402,
+            )
+        return next_handler(args)
+
+
+TransactionPipeline = Pipeline[MakeTransactionArgs]
+TRANSFER_DONE = "Transaction successful"
+
+
+@dataclass(frozen=True)
+class TransactionPipelines:
+    transfer: TransactionPipeline
+    # for batches, whose exchange rate is looked up once beforehand
+    batch_transfer: TransactionPipeline
+
+
+def default_transaction_pipelines() -> TransactionPipelines:
+    return TransactionPipelines(
+        transfer=Pipeline(
+            [
+                WalletCheckHandler(),
+                UserCheckHandler(),
+                BalanceCheckHandler(),
+                ExchangeRateHandler(),
+                PrepareTransactionHandler(),
+                MakeTransactionHandler(),
+            ],
+            TRANSFER_DONE,
+        ),
+        batch_transfer=Pipeline(
+            [
+                WalletCheckHandler(),
+                UserCheckHandler(),
+                BalanceCheckHandler(),
+                PrepareTransactionHandler(),
+                MakeTransactionHandler(),
+            ],
+            TRANSFER_DONE,
+        ),
+    )
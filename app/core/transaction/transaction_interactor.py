@@ -1,41 +1,109 @@
 from dataclasses import dataclass
-from typing import List, Optional, Protocol
+from typing import Callable, Iterator, List, Optional, Protocol
 
-from app.core.entities import Response, Transaction
+from app.core.entities import (
+    IdempotencyRecord,
+    Response,
+    Transaction,
+    TransferJob,
+    UserInfo,
+)
+from app.core.exchange_rate import IExchangeRateProvider
+from app.core.principal_cache import PrincipalCache
 from app.core.transaction.transaction_CoR import (
-    BalanceCheckHandler,
-    ExchangeRateHandler,
+    JOB_KEY_PREFIX,
     MakeTransactionArgs,
-    MakeTransactionHandler,
     MakeTransactionRequest,
-    UserCheckHandler,
-    WalletCheckHandler,
+    TransactionPipelines,
+    default_transaction_pipelines,
 )
-from app.core.transaction.transaction_repository import ITransactionRepository
+from app.core.transaction.transaction_repository import ITransferQueueRepository
+from app.core.unit_of_work import StatsCallback, TransactionUnitOfWork, UnitOfWork
+
+MAX_PAGE_SIZE = 1000
+STREAM_PAGE_SIZE = 500
+KEY_REUSED = "Idempotency key was already used for a different transfer"
+KEY_RESERVED = f"Idempotency keys starting with {JOB_KEY_PREFIX!r} are reserved"
 
 
 @dataclass
 class TransactionsResponse(Response):
     transactions: Optional[List[Transaction]]
+    # pass as ``since`` for the next page; None once the history is exhausted
+    next_since: Optional[int] = None
+
+
+@dataclass
+class TransactionPagesResponse(Response):
+    # pages are read lazily, one query each, as the iterator advances
+    pages: Optional[Iterator[List[Transaction]]]
+
+
+@dataclass
+class TransferJobResponse(Response):
+    job: Optional[TransferJob]
 
 
 class ITransactionInteractor(Protocol):
-    def get_user_transactions(self, api_key: str) -> TransactionsResponse:
+    def get_user_transactions(
+        self, api_key: str, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> TransactionsResponse:
+        pass
+
+    def stream_user_transactions(
+        self, api_key: str, since: Optional[int] = None
+    ) -> TransactionPagesResponse:
         pass
 
     def make_transaction(self, request: MakeTransactionRequest) -> Response:
         pass
 
+    def make_transactions(
+        self, requests: List[MakeTransactionRequest]
+    ) -> List[Response]:
+        pass
+
+    def submit_transaction(
+        self, request: MakeTransactionRequest
+    ) -> TransferJobResponse:
+        pass
+
+    def get_transfer_job(self, api_key: str, job_id: int) -> TransferJobResponse:
+        pass
+
 
 class TransactionInteractor:
     def __init__(
         self,
-        transaction_repository: ITransactionRepository,
+        transaction_repository: ITransferQueueRepository,
+        rate_provider: IExchangeRateProvider,
+        principal_cache: Optional[PrincipalCache] = None,
+        on_stats: Optional[StatsCallback] = None,
+        pipelines: Optional[TransactionPipelines] = None,
+        on_enqueue: Optional[Callable[[], None]] = None,
     ):
         self.transaction_repository = transaction_repository
+        self.rate_provider = rate_provider
+        self.principal_cache = principal_cache
+        self.on_stats = on_stats
+        # called once a job is queued, to wake the workers
+        self.on_enqueue = on_enqueue
+        self.pipelines = (
+            pipelines if pipelines is not None else default_transaction_pipelines()
+        )
 
-    def get_user_transactions(self, api_key: str) -> TransactionsResponse:
-        user = self.transaction_repository.get_user(api_key)
+    def get_user_transactions(
+        self, api_key: str, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> TransactionsResponse:
+        if limit is not None and not 0 < limit <= MAX_PAGE_SIZE:
+            return TransactionsResponse(
+                success=False,
+                message=f"Limit must be between 1 and {MAX_PAGE_SIZE}",
+                status_code=400,
+                transactions=None,
+            )
+
+        user = self.__authenticate(api_key)
         if user is None:
             return TransactionsResponse(
                 success=False,
@@ -44,20 +112,252 @@ class TransactionInteractor:
                 transactions=None,
             )
 
+        limit = limit if limit is not None else MAX_PAGE_SIZE
+        transactions = self.transaction_repository.get_user_transactions(
+            user, since, limit
+        )
         return TransactionsResponse(
             success=True,
             message="Here are your transactions",
             status_code=200,
-            transactions=self.transaction_repository.get_user_transactions(user),
+            transactions=transactions,
+            next_since=next_since(transactions, limit),
+        )
+
+    def stream_user_transactions(
+        self, api_key: str, since: Optional[int] = None
+    ) -> TransactionPagesResponse:
+        user = self.__authenticate(api_key)
+        if user is None:
+            return TransactionPagesResponse(
+                success=False,
+                message="Invalid credentials",
+                status_code=401,
+                pages=None,
+            )
+
+        def fetch(since: Optional[int], limit: int) -> List[Transaction]:
+            assert user is not None
+            return self.transaction_repository.get_user_transactions(user, since, limit)
+
+        return TransactionPagesResponse(
+            success=True,
+            message="Here are your transactions",
+            status_code=200,
+            pages=paginate(fetch, since),
         )
 
     def make_transaction(self, request: MakeTransactionRequest) -> Response:
-        handler = WalletCheckHandler()
-        handler.set_next(UserCheckHandler()).set_next(BalanceCheckHandler()).set_next(
-            ExchangeRateHandler()
-        ).set_next(MakeTransactionHandler())
+        if reserved_key(request):
+            return Response(success=False, message=KEY_RESERVED, status_code=400)
+        replayed = self.__replay(request)
+        if replayed is not None:
+            return replayed
 
+        unit_of_work = TransactionUnitOfWork(
+            self.transaction_repository, self.principal_cache
+        )
         args = MakeTransactionArgs(
-            repository=self.transaction_repository, request=request
+            repository=unit_of_work,
+            request=request,
+            rate_provider=self.rate_provider,
+        )
+        response = self.pipelines.transfer(args)
+        if response.success:
+            applied = unit_of_work.commit([idempotency_record(request)])
+            # nothing to commit when the pipeline answered without a transfer
+            if applied:
+                response = self.__transfer_response(request, applied[0])
+        self.__report(unit_of_work)
+        return response
+
+    def make_transactions(
+        self, requests: List[MakeTransactionRequest]
+    ) -> List[Response]:
+        exchange_rate = self.rate_provider.get_btc_to_usd_rate()
+        if exchange_rate is None:
+            return [
+                Response(
+                    success=False,
+                    message="Could not determine exchange rate",
+                    status_code=500,
+                )
+                for _ in requests
+            ]
+
+        # later items are checked against the balances left by earlier ones
+        unit_of_work = TransactionUnitOfWork(
+            self.transaction_repository, self.principal_cache
         )
-        return handler.handle(args)
+        responses: List[Optional[Response]] = []
+        keys: List[Optional[IdempotencyRecord]] = []
+        for request in requests:
+            response = self.__replay(request)
+            if response is None:
+                args = MakeTransactionArgs(
+                    repository=unit_of_work,
+                    request=request,
+                    rate_provider=self.rate_provider,
+                    exchange_rate=exchange_rate,
+                )
+                staged = unit_of_work.staged
+                response = self.pipelines.batch_transfer(args)
+                # answered by the commit, if the pipeline staged a transfer
+                if response.success and unit_of_work.staged > staged:
+                    keys.append(idempotency_record(request))
+                    response = None
+            responses.append(response)
+
+        applied = iter(unit_of_work.commit(keys))
+        self.__report(unit_of_work)
+        return [
+            (
+                response
+                if response is not None
+                else self.__transfer_response(request, next(applied))
+            )
+            for request, response in zip(requests, responses)
+        ]
+
+    def submit_transaction(
+        self, request: MakeTransactionRequest
+    ) -> TransferJobResponse:
+        if reserved_key(request):
+            return TransferJobResponse(
+                success=False,
+                message=KEY_RESERVED,
+                status_code=400,
+                job=None,
+            )
+        if self.__authenticate(request.api_key) is None:
+            return TransferJobResponse(
+                success=False,
+                message="Invalid credentials",
+                status_code=401,
+                job=None,
+            )
+
+        job = self.transaction_repository.enqueue_transfer(
+            TransferJob(
+                api_key=request.api_key,
+                wallet_address_from=request.wallet_address_from,
+                wallet_address_to=request.wallet_address_to,
+                amount_sat=request.amount_sat,
+                idempotency_key=request.idempotency_key,
+            )
+        )
+        if (job.wallet_address_from, job.wallet_address_to, job.amount_sat) != (
+            request.wallet_address_from,
+            request.wallet_address_to,
+            request.amount_sat,
+        ):
+            return TransferJobResponse(
+                success=False,
+                message=KEY_REUSED,
+                status_code=422,
+                job=None,
+            )
+        if self.on_enqueue is not None:
+            self.on_enqueue()
+        return TransferJobResponse(
+            success=True,
+            message="Transfer queued",
+            status_code=202,
+            job=job,
+        )
+
+    def get_transfer_job(self, api_key: str, job_id: int) -> TransferJobResponse:
+        job = self.transaction_repository.get_transfer_job(job_id)
+        # other users' jobs are not told apart from missing ones
+        if job is None or job.api_key != api_key:
+            return TransferJobResponse(
+                success=False,
+                message="Unknown transfer job",
+                status_code=404,
+                job=None,
+            )
+        return TransferJobResponse(
+            success=True,
+            message="Here is your transfer job",
+            status_code=200,
+            job=job,
+        )
+
+    def __replay(self, request: MakeTransactionRequest) -> Optional[Response]:
+        """The response to a request whose idempotency key is recorded."""
+        if request.idempotency_key is None:
+            return None
+        record = self.transaction_repository.get_idempotency_record(
+            request.api_key, request.idempotency_key
+        )
+        if record is None:
+            return None
+        if record != idempotency_record(request):
+            return Response(success=False, message=KEY_REUSED, status_code=422)
+        return transfer_response(True)
+
+    def __transfer_response(
+        self, request: MakeTransactionRequest, applied: bool
+    ) -> Response:
+        # not applied because a concurrent request with the key got there first
+        if not applied:
+            replayed = self.__replay(request)
+            if replayed is not None:
+                return replayed
+        return transfer_response(applied)
+
+    def __authenticate(self, api_key: str) -> Optional[UserInfo]:
+        if self.principal_cache is not None:
+            return self.principal_cache.get(
+                api_key, self.transaction_repository.get_user
+            )
+        return self.transaction_repository.get_user(api_key)
+
+    def __report(self, unit_of_work: UnitOfWork) -> None:
+        if self.on_stats is not None:
+            self.on_stats(unit_of_work.stats)
+
+
+def idempotency_record(request: MakeTransactionRequest) -> Optional[IdempotencyRecord]:
+    if request.idempotency_key is None:
+        return None
+    return IdempotencyRecord(
+        api_key=request.api_key,
+        key=request.idempotency_key,
+        wallet_address_from=request.wallet_address_from,
+        wallet_address_to=request.wallet_address_to,
+        amount_sat=request.amount_sat,
+    )
+
+
+def reserved_key(request: MakeTransactionRequest) -> bool:
+    # job keys only reach make_transactions, which the workers call
+    key = request.idempotency_key
+    return key is not None and key.startswith(JOB_KEY_PREFIX)
+
+
+def transfer_response(applied: bool) -> Response:
+    if applied:
+        return Response(success=True, message="Transaction successful", status_code=200)
+    return Response(success=False, message="Insufficient funds", status_code=402)
+
+
+def next_since(transactions: List[Transaction], limit: int) -> Optional[int]:
+    if len(transactions) < limit:
+        return None
+    return transactions[-1].transaction_id
+
+
+def paginate(
+    fetch: Callable[[Optional[int], int], List[Transaction]],
+    since: Optional[int] = None,
+    page_size: int = STREAM_PAGE_SIZE,
+) -> Iterator[List[Transaction]]:
+    """Walks a history page by page, keyed on the last transaction id seen."""
+    while True:
+        page = fetch(since, page_size)
+        if page:
+            yield page
+        since = next_since(page, page_size)
+        if since is None:
+            return
@@ -1,16 +1,22 @@
-from typing import List, Optional, Protocol
+from typing import List, Optional, Protocol, Sequence
 
-from app.core.entities import Transaction, UserInfo, Wallet
+from app.core.entities import (
+    IdempotencyRecord,
+    Transaction,
+    TransferJob,
+    UserInfo,
+    Wallet,
+)
 
 
 class ITransactionRepository(Protocol):
     def get_user(self, api_key: str) -> Optional[UserInfo]:
         pass
 
-    def get_user_transactions(self, user: UserInfo) -> List[Transaction]:
-        pass
-
-    def add_transaction(self, transaction: Transaction) -> None:
+    # ordered by id; only ids above since, at most limit rows
+    def get_user_transactions(
+        self, user: UserInfo, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Transaction]:
         pass
 
     def get_wallet_user(self, wallet: Wallet) -> UserInfo:
@@ -19,7 +25,49 @@ class ITransactionRepository(Protocol):
     def get_wallet(self, wallet_address: str) -> Optional[Wallet]:
         pass
 
-    def update_wallet_balance(
-        self, wallet_address: str, new_btc_balance: float
-    ) -> None:
+    # atomic debit, credit and ledger insert; False if funds are insufficient
+    def execute_transfer(self, transaction: Transaction) -> bool:
+        pass
+
+    # same as execute_transfer for each item, all in one database transaction
+    def execute_transfers(self, transactions: List[Transaction]) -> List[bool]:
+        pass
+
+
+class ITransferQueueRepository(ITransactionRepository, Protocol):
+    """What the transaction interactor needs beyond the handlers: records of
+    idempotency keys and the durable queue of transfer jobs."""
+
+    # keys, when given, line up with the transactions: an applied transfer is
+    # recorded under its key in the same database transaction, and one whose
+    # key is already recorded is not applied
+    def execute_transfers(
+        self,
+        transactions: List[Transaction],
+        keys: Optional[Sequence[Optional[IdempotencyRecord]]] = None,
+    ) -> List[bool]:
+        pass
+
+    def get_idempotency_record(
+        self, api_key: str, key: str
+    ) -> Optional[IdempotencyRecord]:
+        pass
+
+    # stores a queued job and returns it with its id; if the user already
+    # queued a job with the same idempotency key, returns that job instead
+    def enqueue_transfer(self, job: TransferJob) -> TransferJob:
+        pass
+
+    def get_transfer_job(self, job_id: int) -> Optional[TransferJob]:
+        pass
+
+    # marks up to limit jobs as running, in id order, and returns them: queued
+    # ones and running ones whose lease of lease_seconds has run out
+    def claim_transfer_jobs(
+        self, limit: int, lease_seconds: float
+    ) -> List[TransferJob]:
+        pass
+
+    # stores the outcome of each job and marks it done
+    def finish_transfer_jobs(self, jobs: List[TransferJob]) -> None:
         pass
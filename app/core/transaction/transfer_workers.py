@@ -0,0 +1,135 @@
+import threading
+from dataclasses import dataclass, replace
+from typing import Callable, List
+
+from app.core.entities import JOB_DONE, Response, TransferJob
+from app.core.transaction.transaction_CoR import (
+    JOB_KEY_PREFIX,
+    MakeTransactionRequest,
+)
+from app.core.transaction.transaction_repository import ITransferQueueRepository
+
+TransferBatch = Callable[[List[MakeTransactionRequest]], List[Response]]
+
+
+@dataclass(frozen=True)
+class TransferWorkerConfig:
+    workers: int = 2
+    # jobs claimed and transferred in one database transaction
+    batch_size: int = 100
+    # seconds between looks at the queue when nothing wakes a worker, which
+    # bounds the wait for jobs queued by another process
+    poll_interval: float = 1.0
+    # seconds after which a job claimed by a worker that died is run again
+    lease_seconds: float = 30.0
+
+    def __post_init__(self) -> None:
+        if self.workers < 1 or self.batch_size < 1:
+            raise ValueError("Transfer workers need a worker and a batch size")
+
+
+class TransferWorkers:
+    """Threads that claim queued transfer jobs and run them in batches.
+
+    A job runs under its idempotency key, or under one made from its id with
+    a prefix clients may not use, so
+    a job run again after its lease ran out, say because its worker died
+    between the transfer and storing the outcome, does not transfer twice.
+    Jobs that fail on the server side, with a 5xx status, are left to be
+    claimed again once their lease runs out. Each process with workers takes
+    jobs from the shared queue; ``notify`` wakes the workers of this one.
+    """
+
+    def __init__(
+        self,
+        repository: ITransferQueueRepository,
+        transfer: TransferBatch,
+        config: TransferWorkerConfig,
+    ):
+        self.repository = repository
+        self.transfer = transfer
+        self.config = config
+        self.__wakeup = threading.Condition()
+        self.__woken = False
+        self.__stopped = threading.Event()
+        self.__threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        if self.__threads:
+            return
+        self.__stopped.clear()
+        for i in range(self.config.workers):
+            thread = threading.Thread(
+                target=self.__run, name=f"transfer-worker-{i}", daemon=True
+            )
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        with self.__wakeup:
+            self.__wakeup.notify_all()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def notify(self) -> None:
+        with self.__wakeup:
+            self.__woken = True
+            self.__wakeup.notify()
+
+    def run_once(self) -> int:
+        """Claims and runs one batch; returns the number of jobs claimed."""
+        jobs = self.repository.claim_transfer_jobs(
+            self.config.batch_size, self.config.lease_seconds
+        )
+        if not jobs:
+            return 0
+        responses = self.transfer([job_request(job) for job in jobs])
+        self.repository.finish_transfer_jobs(
+            [
+                finished(job, response)
+                for job, response in zip(jobs, responses)
+                if response.status_code < 500
+            ]
+        )
+        return len(jobs)
+
+    def __run(self) -> None:
+        while not self.__stopped.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print("Error running transfer jobs", e)
+                claimed = 0
+            if claimed == 0:
+                self.__wait()
+
+    def __wait(self) -> None:
+        with self.__wakeup:
+            # a job queued since the last claim has already notified
+            if not self.__woken and not self.__stopped.is_set():
+                self.__wakeup.wait(self.config.poll_interval)
+            self.__woken = False
+
+
+def job_request(job: TransferJob) -> MakeTransactionRequest:
+    assert job.job_id is not None
+    key = job.idempotency_key
+    return MakeTransactionRequest(
+        api_key=job.api_key,
+        wallet_address_from=job.wallet_address_from,
+        wallet_address_to=job.wallet_address_to,
+        amount_sat=job.amount_sat,
+        idempotency_key=key if key is not None else f"{JOB_KEY_PREFIX}{job.job_id}",
+    )
+
+
+def finished(job: TransferJob, response: Response) -> TransferJob:
+    return replace(
+        job,
+        status=JOB_DONE,
+        success=response.success,
+        message=response.message,
+        status_code=response.status_code,
+    )
@@ -0,0 +1,252 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from app.core.entities import IdempotencyRecord, Transaction, UserInfo, Wallet
+from app.core.metrics import UNIT_OF_WORK_FLUSHED, UNIT_OF_WORK_LOOKUPS
+from app.core.money import transfer_fee
+from app.core.principal_cache import PrincipalCache
+
+
+class IEntityRepository(Protocol):
+    def get_user(self, api_key: str) -> Optional[UserInfo]:
+        pass
+
+    def get_wallet(self, wallet_address: str) -> Optional[Wallet]:
+        pass
+
+    def get_wallet_user(self, wallet: Wallet) -> UserInfo:
+        pass
+
+
+@dataclass
+class UnitOfWorkStats:
+    # lookups served from memory, i.e. SQL statements saved
+    hits: int = 0
+    misses: int = 0
+    # writes sent to the repository by commit
+    flushed: int = 0
+
+
+StatsCallback = Callable[[UnitOfWorkStats], None]
+
+
+def count_stats(interactor: str) -> StatsCallback:
+    """A stats callback adding each unit of work to the process metrics."""
+    hits = UNIT_OF_WORK_LOOKUPS.labels(interactor, "hit")
+    misses = UNIT_OF_WORK_LOOKUPS.labels(interactor, "miss")
+    flushed = UNIT_OF_WORK_FLUSHED.labels(interactor)
+
+    def count(stats: UnitOfWorkStats) -> None:
+        if stats.hits:
+            hits.inc(stats.hits)
+        if stats.misses:
+            misses.inc(stats.misses)
+        if stats.flushed:
+            flushed.inc(stats.flushed)
+
+    return count
+
+
+class UnitOfWork:
+    """Identity map for one interactor call.
+
+    Users, wallets and wallet owners are loaded at most once and the same
+    objects are handed out again. Writes are staged and sent to the
+    repository by ``commit``, after the handler chain has finished. Users
+    missing from the map are looked up in ``principals`` when given.
+    """
+
+    def __init__(
+        self,
+        repository: IEntityRepository,
+        principals: Optional[PrincipalCache] = None,
+    ):
+        self.stats = UnitOfWorkStats()
+        self.__repository = repository
+        self.__principals = principals
+        self.__users: Dict[str, Optional[UserInfo]] = {}
+        self.__wallets: Dict[str, Optional[Wallet]] = {}
+        self.__wallet_users: Dict[str, UserInfo] = {}
+
+    def get_user(self, api_key: str) -> Optional[UserInfo]:
+        if api_key in self.__users:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+            self.__users[api_key] = (
+                self.__principals.get(api_key, self.__repository.get_user)
+                if self.__principals is not None
+                else self.__repository.get_user(api_key)
+            )
+        return self.__users[api_key]
+
+    def get_wallet(self, wallet_address: str) -> Optional[Wallet]:
+        if wallet_address in self.__wallets:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+            self.__wallets[wallet_address] = self.__repository.get_wallet(
+                wallet_address
+            )
+        return self.__wallets[wallet_address]
+
+    def get_wallet_user(self, wallet: Wallet) -> UserInfo:
+        if wallet.wallet_address in self.__wallet_users:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+            self._track_owner(wallet, self.__repository.get_wallet_user(wallet))
+        return self.__wallet_users[wallet.wallet_address]
+
+    def _track_wallet(self, wallet: Wallet) -> Wallet:
+        tracked = self.__wallets.get(wallet.wallet_address)
+        if tracked is None:
+            self.__wallets[wallet.wallet_address] = tracked = wallet
+        return tracked
+
+    def _track_owner(self, wallet: Wallet, user: UserInfo) -> None:
+        tracked = self.__users.get(user.api_key)
+        if tracked is None:
+            self.__users[user.api_key] = tracked = user
+        self.__wallet_users[wallet.wallet_address] = tracked
+
+
+class ITransactionUnitOfWorkRepository(IEntityRepository, Protocol):
+    def get_user_transactions(
+        self, user: UserInfo, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Transaction]:
+        pass
+
+    def execute_transfers(
+        self,
+        transactions: List[Transaction],
+        keys: Optional[Sequence[Optional[IdempotencyRecord]]] = None,
+    ) -> List[bool]:
+        pass
+
+
+class TransactionUnitOfWork(UnitOfWork):
+    """Unit of work for the transfer chain.
+
+    ``execute_transfer`` checks the transfer against the tracked balances,
+    moves them and stages it; ``commit`` applies every staged transfer in one
+    repository call and returns the authoritative outcomes in staging order.
+    ``keys`` given to ``commit`` line up with the staged transfers and are
+    recorded with them.
+    """
+
+    def __init__(
+        self,
+        repository: ITransactionUnitOfWorkRepository,
+        principals: Optional[PrincipalCache] = None,
+    ):
+        super().__init__(repository, principals)
+        self.__transaction_repository = repository
+        self.__transfers: List[Transaction] = []
+
+    @property
+    def staged(self) -> int:
+        """Transfers staged since the last commit."""
+        return len(self.__transfers)
+
+    def get_user_transactions(
+        self, user: UserInfo, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Transaction]:
+        return self.__transaction_repository.get_user_transactions(user, since, limit)
+
+    def execute_transfer(self, transaction: Transaction) -> bool:
+        wallet_from = self.get_wallet(transaction.wallet_address_from)
+        wallet_to = self.get_wallet(transaction.wallet_address_to)
+        if wallet_from is None or wallet_to is None:
+            return False
+        if wallet_from.balance_sat < transaction.amount_sat:
+            return False
+
+        wallet_from.balance_sat -= transaction.amount_sat
+        wallet_to.balance_sat += transaction.amount_sat - transfer_fee(
+            transaction.amount_sat, transaction.fee_bps
+        )
+        self.__transfers.append(transaction)
+        return True
+
+    def execute_transfers(self, transactions: List[Transaction]) -> List[bool]:
+        return [self.execute_transfer(transaction) for transaction in transactions]
+
+    def commit(
+        self, keys: Optional[Sequence[Optional[IdempotencyRecord]]] = None
+    ) -> List[bool]:
+        transfers, self.__transfers = self.__transfers, []
+        if not transfers:
+            return []
+        self.stats.flushed += len(transfers)
+        if keys is None or not any(keys):
+            return self.__transaction_repository.execute_transfers(transfers)
+        return self.__transaction_repository.execute_transfers(transfers, keys)
+
+
+class IWalletUnitOfWorkRepository(IEntityRepository, Protocol):
+    def get_user_wallets(self, user: UserInfo) -> List[Wallet]:
+        pass
+
+    def get_wallet_transactions(
+        self,
+        wallet_address: str,
+        since: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Transaction]:
+        pass
+
+    def add_wallet(self, wallet: Wallet, user: UserInfo) -> None:
+        pass
+
+
+class WalletUnitOfWork(UnitOfWork):
+    """Unit of work for the wallet chains; new wallets are staged until
+    ``commit`` but are visible to lookups in the same call."""
+
+    def __init__(
+        self,
+        repository: IWalletUnitOfWorkRepository,
+        principals: Optional[PrincipalCache] = None,
+    ):
+        super().__init__(repository, principals)
+        self.__wallet_repository = repository
+        self.__user_wallets: Dict[str, List[Wallet]] = {}
+        self.__new_wallets: List[Tuple[Wallet, UserInfo]] = []
+
+    def get_user_wallets(self, user: UserInfo) -> List[Wallet]:
+        if user.api_key in self.__user_wallets:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+            wallets = [
+                self._track_wallet(wallet)
+                for wallet in self.__wallet_repository.get_user_wallets(user)
+            ]
+            for wallet in wallets:
+                self._track_owner(wallet, user)
+            self.__user_wallets[user.api_key] = wallets
+        return list(self.__user_wallets[user.api_key])
+
+    def get_wallet_transactions(
+        self,
+        wallet_address: str,
+        since: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Transaction]:
+        return self.__wallet_repository.get_wallet_transactions(
+            wallet_address, since, limit
+        )
+
+    def add_wallet(self, wallet: Wallet, user: UserInfo) -> None:
+        wallet = self._track_wallet(wallet)
+        self._track_owner(wallet, user)
+        if user.api_key in self.__user_wallets:
+            self.__user_wallets[user.api_key].append(wallet)
+        self.__new_wallets.append((wallet, user))
+
+    def commit(self) -> None:
+        new_wallets, self.__new_wallets = self.__new_wallets, []
+        for wallet, user in new_wallets:
+            self.__wallet_repository.add_wallet(wallet, user)
+        self.stats.flushed += len(new_wallets)
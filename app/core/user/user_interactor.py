@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from typing import Optional, Protocol
 
 from app.core.entities import Response, UserInfo
+from app.core.principal_cache import PrincipalCache
 from app.core.user.user_repository import IUserRepository
 
 
@@ -22,8 +23,13 @@ class IUserInteractor(Protocol):
 
 
 class UserInteractor:
-    def __init__(self, user_repository: IUserRepository):
+    def __init__(
+        self,
+        user_repository: IUserRepository,
+        principal_cache: Optional[PrincipalCache] = None,
+    ):
         self.user_repository = user_repository
+        self.principal_cache = principal_cache
 
     def register_user(self, request: RegisterUserRequest) -> RegisterUserResponse:
         if self.user_repository.get_user_by_email(request.email):
@@ -37,6 +43,8 @@ class UserInteractor:
         api_key = str(uuid.uuid4().hex)
         user = UserInfo(email=request.email, api_key=api_key)
         self.user_repository.register_user(user)
+        if self.principal_cache is not None:
+            self.principal_cache.put(user)
         return RegisterUserResponse(
             api_key=api_key,
             success=True,
@@ -1,15 +1,26 @@
+import asyncio
+from functools import partial
 from typing import Optional
 
 import requests
 
+BTC_TO_USD_RATE_URL = "https://api.coindesk.com/v1/bpi/currentprice/USD.json"
 
-def get_btc_to_usd_rate() -> Optional[float]:
-    url = "https://api.coindesk.com/v1/bpi/currentprice/USD.json"
+
+def get_btc_to_usd_rate(timeout: Optional[float] = None) -> Optional[float]:
+    url = BTC_TO_USD_RATE_URL
     result = None
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=timeout)
         if response.status_code == 200:
             result = float(response.json()["bpi"]["USD"]["rate_float"])
     except Exception as e:
         print("Error getting BTC to USD rate", e)
     return result
+
+
+async def get_btc_to_usd_rate_async(timeout: float) -> Optional[float]:
+    """``get_btc_to_usd_rate`` on the loop's default executor, so the event
+    loop carries on while requests waits for the upstream."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(get_btc_to_usd_rate, timeout))
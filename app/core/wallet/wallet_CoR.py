@@ -1,64 +1,52 @@
 import uuid
-from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import Optional
 
 from app.core.entities import Response, UserInfo, Wallet
-from app.core.utils import get_btc_to_usd_rate
+from app.core.exchange_rate import IExchangeRateProvider
+from app.core.metrics import timed_handler
+from app.core.money import SATOSHIS_PER_BTC
+from app.core.pipeline import Handler, Next, Pipeline
 from app.core.wallet.wallet_repository import IWalletRepository
 
 MAX_WALLET_COUNT = 3
-DEFAULT_INITIAL_BALANCE = 1.0
+DEFAULT_INITIAL_BALANCE = SATOSHIS_PER_BTC
 
 
 @dataclass
 class WalletHandlerArgs:
     repository: IWalletRepository
     api_key: str
+    rate_provider: IExchangeRateProvider
     wallet_address: Optional[str] = None
     user: Optional[UserInfo] = None
     exchange_rate: Optional[float] = None
     wallet: Optional[Wallet] = None
 
 
-class IWalletHandler(ABC):
-    @abstractmethod
-    def set_next(self, handler: "IWalletHandler") -> "IWalletHandler":
-        pass
-
-    @abstractmethod
-    def handle(self, args: WalletHandlerArgs) -> Response:
-        pass
-
-
-class WalletHandler(IWalletHandler):
-    _next_handler: Optional[IWalletHandler] = None
-
-    def set_next(self, handler: IWalletHandler) -> IWalletHandler:
-        self._next_handler = handler
-        return handler
-
-    @abstractmethod
-    def handle(self, args: WalletHandlerArgs) -> Response:
-        if self._next_handler:
-            return self._next_handler.handle(args)
-
-        return Response(success=True, message="OK", status_code=200)
+class WalletHandler(Handler[WalletHandlerArgs]):
+    pass
 
 
+@timed_handler("wallet")
 class UserCheckHandler(WalletHandler):
-    def handle(self, args: WalletHandlerArgs) -> Response:
+    def handle(
+        self, args: WalletHandlerArgs, next_handler: Next[WalletHandlerArgs]
+    ) -> Response:
         user = args.repository.get_user(args.api_key)
         if user is None:
             return Response(
                 success=False, message="Invalid Credentials", status_code=401
             )
         args.user = user
-        return super().handle(args)
+        return next_handler(args)
 
 
+@timed_handler("wallet")
 class WalletCountCheckHandler(WalletHandler):
-    def handle(self, args: WalletHandlerArgs) -> Response:
+    def handle(
+        self, args: WalletHandlerArgs, next_handler: Next[WalletHandlerArgs]
+    ) -> Response:
         assert args.user is not None
         user_wallets = args.repository.get_user_wallets(args.user)
         if len(user_wallets) >= MAX_WALLET_COUNT:
@@ -67,40 +55,49 @@ class WalletCountCheckHandler(WalletHandler):
                 message="Max wallet count reached",
                 status_code=403,
             )
-        return super().handle(args)
+        return next_handler(args)
 
 
+@timed_handler("wallet")
 class AddWalletHandler(WalletHandler):
-    def handle(self, args: WalletHandlerArgs) -> Response:
+    def handle(
+        self, args: WalletHandlerArgs, next_handler: Next[WalletHandlerArgs]
+    ) -> Response:
         assert args.user is not None
         wallet_address = str(uuid.uuid4().hex)
         args.repository.add_wallet(
             Wallet(
                 wallet_address=wallet_address,
-                btc_balance=DEFAULT_INITIAL_BALANCE,
+                balance_sat=DEFAULT_INITIAL_BALANCE,
             ),
             args.user,
         )
         args.wallet_address = wallet_address
-        return super().handle(args)
+        return next_handler(args)
 
 
+@timed_handler("wallet")
 class WalletCheckHandler(WalletHandler):
-    def handle(self, args: WalletHandlerArgs) -> Response:
+    def handle(
+        self, args: WalletHandlerArgs, next_handler: Next[WalletHandlerArgs]
+    ) -> Response:
         assert args.user is not None
         assert args.wallet_address is not None
         wallet = args.repository.get_wallet(args.wallet_address)
-        if wallet is None or wallet not in args.repository.get_user_wallets(args.user):
+        if wallet is None or args.repository.get_wallet_user(wallet) != args.user:
             return Response(
                 success=False, message="Invalid credentials", status_code=401
             )
         args.wallet = wallet
-        return super().handle(args)
+        return next_handler(args)
 
 
+@timed_handler("wallet")
 class ExchangeRateHandler(WalletHandler):
-    def handle(self, args: WalletHandlerArgs) -> Response:
-        exchange_rate = get_btc_to_usd_rate()
+    def handle(
+        self, args: WalletHandlerArgs, next_handler: Next[WalletHandlerArgs]
+    ) -> Response:
+        exchange_rate = args.rate_provider.get_btc_to_usd_rate()
         if exchange_rate is None:
             return Response(
                 success=False,
@@ -108,4 +105,27 @@ class ExchangeRateHandler(WalletHandler):
                 status_code=500,
             )
         args.exchange_rate = exchange_rate
-        return super().handle(args)
+        return next_handler(args)
+
+
+WalletPipeline = Pipeline[WalletHandlerArgs]
+
+
+@dataclass(frozen=True)
+class WalletPipelines:
+    add_wallet: WalletPipeline
+    wallet_info: WalletPipeline
+    # authorizes reading a wallet's transactions
+    wallet_access: WalletPipeline
+
+
+def default_wallet_pipelines() -> WalletPipelines:
+    return WalletPipelines(
+        add_wallet=Pipeline(
+            [UserCheckHandler(), WalletCountCheckHandler(), AddWalletHandler()]
+        ),
+        wallet_info=Pipeline(
+            [UserCheckHandler(), WalletCheckHandler(), ExchangeRateHandler()]
+        ),
+        wallet_access=Pipeline([UserCheckHandler(), WalletCheckHandler()]),
+    )
@@ -1,15 +1,22 @@
 from dataclasses import dataclass
-from typing import Optional, Protocol
-
-from app.core.entities import Response
-from app.core.transaction.transaction_interactor import TransactionsResponse
+from typing import List, Optional, Protocol
+
+from app.core.entities import Response, Transaction
+from app.core.exchange_rate import IExchangeRateProvider
+from app.core.money import to_usd
+from app.core.principal_cache import PrincipalCache
+from app.core.transaction.transaction_interactor import (
+    MAX_PAGE_SIZE,
+    TransactionPagesResponse,
+    TransactionsResponse,
+    next_since,
+    paginate,
+)
+from app.core.unit_of_work import StatsCallback, UnitOfWork, WalletUnitOfWork
 from app.core.wallet.wallet_CoR import (
-    AddWalletHandler,
-    ExchangeRateHandler,
-    UserCheckHandler,
-    WalletCheckHandler,
-    WalletCountCheckHandler,
     WalletHandlerArgs,
+    WalletPipelines,
+    default_wallet_pipelines,
 )
 from app.core.wallet.wallet_repository import IWalletRepository
 
@@ -17,7 +24,7 @@ from app.core.wallet.wallet_repository import IWalletRepository
 @dataclass
 class WalletInfo:
     wallet_address: str
-    btc_balance: float
+    balance_sat: int
     usd_balance: float
 
 
@@ -36,6 +43,8 @@ class GetWalletRequest:
 class FetchWalletTransactionsRequest:
     api_key: str
     wallet_address: str
+    since: Optional[int] = None
+    limit: Optional[int] = None
 
 
 @dataclass
@@ -55,20 +64,40 @@ class IWalletInteractor(Protocol):
     ) -> TransactionsResponse:
         pass
 
+    def stream_wallet_transactions(
+        self, request: FetchWalletTransactionsRequest
+    ) -> TransactionPagesResponse:
+        pass
+
 
 class WalletInteractor:
-    def __init__(self, wallet_repository: IWalletRepository):
+    def __init__(
+        self,
+        wallet_repository: IWalletRepository,
+        rate_provider: IExchangeRateProvider,
+        principal_cache: Optional[PrincipalCache] = None,
+        on_stats: Optional[StatsCallback] = None,
+        pipelines: Optional[WalletPipelines] = None,
+    ):
         self.wallet_repository = wallet_repository
+        self.rate_provider = rate_provider
+        self.principal_cache = principal_cache
+        self.on_stats = on_stats
+        self.pipelines = (
+            pipelines if pipelines is not None else default_wallet_pipelines()
+        )
 
     def add_wallet(self, request: AddWalletRequest) -> WalletResponse:
-        handler = UserCheckHandler()
-        handler.set_next(WalletCountCheckHandler()).set_next(AddWalletHandler())
+        unit_of_work = WalletUnitOfWork(self.wallet_repository, self.principal_cache)
         args = WalletHandlerArgs(
-            api_key=request.api_key, repository=self.wallet_repository
+            api_key=request.api_key,
+            repository=unit_of_work,
+            rate_provider=self.rate_provider,
         )
 
-        response = handler.handle(args)
+        response = self.pipelines.add_wallet(args)
         if not response.success:
+            self.__report(unit_of_work)
             return WalletResponse(
                 success=response.success,
                 message=response.message,
@@ -76,19 +105,29 @@ class WalletInteractor:
                 wallet_info=None,
             )
         assert args.wallet_address is not None
-        return self.get_wallet_info(
-            GetWalletRequest(request.api_key, args.wallet_address)
+        wallet_response = self.__get_wallet_info(
+            GetWalletRequest(request.api_key, args.wallet_address), unit_of_work
         )
+        unit_of_work.commit()
+        self.__report(unit_of_work)
+        return wallet_response
 
     def get_wallet_info(self, request: GetWalletRequest) -> WalletResponse:
-        handler = UserCheckHandler()
-        handler.set_next(WalletCheckHandler()).set_next(ExchangeRateHandler())
+        unit_of_work = WalletUnitOfWork(self.wallet_repository, self.principal_cache)
+        response = self.__get_wallet_info(request, unit_of_work)
+        self.__report(unit_of_work)
+        return response
+
+    def __get_wallet_info(
+        self, request: GetWalletRequest, unit_of_work: WalletUnitOfWork
+    ) -> WalletResponse:
         args = WalletHandlerArgs(
             api_key=request.api_key,
-            repository=self.wallet_repository,
+            repository=unit_of_work,
+            rate_provider=self.rate_provider,
             wallet_address=request.wallet_address,
         )
-        response = handler.handle(args)
+        response = self.pipelines.wallet_info(args)
 
         if not response.success:
             return WalletResponse(
@@ -100,11 +139,10 @@ class WalletInteractor:
         assert args.wallet is not None
         assert args.exchange_rate is not None
 
-        usd_balance = args.wallet.btc_balance * args.exchange_rate
         wallet_info = WalletInfo(
             wallet_address=request.wallet_address,
-            btc_balance=args.wallet.btc_balance,
-            usd_balance=usd_balance,
+            balance_sat=args.wallet.balance_sat,
+            usd_balance=to_usd(args.wallet.balance_sat, args.exchange_rate),
         )
         return WalletResponse(
             success=True,
@@ -116,15 +154,15 @@ class WalletInteractor:
     def get_wallet_transactions(
         self, request: FetchWalletTransactionsRequest
     ) -> TransactionsResponse:
-        handler = UserCheckHandler()
-        handler.set_next(WalletCheckHandler())
-        args = WalletHandlerArgs(
-            api_key=request.api_key,
-            repository=self.wallet_repository,
-            wallet_address=request.wallet_address,
-        )
+        if request.limit is not None and not 0 < request.limit <= MAX_PAGE_SIZE:
+            return TransactionsResponse(
+                success=False,
+                message=f"Limit must be between 1 and {MAX_PAGE_SIZE}",
+                status_code=400,
+                transactions=None,
+            )
 
-        response = handler.handle(args)
+        response = self.__check_wallet_access(request)
         if not response.success:
             return TransactionsResponse(
                 success=response.success,
@@ -133,11 +171,57 @@ class WalletInteractor:
                 transactions=None,
             )
 
+        limit = request.limit if request.limit is not None else MAX_PAGE_SIZE
+        transactions = self.wallet_repository.get_wallet_transactions(
+            request.wallet_address, request.since, limit
+        )
         return TransactionsResponse(
             success=True,
             message="Here are your wallet transactions",
             status_code=200,
-            transactions=self.wallet_repository.get_wallet_transactions(
-                request.wallet_address
-            ),
+            transactions=transactions,
+            next_since=next_since(transactions, limit),
         )
+
+    def stream_wallet_transactions(
+        self, request: FetchWalletTransactionsRequest
+    ) -> TransactionPagesResponse:
+        response = self.__check_wallet_access(request)
+        if not response.success:
+            return TransactionPagesResponse(
+                success=response.success,
+                message=response.message,
+                status_code=response.status_code,
+                pages=None,
+            )
+
+        def fetch(since: Optional[int], limit: int) -> List[Transaction]:
+            return self.wallet_repository.get_wallet_transactions(
+                request.wallet_address, since, limit
+            )
+
+        return TransactionPagesResponse(
+            success=True,
+            message="Here are your wallet transactions",
+            status_code=200,
+            pages=paginate(fetch, request.since),
+        )
+
+    def __check_wallet_access(
+        self, request: FetchWalletTransactionsRequest
+    ) -> Response:
+        unit_of_work = WalletUnitOfWork(self.wallet_repository, self.principal_cache)
+        args = WalletHandlerArgs(
+            api_key=request.api_key,
+            repository=unit_of_work,
+            rate_provider=self.rate_provider,
+            wallet_address=request.wallet_address,
+        )
+
+        response = self.pipelines.wallet_access(args)
+        self.__report(unit_of_work)
+        return response
+
+    def __report(self, unit_of_work: UnitOfWork) -> None:
+        if self.on_stats is not None:
+            self.on_stats(unit_of_work.stats)
@@ -13,7 +13,16 @@ class IWalletRepository(Protocol):
     def get_wallet(self, wallet_address: str) -> Optional[Wallet]:
         pass
 
-    def get_wallet_transactions(self, wallet_address: str) -> List[Transaction]:
+    def get_wallet_user(self, wallet: Wallet) -> UserInfo:
+        pass
+
+    # ordered by id; only ids above since, at most limit rows
+    def get_wallet_transactions(
+        self,
+        wallet_address: str,
+        since: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Transaction]:
         pass
 
     def add_wallet(self, wallet: Wallet, user: UserInfo) -> None:
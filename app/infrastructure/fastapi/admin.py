@@ -1,15 +1,119 @@
-from fastapi import APIRouter, Depends
+import time
+from typing import Optional, Union
 
-from app.core.admin.admin_interactor import StatisticsRequest, StatisticsResponse
-from app.core.facade import BTCWalletService
-from app.infrastructure.fastapi.dependables import get_core
+from fastapi import APIRouter, Depends, Request
+from starlette.responses import PlainTextResponse
+
+from app.core.admin.admin_interactor import (
+    ProfileRequest,
+    RequestProfileRequest,
+    RequestProfilesResponse,
+    StatisticsRequest,
+    TimeSeriesRequest,
+)
+from app.core.entities import Response
+from app.core.facade import AsyncBTCWalletService
+from app.infrastructure.fastapi.dependables import get_async_core
+from app.infrastructure.fastapi.profiling import route_names
+from app.infrastructure.fastapi.views import (
+    StatisticsView,
+    TimeSeriesView,
+    statistics_view,
+    time_series_view,
+)
 
 admin_api = APIRouter()
 
 
 @admin_api.get("/statistics")
-def get_statistics(
-    api_key: str, core: BTCWalletService = Depends(get_core)
-) -> StatisticsResponse:
+async def get_statistics(
+    api_key: str, core: AsyncBTCWalletService = Depends(get_async_core)
+) -> StatisticsView:
+    request = StatisticsRequest(api_key=api_key)
+    return statistics_view(await core.get_statistics(request))
+
+
+@admin_api.post("/statistics/reconcile")
+async def reconcile_statistics(
+    api_key: str, core: AsyncBTCWalletService = Depends(get_async_core)
+) -> StatisticsView:
+    request = StatisticsRequest(api_key=api_key)
+    return statistics_view(await core.reconcile_statistics(request))
+
+
+@admin_api.get("/statistics/timeseries")
+async def get_time_series(
+    api_key: str,
+    granularity: str = "hour",
+    wallet_address: Optional[str] = None,
+    user_email: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> TimeSeriesView:
+    request = TimeSeriesRequest(
+        api_key=api_key,
+        granularity=granularity,
+        wallet_address=wallet_address,
+        user_email=user_email,
+        since=since,
+        until=until,
+    )
+    return time_series_view(await core.get_time_series(request))
+
+
+@admin_api.post("/caches/invalidate")
+async def invalidate_caches(
+    api_key: str, core: AsyncBTCWalletService = Depends(get_async_core)
+) -> Response:
+    request = StatisticsRequest(api_key=api_key)
+    return await core.invalidate_caches(request)
+
+
+@admin_api.post("/profile")
+async def profile(
+    api_key: str,
+    seconds: float = 10.0,
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> Union[Response, PlainTextResponse]:
+    """Samples every thread of the worker serving this request for
+    ``seconds`` and returns the stacks collapsed, for a flamegraph."""
+    response = await core.profile(ProfileRequest(api_key=api_key, seconds=seconds))
+    if response.collapsed_stacks is None:
+        return Response(
+            success=response.success,
+            message=response.message,
+            status_code=response.status_code,
+        )
+    filename = f"profile-{int(time.time())}.collapsed"
+    return PlainTextResponse(
+        response.collapsed_stacks,
+        headers={"content-disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@admin_api.post("/profile/requests")
+async def profile_requests(
+    api_key: str,
+    route: str,
+    http_request: Request,
+    count: int = 10,
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> Response:
+    """Profiles the next ``count`` requests to ``route``, e.g.
+    "POST /transactions", that reach this worker."""
+    request = RequestProfileRequest(
+        api_key=api_key,
+        route=route,
+        count=count,
+        known_routes=frozenset(route_names(http_request.app.routes)),
+    )
+    return await core.profile_requests(request)
+
+
+@admin_api.get("/profile/requests")
+async def get_request_profiles(
+    api_key: str, core: AsyncBTCWalletService = Depends(get_async_core)
+) -> RequestProfilesResponse:
     request = StatisticsRequest(api_key=api_key)
-    return core.get_statistics(request)
+    return await core.get_request_profiles(request)
@@ -1,8 +1,13 @@
 from starlette.requests import Request
 
-from app.core.facade import BTCWalletService
+from app.core.facade import AsyncBTCWalletService, BTCWalletService
 
 
 def get_core(request: Request) -> BTCWalletService:
     core: BTCWalletService = request.app.state.core
     return core
+
+
+def get_async_core(request: Request) -> AsyncBTCWalletService:
+    core: AsyncBTCWalletService = request.app.state.async_core
+    return core
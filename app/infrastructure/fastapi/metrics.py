@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from starlette.responses import Response
+
+from app.core.metrics import CONTENT_TYPE, REGISTRY
+
+metrics_api = APIRouter()
+
+
+@metrics_api.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    # as a header, since a text/* media_type would get a second charset
+    return Response(REGISTRY.render(), headers={"content-type": CONTENT_TYPE})
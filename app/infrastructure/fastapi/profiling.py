@@ -0,0 +1,47 @@
+from typing import Iterable, Optional
+
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.profiling import RequestProfiler, profiling
+
+
+class RequestProfilingMiddleware:
+    """Marks requests to the routes armed in ``profiler`` for profiling.
+    Until a route is armed, requests pass through untouched."""
+
+    def __init__(self, app: ASGIApp, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.armed:
+            await self.app(scope, receive, send)
+            return
+
+        route = route_name(scope["app"].routes, scope)
+        profile = self.profiler.claim(route) if route is not None else None
+        if route is None or profile is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            with profiling(profile):
+                await self.app(scope, receive, send)
+        finally:
+            self.profiler.finish(route, profile)
+
+
+def route_name(routes: Iterable[BaseRoute], scope: Scope) -> Optional[str]:
+    """Method and path template of the route serving the request, e.g.
+    "GET /wallets/{address}"."""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{scope['method']} {getattr(route, 'path', '')}"
+    return None
+
+
+def route_names(routes: Iterable[BaseRoute]) -> Iterable[str]:
+    for route in routes:
+        for method in getattr(route, "methods", None) or ():
+            yield f"{method} {getattr(route, 'path', '')}"
@@ -0,0 +1,32 @@
+import json
+from dataclasses import asdict
+from typing import AsyncIterator, List, Union
+
+from starlette.responses import StreamingResponse
+
+from app.core.entities import Response, Transaction
+from app.core.facade import AsyncTransactionPagesResponse
+from app.infrastructure.fastapi.views import transaction_view
+
+
+async def ndjson_lines(
+    pages: AsyncIterator[List[Transaction]],
+) -> AsyncIterator[bytes]:
+    async for page in pages:
+        yield "".join(
+            f"{json.dumps(asdict(transaction_view(t)))}\n" for t in page
+        ).encode()
+
+
+def ndjson_response(
+    response: AsyncTransactionPagesResponse,
+) -> Union[Response, StreamingResponse]:
+    if response.pages is None:
+        return Response(
+            success=response.success,
+            message=response.message,
+            status_code=response.status_code,
+        )
+    return StreamingResponse(
+        ndjson_lines(response.pages), media_type="application/x-ndjson"
+    )
@@ -0,0 +1,46 @@
+from typing import Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.tracing import Tracer
+
+
+class TracingMiddleware:
+    """Opens the root span of every sampled HTTP request and returns its
+    ``traceparent`` in the response, so a client can look the trace up."""
+
+    def __init__(self, app: ASGIApp, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent: Optional[str] = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        method, path = scope["method"], scope["path"]
+        attributes = {"http.method": method, "http.target": path}
+        with self.tracer.request_span(
+            f"{method} {path}", traceparent, attributes
+        ) as span:
+            if span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_traced(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    assert span is not None
+                    span.set_attribute("http.status_code", message["status"])
+                    headers = [
+                        *message.get("headers", []),
+                        (b"traceparent", span.traceparent().encode()),
+                    ]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
@@ -1,30 +1,91 @@
-from fastapi import APIRouter, Depends
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, Depends, Header
+from starlette.responses import StreamingResponse
 
 from app.core.entities import Response
-from app.core.facade import BTCWalletService
-from app.core.transaction.transaction_CoR import MakeTransactionRequest
-from app.core.transaction.transaction_interactor import TransactionsResponse
-from app.infrastructure.fastapi.dependables import get_core
+from app.core.facade import AsyncBTCWalletService
+from app.infrastructure.fastapi.dependables import get_async_core
+from app.infrastructure.fastapi.streaming import ndjson_response
+from app.infrastructure.fastapi.views import (
+    TransactionsView,
+    TransferJobView,
+    TransferRequest,
+    invalid_amount,
+    transactions_view,
+    transfer_job_view,
+    transfer_request,
+)
 
 transaction_api = APIRouter()
 
 
 @transaction_api.get("/transactions")
-def get_transactions(
-    api_key: str, core: BTCWalletService = Depends(get_core)
-) -> TransactionsResponse:
-    return core.get_transactions(api_key)
+async def get_transactions(
+    api_key: str,
+    since: Optional[int] = None,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> Union[TransactionsView, Response, StreamingResponse]:
+    if stream:
+        return ndjson_response(await core.stream_transactions(api_key, since))
+    return transactions_view(await core.get_transactions(api_key, since, limit))
 
 
 @transaction_api.post("/transactions")
-def make_transaction(
+async def make_transaction(
     api_key: str,
     wallet_address_from: str,
     wallet_address_to: str,
     btc_amount: float,
-    core: BTCWalletService = Depends(get_core),
-) -> Response:
-    request = MakeTransactionRequest(
-        api_key, wallet_address_from, wallet_address_to, btc_amount
-    )
-    return core.make_transaction(request)
+    asynchronous: bool = False,
+    idempotency_key: Optional[str] = Header(None),
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> Union[Response, TransferJobView]:
+    try:
+        request = transfer_request(
+            TransferRequest(
+                api_key,
+                wallet_address_from,
+                wallet_address_to,
+                btc_amount,
+                idempotency_key,
+            )
+        )
+    except ValueError as e:
+        return invalid_amount(e)
+    # queued, answered with a job id to poll
+    if asynchronous:
+        return transfer_job_view(await core.submit_transaction(request))
+    return await core.make_transaction(request)
+
+
+@transaction_api.get("/transactions/jobs/{job_id}")
+async def get_transfer_job(
+    job_id: int,
+    api_key: str,
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> TransferJobView:
+    return transfer_job_view(await core.get_transfer_job(api_key, job_id))
+
+
+@transaction_api.post("/transactions/batch")
+async def make_transactions(
+    requests: List[TransferRequest],
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> List[Response]:
+    # items with unusable amounts are answered here, the rest in one batch
+    responses: List[Optional[Response]] = []
+    transfers = []
+    for request in requests:
+        try:
+            transfers.append(transfer_request(request))
+            responses.append(None)
+        except ValueError as e:
+            responses.append(invalid_amount(e))
+
+    applied = iter(await core.make_transactions(transfers))
+    return [
+        response if response is not None else next(applied) for response in responses
+    ]
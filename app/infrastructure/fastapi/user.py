@@ -1,15 +1,15 @@
 from fastapi import APIRouter, Depends
 
-from app.core.facade import BTCWalletService
+from app.core.facade import AsyncBTCWalletService
 from app.core.user.user_interactor import RegisterUserRequest, RegisterUserResponse
-from app.infrastructure.fastapi.dependables import get_core
+from app.infrastructure.fastapi.dependables import get_async_core
 
 user_api = APIRouter()
 
 
 @user_api.post("/users")
-def register_user(
-    email: str, core: BTCWalletService = Depends(get_core)
+async def register_user(
+    email: str, core: AsyncBTCWalletService = Depends(get_async_core)
 ) -> RegisterUserResponse:
     request = RegisterUserRequest(email=email)
-    return core.register_user(request)
+    return await core.register_user(request)
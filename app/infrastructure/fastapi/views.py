@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.core.admin.admin_interactor import StatisticsResponse, TimeSeriesResponse
+from app.core.entities import Response, StatisticsBucket, Transaction
+from app.core.money import BASIS_POINTS, to_btc, to_satoshis
+from app.core.transaction.transaction_CoR import MakeTransactionRequest
+from app.core.transaction.transaction_interactor import (
+    TransactionsResponse,
+    TransferJobResponse,
+)
+from app.core.wallet.wallet_interactor import WalletResponse
+
+# The core counts satoshis and basis points; the API speaks BTC and fee
+# fractions, converted here and nowhere else.
+
+
+@dataclass
+class TransferRequest:
+    api_key: str
+    wallet_address_from: str
+    wallet_address_to: str
+    btc_amount: float
+    idempotency_key: Optional[str] = None
+
+
+@dataclass
+class TransactionView:
+    wallet_address_from: str
+    wallet_address_to: str
+    btc_amount: float
+    fee_pct: float
+    exchange_rate: float
+    transaction_id: Optional[int]
+
+
+@dataclass
+class TransactionsView(Response):
+    transactions: Optional[List[TransactionView]]
+    next_since: Optional[int]
+
+
+@dataclass
+class TransferJobView(Response):
+    job_id: Optional[int]
+    # queued, running or done
+    job_status: Optional[str]
+    # the response of the transfer, once done
+    result: Optional[Response]
+
+
+@dataclass
+class WalletInfoView:
+    wallet_address: str
+    btc_balance: float
+    usd_balance: float
+
+
+@dataclass
+class WalletView(Response):
+    wallet_info: Optional[WalletInfoView]
+
+
+@dataclass
+class StatisticsInfoView:
+    total_transaction_count: int
+    total_btc_profit: float
+
+
+@dataclass
+class StatisticsView(Response):
+    statistics_info: Optional[StatisticsInfoView]
+
+
+@dataclass
+class StatisticsBucketView:
+    bucket_start: int
+    transfer_count: int
+    btc_volume: float
+    usd_volume: float
+    btc_profit: float
+
+
+@dataclass
+class TimeSeriesView(Response):
+    buckets: Optional[List[StatisticsBucketView]]
+
+
+def transfer_request(request: TransferRequest) -> MakeTransactionRequest:
+    """Raises ValueError for amounts that are not positive or are below one
+    satoshi."""
+    return MakeTransactionRequest(
+        api_key=request.api_key,
+        wallet_address_from=request.wallet_address_from,
+        wallet_address_to=request.wallet_address_to,
+        amount_sat=to_satoshis(request.btc_amount),
+        idempotency_key=request.idempotency_key,
+    )
+
+
+def invalid_amount(error: ValueError) -> Response:
+    return Response(success=False, message=str(error), status_code=400)
+
+
+def transaction_view(transaction: Transaction) -> TransactionView:
+    return TransactionView(
+        wallet_address_from=transaction.wallet_address_from,
+        wallet_address_to=transaction.wallet_address_to,
+        btc_amount=to_btc(transaction.amount_sat),
+        fee_pct=transaction.fee_bps / BASIS_POINTS,
+        exchange_rate=transaction.exchange_rate,
+        transaction_id=transaction.transaction_id,
+    )
+
+
+def transactions_view(response: TransactionsResponse) -> TransactionsView:
+    return TransactionsView(
+        success=response.success,
+        message=response.message,
+        status_code=response.status_code,
+        transactions=(
+            [transaction_view(t) for t in response.transactions]
+            if response.transactions is not None
+            else None
+        ),
+        next_since=response.next_since,
+    )
+
+
+def transfer_job_view(response: TransferJobResponse) -> TransferJobView:
+    job = response.job
+    result = None
+    if job is not None and job.status_code is not None:
+        assert job.success is not None and job.message is not None
+        result = Response(
+            success=job.success, message=job.message, status_code=job.status_code
+        )
+    return TransferJobView(
+        success=response.success,
+        message=response.message,
+        status_code=response.status_code,
+        job_id=job.job_id if job is not None else None,
+        job_status=job.status if job is not None else None,
+        result=result,
+    )
+
+
+def wallet_view(response: WalletResponse) -> WalletView:
+    info = response.wallet_info
+    return WalletView(
+        success=response.success,
+        message=response.message,
+        status_code=response.status_code,
+        wallet_info=(
+            WalletInfoView(
+                wallet_address=info.wallet_address,
+                btc_balance=to_btc(info.balance_sat),
+                usd_balance=info.usd_balance,
+            )
+            if info is not None
+            else None
+        ),
+    )
+
+
+def statistics_view(response: StatisticsResponse) -> StatisticsView:
+    info = response.statistics_info
+    return StatisticsView(
+        success=response.success,
+        message=response.message,
+        status_code=response.status_code,
+        statistics_info=(
+            StatisticsInfoView(
+                total_transaction_count=info.total_transaction_count,
+                total_btc_profit=to_btc(info.total_profit_sat),
+            )
+            if info is not None
+            else None
+        ),
+    )
+
+
+def bucket_view(bucket: StatisticsBucket) -> StatisticsBucketView:
+    return StatisticsBucketView(
+        bucket_start=bucket.bucket_start,
+        transfer_count=bucket.transfer_count,
+        btc_volume=to_btc(bucket.volume_sat),
+        usd_volume=bucket.usd_volume,
+        btc_profit=to_btc(bucket.profit_sat),
+    )
+
+
+def time_series_view(response: TimeSeriesResponse) -> TimeSeriesView:
+    return TimeSeriesView(
+        success=response.success,
+        message=response.message,
+        status_code=response.status_code,
+        buckets=(
+            [bucket_view(bucket) for bucket in response.buckets]
+            if response.buckets is not None
+            else None
+        ),
+    )
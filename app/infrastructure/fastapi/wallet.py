@@ -1,37 +1,55 @@
+from typing import Optional, Union
+
 from fastapi import APIRouter, Depends
+from starlette.responses import StreamingResponse
 
-from app.core.facade import BTCWalletService
-from app.core.transaction.transaction_interactor import TransactionsResponse
+from app.core.entities import Response
+from app.core.facade import AsyncBTCWalletService
 from app.core.wallet.wallet_interactor import (
     AddWalletRequest,
     FetchWalletTransactionsRequest,
     GetWalletRequest,
-    WalletResponse,
 )
-from app.infrastructure.fastapi.dependables import get_core
+from app.infrastructure.fastapi.dependables import get_async_core
+from app.infrastructure.fastapi.streaming import ndjson_response
+from app.infrastructure.fastapi.views import (
+    TransactionsView,
+    WalletView,
+    transactions_view,
+    wallet_view,
+)
 
 wallet_api = APIRouter()
 
 
 @wallet_api.post("/wallets")
-def add_wallet(
-    api_key: str, core: BTCWalletService = Depends(get_core)
-) -> WalletResponse:
+async def add_wallet(
+    api_key: str, core: AsyncBTCWalletService = Depends(get_async_core)
+) -> WalletView:
     request = AddWalletRequest(api_key)
-    return core.add_wallet(request)
+    return wallet_view(await core.add_wallet(request))
 
 
 @wallet_api.get("/wallets/{address}")
-def get_wallet(
-    api_key: str, address: str, core: BTCWalletService = Depends(get_core)
-) -> WalletResponse:
+async def get_wallet(
+    api_key: str, address: str, core: AsyncBTCWalletService = Depends(get_async_core)
+) -> WalletView:
     request = GetWalletRequest(api_key=api_key, wallet_address=address)
-    return core.get_wallet(request)
+    return wallet_view(await core.get_wallet(request))
 
 
 @wallet_api.get("/wallets/{address}/transactions")
-def get_wallet_transactions(
-    api_key: str, address: str, core: BTCWalletService = Depends(get_core)
-) -> TransactionsResponse:
-    request = FetchWalletTransactionsRequest(api_key=api_key, wallet_address=address)
-    return core.get_wallet_transactions(request)
+async def get_wallet_transactions(
+    api_key: str,
+    address: str,
+    since: Optional[int] = None,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    core: AsyncBTCWalletService = Depends(get_async_core),
+) -> Union[TransactionsView, Response, StreamingResponse]:
+    request = FetchWalletTransactionsRequest(
+        api_key=api_key, wallet_address=address, since=since, limit=limit
+    )
+    if stream:
+        return ndjson_response(await core.stream_wallet_transactions(request))
+    return transactions_view(await core.get_wallet_transactions(request))
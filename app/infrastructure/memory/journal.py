@@ -0,0 +1,114 @@
+import os
+import struct
+import threading
+import zlib
+from typing import Iterator
+
+# payload length and CRC-32 of the payload, little-endian
+HEADER = struct.Struct("<II")
+
+
+class JournalCorruptError(Exception):
+    pass
+
+
+class Journal:
+    """Append-only file of length-prefixed, CRC-checked records.
+
+    ``append`` writes a record behind a buffer and returns a ticket;
+    ``sync`` returns once the record with that ticket is on disk. Syncs are
+    grouped: the first caller flushes and, with ``fsync``, fsyncs everything
+    appended so far while later callers wait for it, so concurrent writers
+    share one fsync instead of paying one each.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.__condition = threading.Condition()
+        self.__file = open(path, "a+b")
+        self.__size = 0
+        self.__appended = 0
+        self.__synced = 0
+        self.__syncing = False
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def replay(self) -> Iterator[bytes]:
+        """Yields every record in order, before anything is appended. A torn
+        record at the end, left by a crash mid-append, is cut off; a damaged
+        record anywhere else raises."""
+        end = self.__file.seek(0, os.SEEK_END)
+        self.__file.seek(0)
+        offset = 0
+        while offset < end:
+            header = self.__file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            length, checksum = HEADER.unpack(header)
+            payload = self.__file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                if offset + HEADER.size + length < end:
+                    raise JournalCorruptError(
+                        f"Damaged record at byte {offset} of {self.path}"
+                    )
+                break
+            offset += HEADER.size + length
+            yield payload
+        self.__file.truncate(offset)
+        self.__size = offset
+
+    def append(self, payload: bytes) -> int:
+        with self.__condition:
+            self.__file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+            self.__file.write(payload)
+            self.__size += HEADER.size + len(payload)
+            self.__appended += 1
+            return self.__appended
+
+    def sync(self, ticket: int) -> None:
+        with self.__condition:
+            while self.__synced < ticket:
+                if not self.__syncing:
+                    break
+                self.__condition.wait()
+            else:
+                return
+            self.__syncing = True
+            target = self.__appended
+            self.__file.flush()
+
+        synced = False
+        try:
+            if self.fsync:
+                os.fsync(self.__file.fileno())
+            synced = True
+        finally:
+            with self.__condition:
+                self.__syncing = False
+                if synced:
+                    self.__synced = target
+                self.__condition.notify_all()
+
+    def rotate(self, path: str) -> None:
+        """Moves the records to ``path`` and goes on in an empty file. What
+        was appended is synced first, as later syncs cover the new file."""
+        with self.__condition:
+            while self.__syncing:
+                self.__condition.wait()
+            self.__file.flush()
+            if self.fsync:
+                os.fsync(self.__file.fileno())
+            os.replace(self.path, path)
+            self.__file.close()
+            self.__file = open(self.path, "a+b")
+            self.__size = 0
+            self.__synced = self.__appended
+            self.__condition.notify_all()
+
+    def close(self) -> None:
+        self.sync(self.__appended)
+        with self.__condition:
+            self.__file.close()
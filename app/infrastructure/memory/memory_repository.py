@@ -0,0 +1,696 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_right, insort
+from collections import deque
+from dataclasses import astuple, dataclass, field, replace
+from heapq import merge
+from itertools import repeat
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from app.core.admin.admin_repository import BUCKET_WIDTHS
+from app.core.entities import (
+    JOB_DONE,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    IdempotencyRecord,
+    StatisticsBucket,
+    StatisticsInfo,
+    Transaction,
+    TransferJob,
+    UserInfo,
+    Wallet,
+)
+from app.core.money import to_usd, transfer_fee
+from app.infrastructure.memory.journal import Journal
+
+# from, to, amount_sat, fee_bps, exchange rate, created_at; the id of a
+# ledger row is its position plus one
+LedgerRow = Tuple[str, str, int, int, float, int]
+
+
+def _ledger_row(values: Sequence[Any]) -> LedgerRow:
+    source, target, amount, fee_bps, rate, created_at = values
+    return source, target, amount, fee_bps, rate, created_at
+
+
+@dataclass
+class _Rollup:
+    # bucket starts in order, for range scans
+    starts: List[int] = field(default_factory=list)
+    buckets: Dict[int, List[Any]] = field(default_factory=dict)
+
+
+class RepositoryLockedError(Exception):
+    pass
+
+
+class MemoryRepository:
+    """Repository held in dicts and id indexes, with no storage round trips.
+
+    Returns what SQLiteRepository returns for the same calls. One lock covers
+    every call, so a batch of transfers is atomic. Entities handed out are
+    copies; the caller may change them freely.
+
+    With ``path``, the state survives restarts. Every change is written
+    ahead to the journal ``<path>.log`` and the call returns once the record
+    is on disk; concurrent calls share the fsync (see ``Journal``). A change
+    is visible to other calls slightly before it is durable, but is never
+    acknowledged before. Claims of transfer jobs are not written: on
+    opening, jobs that are not done are queued again. ``snapshot()`` writes
+    the whole state to ``<path>.snapshot`` and starts the journal afresh.
+    Once the journal outgrows ``compact_bytes`` the same happens by itself:
+    the call that crossed it copies the state and moves the journal to
+    ``<path>.log.1`` under the lock, and a background thread writes the
+    snapshot and then removes the old journal. Opening loads the snapshot,
+    then replays both journals. The state lives in one process, so serve it
+    from a single worker: opening takes an exclusive lock on ``<path>.lock``
+    until ``close()``, and raises ``RepositoryLockedError`` while another
+    process holds it.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        fsync: bool = True,
+        compact_bytes: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
+        self.clock = clock
+        self.__lock = threading.RLock()
+        self.__users: Dict[str, UserInfo] = {}
+        self.__users_by_email: Dict[str, UserInfo] = {}
+        self.__balances: Dict[str, int] = {}
+        self.__owners: Dict[str, str] = {}
+        self.__user_wallets: Dict[str, List[str]] = {}
+        self.__ledger: List[LedgerRow] = []
+        self.__wallet_ledger: Dict[str, List[int]] = {}
+        self.__transaction_count = 0
+        self.__profit_sat = 0
+        self.__rollups: Dict[Tuple[str, str, str], _Rollup] = {}
+        self.__cache_versions: Dict[str, int] = {}
+        self.__idempotency_keys: Dict[Tuple[str, str], IdempotencyRecord] = {}
+        # jobs by id, ids by idempotency key, and of the jobs not done those
+        # waiting in id order and those claimed, with the end of their lease
+        self.__jobs: Dict[int, TransferJob] = {}
+        self.__job_keys: Dict[Tuple[str, str], int] = {}
+        self.__queued: Deque[int] = deque()
+        self.__leases: Dict[int, float] = {}
+        self.__sequence = 0
+        self.__journal: Optional[Journal] = None
+        self.__lock_file: Optional[IO[bytes]] = None
+        # held from taking a snapshot's copy until it is on disk
+        self.__snapshot_lock = threading.Lock()
+        if path is not None:
+            self.__load(path)
+
+    def close(self) -> None:
+        with self.__snapshot_lock:
+            self.__snapshot()
+            with self.__lock:
+                if self.__journal is None:
+                    return
+                self.__journal.close()
+                self.__journal = None
+                if self.__lock_file is not None:
+                    # closing releases the lock
+                    self.__lock_file.close()
+                    self.__lock_file = None
+
+    def snapshot(self) -> None:
+        """Writes the whole state next to the journal and starts the journal
+        afresh."""
+        with self.__snapshot_lock:
+            self.__snapshot()
+
+    def wait_for_snapshot(self) -> None:
+        """Returns once a snapshot being written in the background is on
+        disk."""
+        with self.__snapshot_lock:
+            pass
+
+    def __snapshot(self) -> None:
+        with self.__lock:
+            state = self.__capture()
+        if state is not None:
+            self.__write_snapshot(state)
+
+    def __capture(self) -> Optional[Dict[str, Any]]:
+        """A copy of the state, taken under the lock; the journal moves to
+        ``<path>.log.1`` unless one left by an unfinished snapshot is there,
+        in which case this snapshot covers both journals."""
+        if self.path is None or self.__journal is None:
+            return None
+        if not os.path.exists(f"{self.path}.log.1"):
+            self.__journal.rotate(f"{self.path}.log.1")
+        return {
+            "sequence": self.__sequence,
+            "users": [[u.api_key, u.email] for u in self.__users.values()],
+            "wallets": [
+                [address, balance, self.__owners.get(address)]
+                for address, balance in self.__balances.items()
+            ],
+            # rows are tuples, so a shallow copy does
+            "ledger": list(self.__ledger),
+            "cache_versions": dict(self.__cache_versions),
+            "idempotency_keys": [
+                astuple(record) for record in self.__idempotency_keys.values()
+            ],
+            "transfer_jobs": [astuple(job) for job in self.__jobs.values()],
+        }
+
+    def __write_snapshot(self, state: Dict[str, Any]) -> None:
+        assert self.path is not None
+        temporary = f"{self.path}.snapshot.tmp"
+        with open(temporary, "w") as snapshot:
+            json.dump(state, snapshot, separators=(",", ":"))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary, f"{self.path}.snapshot")
+        # records up to the snapshot's sequence are skipped on replay, so a
+        # crash before this removal loses nothing
+        if os.path.exists(f"{self.path}.log.1"):
+            os.remove(f"{self.path}.log.1")
+
+    def __compact(self) -> None:
+        # a snapshot under way covers this journal the next time round
+        if not self.__snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            with self.__lock:
+                journal = self.__journal
+                state = (
+                    self.__capture()
+                    if journal is not None
+                    and self.compact_bytes is not None
+                    and journal.size >= self.compact_bytes
+                    else None
+                )
+        except BaseException:
+            self.__snapshot_lock.release()
+            raise
+        if state is None:
+            self.__snapshot_lock.release()
+            return
+        threading.Thread(
+            target=self.__finish_snapshot,
+            args=(state,),
+            name="memory-snapshot",
+            daemon=True,
+        ).start()
+
+    def __finish_snapshot(self, state: Dict[str, Any]) -> None:
+        try:
+            self.__write_snapshot(state)
+        except Exception as e:
+            # the old journal stays and the next snapshot covers it
+            print("Error writing snapshot", e)
+        finally:
+            self.__snapshot_lock.release()
+
+    def register_user(self, user: UserInfo) -> None:
+        with self.__lock:
+            if user.api_key in self.__users or user.email in self.__users_by_email:
+                raise ValueError("User already exists")
+            ticket = self.__write("user", user.api_key, user.email)
+            self.__add_user(user.api_key, user.email)
+        self.__commit(ticket)
+
+    def get_user(self, api_key: str) -> Optional[UserInfo]:
+        with self.__lock:
+            return self.__users.get(api_key)
+
+    def get_user_by_email(self, email: str) -> Optional[UserInfo]:
+        with self.__lock:
+            return self.__users_by_email.get(email)
+
+    def get_statistics(self) -> StatisticsInfo:
+        with self.__lock:
+            return StatisticsInfo(
+                total_transaction_count=self.__transaction_count,
+                total_profit_sat=self.__profit_sat,
+            )
+
+    def reconcile_statistics(self) -> StatisticsInfo:
+        with self.__lock:
+            self.__transaction_count = len(self.__ledger)
+            self.__profit_sat = sum(
+                transfer_fee(row[2], row[3]) for row in self.__ledger
+            )
+            return self.get_statistics()
+
+    def get_statistics_buckets(
+        self,
+        granularity: str,
+        since: int,
+        until: int,
+        wallet_address: Optional[str] = None,
+        user_email: Optional[str] = None,
+    ) -> List[StatisticsBucket]:
+        with self.__lock:
+            if wallet_address is not None:
+                scope = ("wallet", wallet_address)
+            elif user_email is not None:
+                user = self.__users_by_email.get(user_email)
+                if user is None:
+                    return []
+                scope = ("user", user.api_key)
+            else:
+                scope = ("all", "")
+
+            rollup = self.__rollups.get((granularity, *scope))
+            if rollup is None:
+                return []
+            first = bisect_right(rollup.starts, since - 1)
+            last = bisect_right(rollup.starts, until)
+            return [
+                StatisticsBucket(start, *rollup.buckets[start])
+                for start in rollup.starts[first:last]
+            ]
+
+    def get_cache_version(self, name: str) -> int:
+        with self.__lock:
+            return self.__cache_versions.get(name, 0)
+
+    def bump_cache_version(self, name: str) -> int:
+        with self.__lock:
+            version = self.__cache_versions.get(name, 0) + 1
+            ticket = self.__write("version", name, version)
+            self.__cache_versions[name] = version
+        self.__commit(ticket)
+        return version
+
+    def fetch_all_transactions(self) -> List[Transaction]:
+        with self.__lock:
+            return [
+                Transaction(*row[:5], transaction_id=position + 1)
+                for position, row in enumerate(self.__ledger)
+            ]
+
+    def add_transaction(self, transaction: Transaction) -> None:
+        with self.__lock:
+            for address in (
+                transaction.wallet_address_from,
+                transaction.wallet_address_to,
+            ):
+                if address not in self.__balances:
+                    raise ValueError(f"Unknown wallet {address}")
+            row = self.__ledger_row(transaction)
+            ticket = self.__write("ledger", row)
+            self.__append_ledger(row)
+        self.__commit(ticket)
+
+    def execute_transfer(self, transaction: Transaction) -> bool:
+        return self.execute_transfers([transaction])[0]
+
+    def execute_transfers(
+        self,
+        transactions: List[Transaction],
+        keys: Optional[Sequence[Optional[IdempotencyRecord]]] = None,
+    ) -> List[bool]:
+        with self.__lock:
+            # outcomes are decided against a copy of the touched balances, so
+            # nothing changes unless the whole batch reaches the journal
+            balances: Dict[str, int] = {}
+            rows: List[LedgerRow] = []
+            records: List[IdempotencyRecord] = []
+            taken: Set[Tuple[str, str]] = set()
+            applied = []
+            for transaction, key in zip(
+                transactions, keys if keys is not None else repeat(None)
+            ):
+                source = transaction.wallet_address_from
+                target = transaction.wallet_address_to
+                if source not in self.__balances or target not in self.__balances:
+                    applied.append(False)
+                    continue
+                slot = (key.api_key, key.key) if key is not None else None
+                if slot is not None and (
+                    slot in self.__idempotency_keys or slot in taken
+                ):
+                    applied.append(False)
+                    continue
+                available = balances.get(source, self.__balances[source])
+                if not 0 < transaction.amount_sat <= available:
+                    applied.append(False)
+                    continue
+                balances[source] = available - transaction.amount_sat
+                balances[target] = (
+                    balances.get(target, self.__balances[target])
+                    + transaction.amount_sat
+                    - transfer_fee(transaction.amount_sat, transaction.fee_bps)
+                )
+                rows.append(self.__ledger_row(transaction))
+                if key is not None and slot is not None:
+                    taken.add(slot)
+                    transaction_id = len(self.__ledger) + len(rows)
+                    records.append(replace(key, transaction_id=transaction_id))
+                applied.append(True)
+
+            if not rows:
+                return applied
+            if records:
+                ticket = self.__write(
+                    "transfers", rows, [astuple(record) for record in records]
+                )
+            else:
+                ticket = self.__write("transfers", rows)
+            self.__apply_transfers(rows)
+            self.__record_keys(records)
+        self.__commit(ticket)
+        return applied
+
+    def get_idempotency_record(
+        self, api_key: str, key: str
+    ) -> Optional[IdempotencyRecord]:
+        with self.__lock:
+            return self.__idempotency_keys.get((api_key, key))
+
+    def enqueue_transfer(self, job: TransferJob) -> TransferJob:
+        with self.__lock:
+            if job.idempotency_key is not None:
+                job_id = self.__job_keys.get((job.api_key, job.idempotency_key))
+                if job_id is not None:
+                    return replace(self.__jobs[job_id])
+            queued = replace(job, status=JOB_QUEUED, job_id=len(self.__jobs) + 1)
+            ticket = self.__write("job", astuple(queued))
+            self.__add_job(queued)
+        self.__commit(ticket)
+        return replace(queued)
+
+    def get_transfer_job(self, job_id: int) -> Optional[TransferJob]:
+        with self.__lock:
+            job = self.__jobs.get(job_id)
+            return replace(job) if job is not None else None
+
+    def claim_transfer_jobs(
+        self, limit: int, lease_seconds: float
+    ) -> List[TransferJob]:
+        with self.__lock:
+            now = self.clock()
+            claimed = sorted(
+                job_id for job_id, until in self.__leases.items() if until < now
+            )[:limit]
+            while self.__queued and len(claimed) < limit:
+                job_id = self.__queued.popleft()
+                # jobs finished while queued are left here and skipped
+                if self.__jobs[job_id].status == JOB_QUEUED:
+                    claimed.append(job_id)
+            claimed.sort()
+            jobs = []
+            for job_id in claimed:
+                self.__leases[job_id] = now + lease_seconds
+                job = self.__jobs[job_id]
+                job.status = JOB_RUNNING
+                jobs.append(replace(job))
+            return jobs
+
+    def finish_transfer_jobs(self, jobs: List[TransferJob]) -> None:
+        with self.__lock:
+            outcomes = [
+                [job.job_id, job.success, job.message, job.status_code]
+                for job in jobs
+                if job.job_id in self.__jobs
+            ]
+            if not outcomes:
+                return
+            ticket = self.__write("jobs_done", outcomes)
+            self.__finish_jobs(outcomes)
+        self.__commit(ticket)
+
+    def get_user_transactions(
+        self, user: UserInfo, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Transaction]:
+        with self.__lock:
+            pages = [
+                self.__page(self.__wallet_ledger[address], since, limit)
+                for address in self.__user_wallets.get(user.api_key, [])
+            ]
+            ids: List[int] = []
+            for transaction_id in merge(*pages):
+                # a transfer between two wallets of the user is listed once
+                if ids and ids[-1] == transaction_id:
+                    continue
+                if limit is not None and 0 <= limit <= len(ids):
+                    break
+                ids.append(transaction_id)
+            return self.__transactions(ids)
+
+    def get_wallet_transactions(
+        self,
+        wallet_address: str,
+        since: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Transaction]:
+        with self.__lock:
+            ids = self.__wallet_ledger.get(wallet_address, [])
+            return self.__transactions(self.__page(ids, since, limit))
+
+    def get_wallet_user(self, wallet: Wallet) -> UserInfo:
+        with self.__lock:
+            return self.__users[self.__owners[wallet.wallet_address]]
+
+    def get_wallet(self, wallet_address: str) -> Optional[Wallet]:
+        with self.__lock:
+            balance = self.__balances.get(wallet_address)
+            return Wallet(wallet_address, balance) if balance is not None else None
+
+    def get_user_wallets(self, user: UserInfo) -> List[Wallet]:
+        with self.__lock:
+            return [
+                Wallet(address, self.__balances[address])
+                for address in self.__user_wallets.get(user.api_key, [])
+            ]
+
+    def add_wallet(self, wallet: Wallet, user: UserInfo) -> None:
+        with self.__lock:
+            if wallet.wallet_address in self.__balances:
+                raise ValueError("Wallet already exists")
+            if user.api_key not in self.__users:
+                raise ValueError("Unknown user")
+            ticket = self.__write(
+                "wallet", wallet.wallet_address, wallet.balance_sat, user.api_key
+            )
+            self.__add_wallet(wallet.wallet_address, wallet.balance_sat, user.api_key)
+        self.__commit(ticket)
+
+    def update_wallet_balance(self, wallet_address: str, new_balance_sat: int) -> None:
+        with self.__lock:
+            if wallet_address not in self.__balances:
+                return
+            ticket = self.__write("balance", wallet_address, new_balance_sat)
+            self.__balances[wallet_address] = new_balance_sat
+        self.__commit(ticket)
+
+    def __ledger_row(self, transaction: Transaction) -> LedgerRow:
+        return (
+            transaction.wallet_address_from,
+            transaction.wallet_address_to,
+            transaction.amount_sat,
+            transaction.fee_bps,
+            transaction.exchange_rate,
+            int(self.clock()),
+        )
+
+    @staticmethod
+    def __page(ids: List[int], since: Optional[int], limit: Optional[int]) -> List[int]:
+        # like SQLite, a missing or negative limit means no limit
+        start = bisect_right(ids, since) if since is not None else 0
+        if limit is None or limit < 0:
+            return ids[start:]
+        end = start + limit
+        return ids[start:end]
+
+    def __transactions(self, ids: Iterable[int]) -> List[Transaction]:
+        ledger = self.__ledger
+        return [Transaction(*ledger[i - 1][:5], transaction_id=i) for i in ids]
+
+    def __add_user(self, api_key: str, email: str) -> None:
+        user = UserInfo(api_key=api_key, email=email)
+        self.__users[api_key] = user
+        self.__users_by_email[email] = user
+        self.__user_wallets[api_key] = []
+
+    def __add_wallet(self, address: str, balance: int, owner: Optional[str]) -> None:
+        self.__balances[address] = balance
+        self.__wallet_ledger[address] = []
+        if owner is not None:
+            self.__owners[address] = owner
+            self.__user_wallets[owner].append(address)
+
+    def __apply_transfers(self, rows: List[LedgerRow]) -> None:
+        for row in rows:
+            source, target, amount, fee_bps = row[:4]
+            self.__balances[source] -= amount
+            self.__balances[target] += amount - transfer_fee(amount, fee_bps)
+            self.__append_ledger(row)
+
+    def __record_keys(self, records: Iterable[IdempotencyRecord]) -> None:
+        for record in records:
+            self.__idempotency_keys[(record.api_key, record.key)] = record
+
+    def __add_job(self, job: TransferJob) -> None:
+        assert job.job_id is not None
+        self.__jobs[job.job_id] = job
+        if job.idempotency_key is not None:
+            self.__job_keys[(job.api_key, job.idempotency_key)] = job.job_id
+        if job.status != JOB_DONE:
+            job.status = JOB_QUEUED
+            self.__queued.append(job.job_id)
+
+    def __finish_jobs(self, outcomes: List[List[Any]]) -> None:
+        for job_id, success, message, status_code in outcomes:
+            job = self.__jobs[job_id]
+            self.__leases.pop(job_id, None)
+            job.status = JOB_DONE
+            job.success = success
+            job.message = message
+            job.status_code = status_code
+
+    def __append_ledger(self, row: LedgerRow) -> None:
+        source, target, amount, fee_bps, rate, created_at = row
+        self.__ledger.append(row)
+        transaction_id = len(self.__ledger)
+        self.__wallet_ledger[source].append(transaction_id)
+        if target != source:
+            self.__wallet_ledger[target].append(transaction_id)
+
+        profit = transfer_fee(amount, fee_bps)
+        self.__transaction_count += 1
+        self.__profit_sat += profit
+
+        scopes = {("all", ""), ("wallet", source), ("wallet", target)}
+        for address in (source, target):
+            owner = self.__owners.get(address)
+            if owner is not None:
+                scopes.add(("user", owner))
+        usd = to_usd(amount, rate)
+        for granularity, width in BUCKET_WIDTHS.items():
+            start = created_at - created_at % width
+            for scope in scopes:
+                self.__roll_up((granularity, *scope), start, amount, usd, profit)
+
+    def __roll_up(
+        self,
+        key: Tuple[str, str, str],
+        start: int,
+        amount: int,
+        usd: float,
+        profit: int,
+    ) -> None:
+        rollup = self.__rollups.get(key)
+        if rollup is None:
+            rollup = self.__rollups[key] = _Rollup()
+        bucket = rollup.buckets.get(start)
+        if bucket is None:
+            rollup.buckets[start] = [1, amount, usd, profit]
+            # rows arrive in time order, so this almost always appends
+            insort(rollup.starts, start)
+            return
+        bucket[0] += 1
+        bucket[1] += amount
+        bucket[2] += usd
+        bucket[3] += profit
+
+    def __write(self, *record: Any) -> int:
+        if self.__journal is None:
+            return 0
+        self.__sequence += 1
+        payload = json.dumps([self.__sequence, *record], separators=(",", ":"))
+        return self.__journal.append(payload.encode())
+
+    def __commit(self, ticket: int) -> None:
+        # called without the lock, so that concurrent calls can share a sync
+        journal = self.__journal
+        if journal is None or ticket == 0:
+            return
+        journal.sync(ticket)
+        if self.compact_bytes is not None and journal.size >= self.compact_bytes:
+            self.__compact()
+
+    def __load(self, path: str) -> None:
+        # the journal moves on compaction, so the lock is on a file of its own
+        self.__lock_file = open(f"{path}.lock", "wb")
+        try:
+            fcntl.flock(self.__lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.__lock_file.close()
+            self.__lock_file = None
+            raise RepositoryLockedError(f"{path} is open in another process") from None
+        if os.path.exists(f"{path}.snapshot"):
+            with open(f"{path}.snapshot") as snapshot:
+                state = json.load(snapshot)
+            self.__sequence = state["sequence"]
+            for api_key, email in state["users"]:
+                self.__add_user(api_key, email)
+            for address, balance, owner in state["wallets"]:
+                self.__add_wallet(address, balance, owner)
+            for row in state["ledger"]:
+                self.__append_ledger(_ledger_row(row))
+            self.__cache_versions = state["cache_versions"]
+            # snapshots from before idempotency keys and jobs lack them
+            self.__record_keys(
+                IdempotencyRecord(*values)
+                for values in state.get("idempotency_keys", [])
+            )
+            for values in state.get("transfer_jobs", []):
+                self.__add_job(TransferJob(*values))
+
+        # left by a snapshot that did not finish, and older than the journal
+        rotated = os.path.exists(f"{path}.log.1")
+        if rotated:
+            previous = Journal(f"{path}.log.1", self.fsync)
+            self.__replay_journal(previous)
+            previous.close()
+        self.__journal = Journal(f"{path}.log", self.fsync)
+        self.__replay_journal(self.__journal)
+        if rotated:
+            state = self.__capture()
+            assert state is not None
+            self.__write_snapshot(state)
+
+    def __replay_journal(self, journal: Journal) -> None:
+        for payload in journal.replay():
+            record = json.loads(payload)
+            if record[0] > self.__sequence:
+                self.__sequence = record[0]
+                self.__replay(record[1], record[2:])
+
+    def __replay(self, kind: str, values: List[Any]) -> None:
+        if kind == "user":
+            self.__add_user(*values)
+        elif kind == "wallet":
+            self.__add_wallet(*values)
+        elif kind == "balance":
+            self.__balances[values[0]] = values[1]
+        elif kind == "version":
+            self.__cache_versions[values[0]] = values[1]
+        elif kind == "ledger":
+            self.__append_ledger(_ledger_row(values[0]))
+        elif kind == "transfers":
+            self.__apply_transfers([_ledger_row(row) for row in values[0]])
+            if len(values) > 1:
+                self.__record_keys(IdempotencyRecord(*record) for record in values[1])
+        elif kind == "job":
+            self.__add_job(TransferJob(*values[0]))
+        elif kind == "jobs_done":
+            self.__finish_jobs(values[0])
+        else:
+            raise ValueError(f"Unknown record {kind!r}")
@@ -0,0 +1,87 @@
+import json
+import os
+from typing import Any, Dict, List, Sequence
+
+from app.core.tracing import AttributeValue, Span
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class OTLPFileExporter:
+    """Appends spans to a file as OTLP/JSON, one ExportTraceServiceRequest
+    per line, as the OpenTelemetry collector's file exporter writes them;
+    the collector's otlpjsonfile receiver can read the file back.
+
+    Every batch is one write to a file opened for appending, so several
+    worker processes can share the file without interleaving lines.
+    """
+
+    def __init__(self, path: str, service_name: str = "bitcoin-wallet"):
+        self.path = path
+        self.service_name = service_name
+        self.__fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def export(self, spans: Sequence[Span]) -> None:
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": encode_attributes(
+                            {"service.name": self.service_name}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "app"},
+                            "spans": [encode_span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        line = json.dumps(request, separators=(",", ":")) + "\n"
+        os.write(self.__fd, line.encode())
+
+    def close(self) -> None:
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
+
+
+def encode_span(span: Span) -> Dict[str, Any]:
+    encoded: Dict[str, Any] = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        # 64-bit integers are strings in OTLP/JSON
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": encode_attributes(span.attributes),
+        "status": (
+            {"code": STATUS_ERROR, "message": span.error}
+            if span.error is not None
+            else {"code": STATUS_OK}
+        ),
+    }
+    if span.parent_id is not None:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+
+def encode_attributes(attributes: Dict[str, AttributeValue]) -> List[Dict[str, Any]]:
+    return [
+        {"key": key, "value": encode_value(value)} for key, value in attributes.items()
+    ]
+
+
+def encode_value(value: AttributeValue) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": value}
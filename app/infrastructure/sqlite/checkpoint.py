@@ -0,0 +1,70 @@
+import threading
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.infrastructure.sqlite.connection_pool import SQLiteConnectionPool
+
+CHECKPOINT_MODES = {"PASSIVE", "FULL", "RESTART", "TRUNCATE"}
+
+
+@dataclass(frozen=True)
+class CheckpointPolicy:
+    # seconds between background checkpoints, 0 leaves it to wal_autocheckpoint
+    interval: float = 30.0
+    # PASSIVE never blocks readers or writers, so it is safe during bursts
+    mode: str = "PASSIVE"
+    # on shutdown the WAL is folded back and truncated to zero bytes
+    shutdown_mode: Optional[str] = "TRUNCATE"
+
+    def __post_init__(self) -> None:
+        for mode in (self.mode, self.shutdown_mode):
+            if mode is not None and mode.upper() not in CHECKPOINT_MODES:
+                raise ValueError(f"Unknown checkpoint mode: {mode}")
+
+
+class WalCheckpointer:
+    """Runs WAL checkpoints on a schedule driven by the app lifecycle."""
+
+    def __init__(self, pool: SQLiteConnectionPool, policy: CheckpointPolicy):
+        self.pool = pool
+        self.policy = policy
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.policy.interval <= 0 or self.__thread is not None:
+            return
+        self.__stopped.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="sqlite-checkpoint", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if self.policy.shutdown_mode is not None:
+            self.checkpoint(self.policy.shutdown_mode)
+
+    def checkpoint(self, mode: Optional[str] = None) -> Tuple[int, int, int]:
+        """Returns (busy, wal frames, checkpointed frames) as reported by SQLite."""
+        mode = (mode or self.policy.mode).upper()
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"PRAGMA wal_checkpoint({mode});")
+            row = cursor.fetchone()
+            cursor.close()
+
+        return int(row[0]), int(row[1]), int(row[2])
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.policy.interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print("Error running WAL checkpoint", e)
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from app.infrastructure.sqlite.profile import (
+    DEFAULT_PROFILE,
+    PragmaValue,
+    SQLiteProfile,
+)
+from app.infrastructure.sqlite.tracing import TracedConnection
+
+
+@dataclass
+class SQLitePoolConfig:
+    # 0 disables pooling: every checkout opens and closes its own connection
+    max_connections: int = 8
+    # seconds a caller waits for an idle connection before giving up
+    acquire_timeout: float = 5.0
+    profile: SQLiteProfile = DEFAULT_PROFILE
+    # extra pragmas, applied after the profile
+    pragmas: Dict[str, PragmaValue] = field(default_factory=dict)
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class SQLiteConnectionPool:
+    """Bounded pool of long-lived connections.
+
+    A thread keeps the connection it checked out until its outermost
+    ``connection()`` block exits, so nested checkouts share one connection
+    (and therefore one transaction). Pragmas are applied once, when a
+    connection is opened.
+
+    Connections never cross ``fork``: idle ones are closed in the parent
+    before it forks, and the child starts with an empty pool. Do not fork
+    inside a ``connection()`` block.
+    """
+
+    def __init__(self, db_name: str, config: Optional[SQLitePoolConfig] = None):
+        self.db_name = db_name
+        self.config = config if config is not None else SQLitePoolConfig()
+        self.__condition = threading.Condition()
+        self.__idle: List[sqlite3.Connection] = []
+        self.__opened = 0
+        self.__closed = False
+        self.__local = threading.local()
+        self.__inherited: List[sqlite3.Connection] = []
+        _POOLS.add(self)
+
+    @property
+    def size(self) -> int:
+        return self.__opened
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        held: Optional[sqlite3.Connection] = getattr(self.__local, "connection", None)
+        if held is not None:
+            yield held
+            return
+
+        connection = self.__acquire()
+        self.__local.connection = connection
+        try:
+            yield connection
+        finally:
+            self.__local.connection = None
+            self.__release(connection)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """``BEGIN IMMEDIATE`` ... ``COMMIT``, rolled back if the block raises.
+
+        The write lock is taken up front, so reads inside the block see the
+        state the writes will be applied to. Nested use joins the outer
+        transaction.
+        """
+        with self.connection() as connection:
+            if connection.in_transaction:
+                yield connection
+                return
+
+            connection.execute("BEGIN IMMEDIATE;")
+            try:
+                yield connection
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+
+    def close(self) -> None:
+        with self.__condition:
+            self.__closed = True
+            idle, self.__idle = self.__idle, []
+            self.__opened -= len(idle)
+            self.__condition.notify_all()
+        for connection in idle:
+            connection.close()
+
+    def _before_fork(self) -> None:
+        with self.__condition:
+            idle, self.__idle = self.__idle, []
+            self.__opened -= len(idle)
+        for connection in idle:
+            connection.close()
+
+    def _after_fork_in_child(self) -> None:
+        # closing a connection opened by the parent could checkpoint or
+        # unlink the WAL under the other processes, so it is only kept
+        # referenced
+        self.__inherited.extend(self.__idle)
+        self.__condition = threading.Condition()
+        self.__idle = []
+        self.__opened = 0
+        self.__local = threading.local()
+
+    def __acquire(self) -> sqlite3.Connection:
+        if self.config.max_connections <= 0:
+            return self.__connect()
+
+        with self.__condition:
+            if self.__closed:
+                raise PoolTimeoutError("Connection pool is closed")
+            if self.__idle:
+                return self.__idle.pop()
+            if self.__opened < self.config.max_connections:
+                self.__opened += 1
+            else:
+                available = self.__condition.wait_for(
+                    lambda: bool(self.__idle) or self.__closed,
+                    timeout=self.config.acquire_timeout,
+                )
+                if not available or self.__closed:
+                    raise PoolTimeoutError("No idle SQLite connection available")
+                return self.__idle.pop()
+
+        try:
+            return self.__connect()
+        except BaseException:
+            with self.__condition:
+                self.__opened -= 1
+                self.__condition.notify()
+            raise
+
+    def __release(self, connection: sqlite3.Connection) -> None:
+        if connection.in_transaction:
+            connection.rollback()
+
+        if self.config.max_connections <= 0:
+            connection.close()
+            return
+
+        with self.__condition:
+            if not self.__closed:
+                self.__idle.append(connection)
+                self.__condition.notify()
+                return
+            self.__opened -= 1
+        connection.close()
+
+    def __connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.db_name, check_same_thread=False, factory=TracedConnection
+        )
+        pragmas = {**self.config.profile.pragmas(), **self.config.pragmas}
+        for name, value in pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value};")
+        return connection
+
+
+_POOLS: "weakref.WeakSet[SQLiteConnectionPool]" = weakref.WeakSet()
+
+
+def _before_fork() -> None:
+    for pool in list(_POOLS):
+        pool._before_fork()
+
+
+def _after_fork_in_child() -> None:
+    for pool in list(_POOLS):
+        pool._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_child=_after_fork_in_child)
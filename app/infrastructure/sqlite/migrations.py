@@ -0,0 +1,325 @@
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from sqlite3 import Connection
+from typing import Callable, List, Optional, Sequence
+
+from app.infrastructure.sqlite.connection_pool import SQLiteConnectionPool
+
+DEFAULT_BATCH_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class MigrationProgress:
+    version: int
+    step: str
+    rows_done: int
+    rows_total: int
+    elapsed: float
+
+
+@dataclass(frozen=True)
+class MigrationReport:
+    version: int
+    description: str
+    duration: float
+
+
+ProgressCallback = Callable[[MigrationProgress], None]
+
+
+class MigrationStep(ABC):
+    description: str
+
+    @abstractmethod
+    def apply(
+        self,
+        connection: Connection,
+        report: Callable[[int, int], None],
+        finish: str,
+    ) -> None:
+        """Runs the step. ``report(rows_done, rows_total)`` may be called
+        any number of times; the step commits its own work. ``finish``
+        records the step as applied and has to run in the transaction that
+        completes it, so a migration that fails partway resumes after the
+        last completed step."""
+
+
+@dataclass(frozen=True)
+class ExecuteSQL(MigrationStep):
+    """Runs a script in one transaction. Meant for DDL and small tables."""
+
+    description: str
+    script: str
+
+    def apply(
+        self,
+        connection: Connection,
+        report: Callable[[int, int], None],
+        finish: str,
+    ) -> None:
+        try:
+            connection.executescript(
+                f"BEGIN IMMEDIATE;\n{self.script}\n{finish}\nCOMMIT;"
+            )
+        except BaseException:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+        report(0, 0)
+
+
+@dataclass(frozen=True)
+class BatchedSQL(MigrationStep):
+    """Runs ``statement`` over consecutive id ranges of ``table``.
+
+    The statement gets ``:lo`` (exclusive) and ``:hi`` (inclusive) bounds and
+    every range is committed on its own, so other connections can read and
+    write between batches. Statements must be safe to run again for a range,
+    because an interrupted step is restarted from the beginning.
+    """
+
+    description: str
+    table: str
+    statement: str
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+    def apply(
+        self,
+        connection: Connection,
+        report: Callable[[int, int], None],
+        finish: str,
+    ) -> None:
+        copy_range(connection, self.table, self.statement, self.batch_size, report)
+        connection.execute(finish)
+        connection.commit()
+
+
+@dataclass(frozen=True)
+class RebuildTable(MigrationStep):
+    """Recreates ``table`` from ``definition`` without taking it offline.
+
+    Rows are copied into a shadow table in batches; the final swap copies
+    whatever was appended meanwhile and renames, all in one short
+    transaction. Rows updated in place during the copy are only picked up if
+    the table is append-only; set ``single_transaction`` for tables that are
+    updated and small, to copy every row in the swap instead. Indexes and
+    triggers go with the old table and have to be recreated by a later step.
+    """
+
+    description: str
+    table: str
+    # CREATE TABLE statement with a ``{table}`` placeholder for the name
+    definition: str
+    columns: str = "*"
+    select: str = "*"
+    batch_size: int = DEFAULT_BATCH_SIZE
+    single_transaction: bool = False
+
+    def apply(
+        self,
+        connection: Connection,
+        report: Callable[[int, int], None],
+        finish: str,
+    ) -> None:
+        shadow = f"{self.table}_rebuild"
+        target = shadow if self.columns == "*" else f"{shadow} ({self.columns})"
+        copy = (
+            f"INSERT INTO {target} SELECT {self.select} FROM {self.table} "
+            "WHERE id > :lo AND id <= :hi;"
+        )
+
+        connection.execute(f"DROP TABLE IF EXISTS {shadow};")
+        connection.execute(self.definition.format(table=shadow))
+        connection.commit()
+
+        copied_up_to = (
+            0
+            if self.single_transaction
+            else copy_range(connection, self.table, copy, self.batch_size, report)
+        )
+
+        foreign_keys = connection.execute("PRAGMA foreign_keys;").fetchone()[0]
+        connection.execute("PRAGMA foreign_keys = OFF;")
+        try:
+            connection.execute("BEGIN IMMEDIATE;")
+            connection.execute(copy, {"lo": copied_up_to, "hi": 2**63 - 1})
+            connection.execute(f"DROP TABLE {self.table};")
+            connection.execute(f"ALTER TABLE {shadow} RENAME TO {self.table};")
+            violations = connection.execute(
+                f"PRAGMA foreign_key_check({self.table});"
+            ).fetchall()
+            if violations:
+                raise MigrationError(
+                    f"Foreign key violations in {self.table}: {violations}"
+                )
+            connection.execute(finish)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            connection.execute(f"PRAGMA foreign_keys = {foreign_keys};")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    steps: Sequence[MigrationStep] = field(default_factory=tuple)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def copy_range(
+    connection: Connection,
+    table: str,
+    statement: str,
+    batch_size: int,
+    report: Callable[[int, int], None],
+) -> int:
+    """Runs ``statement`` batch by batch over the ids of ``table`` that exist
+    when it starts. Returns the highest id covered."""
+    low, high, total = connection.execute(
+        f"SELECT MIN(id), MAX(id), COUNT(*) FROM {table};"
+    ).fetchone()
+    connection.commit()
+    if total == 0:
+        report(0, 0)
+        return 0
+
+    done = 0
+    lo = low - 1
+    while lo < high:
+        hi = min(lo + batch_size, high)
+        try:
+            connection.execute("BEGIN IMMEDIATE;")
+            done += max(connection.execute(statement, {"lo": lo, "hi": hi}).rowcount, 0)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        report(min(done, total), total)
+        lo = hi
+    return int(high)
+
+
+class Migrator:
+    """Applies ordered migrations and records them in ``schema_version``.
+
+    Steps commit on their own, so each one is also recorded in
+    ``schema_migration_steps`` as it completes; a migration that failed
+    partway skips its completed steps when it is run again.
+    """
+
+    def __init__(
+        self,
+        pool: SQLiteConnectionPool,
+        migrations: Sequence[Migration],
+        on_progress: Optional[ProgressCallback] = None,
+    ):
+        versions = [migration.version for migration in migrations]
+        if versions != sorted(set(versions)):
+            raise MigrationError("Migration versions must be unique and ascending")
+
+        self.pool = pool
+        self.migrations = migrations
+        self.on_progress = on_progress
+
+    def current_version(self) -> int:
+        with self.pool.connection() as connection:
+            self.__create_version_table(connection)
+            row = connection.execute(
+                "SELECT MAX(version) FROM schema_version;"
+            ).fetchone()
+            connection.commit()
+        return int(row[0]) if row[0] is not None else 0
+
+    def pending(self) -> List[Migration]:
+        current = self.current_version()
+        return [m for m in self.migrations if m.version > current]
+
+    def migrate(self, target: Optional[int] = None) -> List[MigrationReport]:
+        reports = []
+        with self.pool.connection() as connection:
+            for migration in self.pending():
+                if target is not None and migration.version > target:
+                    break
+                reports.append(self.__apply(connection, migration))
+        return reports
+
+    def __apply(self, connection: Connection, migration: Migration) -> MigrationReport:
+        started = time.perf_counter()
+        completed = {
+            row[0]
+            for row in connection.execute(
+                "SELECT step FROM schema_migration_steps WHERE version = ?;",
+                (migration.version,),
+            )
+        }
+        connection.commit()
+        for i, step in enumerate(migration.steps):
+            if i in completed:
+                continue
+            # both are integers, so formatting them in is safe
+            finish = (
+                "INSERT INTO schema_migration_steps (version, step) "
+                f"VALUES ({int(migration.version)}, {i});"
+            )
+            step.apply(connection, self.__reporter(migration, step, started), finish)
+        duration = time.perf_counter() - started
+
+        connection.execute(
+            """INSERT INTO schema_version (version, description, duration_ms)
+               VALUES (?, ?, ?);""",
+            (migration.version, migration.description, int(duration * 1000)),
+        )
+        connection.execute(
+            "DELETE FROM schema_migration_steps WHERE version = ?;",
+            (migration.version,),
+        )
+        connection.commit()
+        return MigrationReport(migration.version, migration.description, duration)
+
+    def __reporter(
+        self, migration: Migration, step: MigrationStep, started: float
+    ) -> Callable[[int, int], None]:
+        def report(rows_done: int, rows_total: int) -> None:
+            if self.on_progress is not None:
+                self.on_progress(
+                    MigrationProgress(
+                        version=migration.version,
+                        step=step.description,
+                        rows_done=rows_done,
+                        rows_total=rows_total,
+                        elapsed=time.perf_counter() - started,
+                    )
+                )
+
+        return report
+
+    @staticmethod
+    def __create_version_table(connection: Connection) -> None:
+        connection.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+               version INTEGER PRIMARY KEY,
+               description TEXT NOT NULL,
+               applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               duration_ms INTEGER NOT NULL);""")
+        connection.execute("""CREATE TABLE IF NOT EXISTS schema_migration_steps (
+               version INTEGER NOT NULL,
+               step INTEGER NOT NULL,
+               PRIMARY KEY (version, step));""")
+
+
+def print_progress(progress: MigrationProgress) -> None:
+    rows = (
+        f" {progress.rows_done}/{progress.rows_total} rows"
+        if progress.rows_total
+        else ""
+    )
+    print(
+        f"migration {progress.version}: {progress.step}{rows} "
+        f"({progress.elapsed:.2f}s)"
+    )
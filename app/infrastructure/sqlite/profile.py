@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from typing import Dict, Union
+
+PragmaValue = Union[str, int]
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_LEVELS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+@dataclass(frozen=True)
+class SQLiteProfile:
+    """Durability/performance knobs applied to every pooled connection.
+
+    ``cache_size`` follows SQLite's convention: negative values are KiB,
+    positive values are pages. ``busy_timeout`` is in milliseconds.
+    """
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -16384
+    mmap_size: int = 128 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    busy_timeout: int = 5000
+    wal_autocheckpoint: int = 1000
+    foreign_keys: bool = True
+
+    def __post_init__(self) -> None:
+        if self.journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"Unknown journal_mode: {self.journal_mode}")
+        if self.synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {self.synchronous}")
+        if self.temp_store.upper() not in TEMP_STORES:
+            raise ValueError(f"Unknown temp_store: {self.temp_store}")
+
+    def pragmas(self) -> Dict[str, PragmaValue]:
+        # busy_timeout goes first so switching journal_mode can wait for locks
+        return {
+            "busy_timeout": self.busy_timeout,
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "cache_size": self.cache_size,
+            "mmap_size": self.mmap_size,
+            "temp_store": self.temp_store,
+            "wal_autocheckpoint": self.wal_autocheckpoint,
+            "foreign_keys": "ON" if self.foreign_keys else "OFF",
+        }
+
+
+# WAL with synchronous=NORMAL: readers never block on writers, commits do not
+# fsync; the last transactions may roll back after a power loss.
+DEFAULT_PROFILE = SQLiteProfile()
+
+# WAL with an fsync on every commit.
+DURABLE_PROFILE = SQLiteProfile(synchronous="FULL")
+
+# SQLite's own defaults (rollback journal), i.e. the behaviour before profiles.
+LEGACY_PROFILE = SQLiteProfile(
+    journal_mode="DELETE",
+    synchronous="FULL",
+    cache_size=-2000,
+    mmap_size=0,
+    temp_store="DEFAULT",
+    busy_timeout=5000,
+    foreign_keys=False,
+)
@@ -0,0 +1,34 @@
+from sqlite3 import Cursor
+from typing import Any, Callable, Dict, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+RowFactory = Callable[[Cursor, Tuple[Any, ...]], T]
+
+
+def entity_rows(entity: Callable[..., T], shared: Sequence[int] = ()) -> RowFactory[T]:
+    """Cursor row factory passing the selected columns, in order, to
+    ``entity``. Fetches then return entities directly instead of a list of
+    tuples that is copied into entities afterwards.
+
+    SQLite hands out a new object per value and row; the values of the
+    ``shared`` columns, such as wallet addresses repeated all over a history,
+    are kept once per factory instead. Create such a factory per query.
+    """
+    if not shared:
+
+        def build(cursor: Cursor, row: Tuple[Any, ...]) -> T:
+            return entity(*row)
+
+        return build
+
+    seen: Dict[Any, Any] = {}
+    share = seen.setdefault
+
+    def build_shared(cursor: Cursor, row: Tuple[Any, ...]) -> T:
+        values = list(row)
+        for column in shared:
+            values[column] = share(values[column], values[column])
+        return entity(*values)
+
+    return build_shared
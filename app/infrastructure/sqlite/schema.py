@@ -0,0 +1,428 @@
+import argparse
+from typing import Dict, Optional, Sequence
+
+from app.infrastructure.sqlite.connection_pool import SQLiteConnectionPool
+from app.infrastructure.sqlite.migrations import (
+    ExecuteSQL,
+    Migration,
+    Migrator,
+    RebuildTable,
+    print_progress,
+)
+
+USERS_WALLETS_TABLE = """CREATE TABLE {table} (
+                         id INTEGER PRIMARY KEY,
+                         user_id INTEGER NOT NULL REFERENCES users (id),
+                         wallet_id INTEGER NOT NULL REFERENCES wallets (id));"""
+
+# Definitions used by a migration are frozen with its version suffix; the
+# unsuffixed ones describe the current schema.
+
+TRANSACTIONS_TABLE_V2 = """CREATE TABLE {table} (
+                           id INTEGER PRIMARY KEY,
+                           wallet_id_from INTEGER NOT NULL REFERENCES wallets (id),
+                           wallet_id_to INTEGER NOT NULL REFERENCES wallets (id),
+                           amount_in_btc FLOAT NOT NULL,
+                           fee_pct FLOAT,
+                           btc_usd_exchange_rate FLOAT NOT NULL);"""
+
+STATISTICS_TABLE_V3 = """CREATE TABLE statistics (
+                         id INTEGER PRIMARY KEY CHECK (id = 1),
+                         transaction_count INTEGER NOT NULL,
+                         btc_profit FLOAT NOT NULL);"""
+
+STATISTICS_TRIGGER_V3 = """CREATE TRIGGER IF NOT EXISTS trg_transactions_statistics
+                           AFTER INSERT ON transactions
+                           BEGIN
+                               UPDATE statistics
+                               SET transaction_count = transaction_count + 1,
+                                   btc_profit = btc_profit
+                                       + NEW.amount_in_btc * COALESCE(NEW.fee_pct, 0)
+                               WHERE id = 1;
+                           END;"""
+
+# bucket widths in seconds by granularity
+ROLLUP_WIDTHS_V4 = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+def _granularities(widths: Dict[str, int]) -> str:
+    return " UNION ALL ".join(
+        f"SELECT '{name}' AS granularity, {width} AS width"
+        for name, width in widths.items()
+    )
+
+
+ROLLUPS_TABLE_V4 = """CREATE TABLE transaction_rollups (
+                      granularity TEXT NOT NULL,
+                      scope TEXT NOT NULL,
+                      scope_id INTEGER NOT NULL,
+                      bucket INTEGER NOT NULL,
+                      transfer_count INTEGER NOT NULL,
+                      btc_volume FLOAT NOT NULL,
+                      usd_volume FLOAT NOT NULL,
+                      btc_profit FLOAT NOT NULL,
+                      PRIMARY KEY (granularity, scope, scope_id, bucket))
+                      WITHOUT ROWID;"""
+
+# one row per granularity and scope: everything, both wallets and both
+# owners; UNION drops the duplicates of a transfer within a wallet or user
+ROLLUPS_TRIGGER_V4 = """CREATE TRIGGER IF NOT EXISTS trg_transactions_rollups
+                        AFTER INSERT ON transactions
+                        WHEN NEW.created_at IS NOT NULL
+                        BEGIN
+                            INSERT INTO transaction_rollups
+                            SELECT g.granularity,
+                                   s.scope,
+                                   s.scope_id,
+                                   NEW.created_at - NEW.created_at % g.width,
+                                   1,
+                                   NEW.amount_in_btc,
+                                   NEW.amount_in_btc * NEW.btc_usd_exchange_rate,
+                                   NEW.amount_in_btc * COALESCE(NEW.fee_pct, 0)
+                            FROM ({granularities}) g,
+                                 (SELECT 'all' AS scope, 0 AS scope_id
+                                  UNION SELECT 'wallet', NEW.wallet_id_from
+                                  UNION SELECT 'wallet', NEW.wallet_id_to
+                                  UNION SELECT 'user', user_id
+                                        FROM users_wallets
+                                        WHERE wallet_id IN (NEW.wallet_id_from,
+                                                            NEW.wallet_id_to)) s
+                            WHERE true
+                            ON CONFLICT (granularity, scope, scope_id, bucket)
+                            DO UPDATE
+                            SET transfer_count = transfer_count + 1,
+                                btc_volume = btc_volume + excluded.btc_volume,
+                                usd_volume = usd_volume + excluded.usd_volume,
+                                btc_profit = btc_profit + excluded.btc_profit;
+                        END;""".format(granularities=_granularities(ROLLUP_WIDTHS_V4))
+
+CACHE_VERSIONS_TABLE = """CREATE TABLE cache_versions (
+                          name TEXT PRIMARY KEY,
+                          version INTEGER NOT NULL)
+                          WITHOUT ROWID;"""
+
+# Money is held in integer satoshis and fees in basis points; a fee is
+# amount_sat * fee_bps / 10000, which SQLite rounds down like the core does.
+
+WALLETS_TABLE = """CREATE TABLE {table} (
+                   id INTEGER PRIMARY KEY,
+                   address TEXT NOT NULL UNIQUE,
+                   balance_sat INTEGER NOT NULL);"""
+
+TRANSACTIONS_TABLE = """CREATE TABLE {table} (
+                        id INTEGER PRIMARY KEY,
+                        wallet_id_from INTEGER NOT NULL REFERENCES wallets (id),
+                        wallet_id_to INTEGER NOT NULL REFERENCES wallets (id),
+                        amount_sat INTEGER NOT NULL,
+                        fee_bps INTEGER NOT NULL,
+                        btc_usd_exchange_rate FLOAT NOT NULL,
+                        created_at INTEGER);"""
+
+TRANSACTIONS_INDEXES = """CREATE INDEX IF NOT EXISTS idx_transactions_wallet_id_from
+                          ON transactions (wallet_id_from);
+
+                          CREATE INDEX IF NOT EXISTS idx_transactions_wallet_id_to
+                          ON transactions (wallet_id_to);"""
+
+STATISTICS_TABLE = """CREATE TABLE statistics (
+                      id INTEGER PRIMARY KEY CHECK (id = 1),
+                      transaction_count INTEGER NOT NULL,
+                      profit_sat INTEGER NOT NULL);"""
+
+STATISTICS_TRIGGER = """CREATE TRIGGER IF NOT EXISTS trg_transactions_statistics
+                        AFTER INSERT ON transactions
+                        BEGIN
+                            UPDATE statistics
+                            SET transaction_count = transaction_count + 1,
+                                profit_sat = profit_sat
+                                    + NEW.amount_sat * NEW.fee_bps / 10000
+                            WHERE id = 1;
+                        END;"""
+
+ROLLUPS_TABLE = """CREATE TABLE transaction_rollups (
+                   granularity TEXT NOT NULL,
+                   scope TEXT NOT NULL,
+                   scope_id INTEGER NOT NULL,
+                   bucket INTEGER NOT NULL,
+                   transfer_count INTEGER NOT NULL,
+                   volume_sat INTEGER NOT NULL,
+                   usd_volume FLOAT NOT NULL,
+                   profit_sat INTEGER NOT NULL,
+                   PRIMARY KEY (granularity, scope, scope_id, bucket))
+                   WITHOUT ROWID;"""
+
+# the widths the admin API reads, BUCKET_WIDTHS, have to match these
+ROLLUP_WIDTHS = {"minute": 60, "hour": 3600, "day": 86400}
+
+ROLLUPS_TRIGGER = """CREATE TRIGGER IF NOT EXISTS trg_transactions_rollups
+                     AFTER INSERT ON transactions
+                     WHEN NEW.created_at IS NOT NULL
+                     BEGIN
+                         INSERT INTO transaction_rollups
+                         SELECT g.granularity,
+                                s.scope,
+                                s.scope_id,
+                                NEW.created_at - NEW.created_at % g.width,
+                                1,
+                                NEW.amount_sat,
+                                NEW.amount_sat * NEW.btc_usd_exchange_rate
+                                    / 100000000.0,
+                                NEW.amount_sat * NEW.fee_bps / 10000
+                         FROM ({granularities}) g,
+                              (SELECT 'all' AS scope, 0 AS scope_id
+                               UNION SELECT 'wallet', NEW.wallet_id_from
+                               UNION SELECT 'wallet', NEW.wallet_id_to
+                               UNION SELECT 'user', user_id
+                                     FROM users_wallets
+                                     WHERE wallet_id IN (NEW.wallet_id_from,
+                                                         NEW.wallet_id_to)) s
+                         WHERE true
+                         ON CONFLICT (granularity, scope, scope_id, bucket)
+                         DO UPDATE
+                         SET transfer_count = transfer_count + 1,
+                             volume_sat = volume_sat + excluded.volume_sat,
+                             usd_volume = usd_volume + excluded.usd_volume,
+                             profit_sat = profit_sat + excluded.profit_sat;
+                     END;""".format(granularities=_granularities(ROLLUP_WIDTHS))
+
+# one row per transfer made with an idempotency key, written in the
+# transaction that makes it
+IDEMPOTENCY_KEYS_TABLE = """CREATE TABLE idempotency_keys (
+                            api_key TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            wallet_address_from TEXT NOT NULL,
+                            wallet_address_to TEXT NOT NULL,
+                            amount_sat INTEGER NOT NULL,
+                            transaction_id INTEGER NOT NULL REFERENCES transactions (id),
+                            created_at INTEGER NOT NULL,
+                            PRIMARY KEY (api_key, key))
+                            WITHOUT ROWID;"""
+
+# workers scan the jobs not done yet in id order, which the partial index
+# keeps to the size of the backlog
+TRANSFER_JOBS_TABLE = """CREATE TABLE transfer_jobs (
+                         id INTEGER PRIMARY KEY,
+                         api_key TEXT NOT NULL,
+                         wallet_address_from TEXT NOT NULL,
+                         wallet_address_to TEXT NOT NULL,
+                         amount_sat INTEGER NOT NULL,
+                         idempotency_key TEXT,
+                         status TEXT NOT NULL,
+                         success INTEGER,
+                         message TEXT,
+                         status_code INTEGER,
+                         lease_until FLOAT,
+                         created_at INTEGER NOT NULL);
+
+                         CREATE UNIQUE INDEX idx_transfer_jobs_idempotency_key
+                         ON transfer_jobs (api_key, idempotency_key)
+                         WHERE idempotency_key IS NOT NULL;
+
+                         CREATE INDEX idx_transfer_jobs_pending
+                         ON transfer_jobs (id)
+                         WHERE status != 'done';"""
+
+MIGRATIONS: Sequence[Migration] = (
+    Migration(
+        version=1,
+        description="Base schema",
+        steps=(
+            ExecuteSQL(
+                "Create tables",
+                """CREATE TABLE IF NOT EXISTS users (
+                   id INTEGER PRIMARY KEY,
+                   email TEXT NOT NULL UNIQUE,
+                   api_key TEXT NOT NULL UNIQUE);
+
+                   CREATE TABLE IF NOT EXISTS wallets (
+                   id INTEGER PRIMARY KEY,
+                   address TEXT NOT NULL UNIQUE,
+                   balance_in_btc FLOAT NOT NULL);
+
+                   CREATE TABLE IF NOT EXISTS users_wallets (
+                   id INTEGER PRIMARY KEY,
+                   user_id INTEGER NOT NULL,
+                   wallet_id INTEGER NOT NULL);
+
+                   CREATE TABLE IF NOT EXISTS transactions (
+                   id INTEGER PRIMARY KEY,
+                   wallet_id_from INTEGER NOT NULL,
+                   wallet_id_to INTEGER NOT NULL,
+                   amount_in_btc FLOAT NOT NULL,
+                   fee_pct FLOAT,
+                   btc_usd_exchange_rate FLOAT NOT NULL);""",
+            ),
+        ),
+    ),
+    Migration(
+        version=2,
+        description="Foreign keys and lookup indexes",
+        steps=(
+            RebuildTable(
+                "Add foreign keys to users_wallets",
+                "users_wallets",
+                USERS_WALLETS_TABLE,
+            ),
+            RebuildTable(
+                "Add foreign keys to transactions",
+                "transactions",
+                TRANSACTIONS_TABLE_V2,
+            ),
+            # a wallet belongs to exactly one user; wallet_id first serves
+            # get_wallet_user, user_id first serves get_user_wallets. The rowid
+            # is implied in every index, so the transactions indexes also
+            # serve id-ordered history scans.
+            ExecuteSQL(
+                "Create lookup indexes",
+                """CREATE UNIQUE INDEX IF NOT EXISTS idx_users_wallets_wallet_id
+                   ON users_wallets (wallet_id, user_id);
+
+                   CREATE INDEX IF NOT EXISTS idx_users_wallets_user_id
+                   ON users_wallets (user_id, wallet_id);
+
+                   CREATE INDEX IF NOT EXISTS idx_transactions_wallet_id_from
+                   ON transactions (wallet_id_from);
+
+                   CREATE INDEX IF NOT EXISTS idx_transactions_wallet_id_to
+                   ON transactions (wallet_id_to);""",
+            ),
+        ),
+    ),
+    Migration(
+        version=3,
+        description="Running statistics",
+        steps=(
+            # seeded and hooked up in one transaction, so no transfer is
+            # counted twice or missed; the trigger keeps the row current
+            # inside every transaction that writes to the ledger
+            ExecuteSQL(
+                "Create statistics",
+                f"""{STATISTICS_TABLE_V3}
+
+                   INSERT INTO statistics (id, transaction_count, btc_profit)
+                   SELECT 1, COUNT(*), TOTAL(amount_in_btc * COALESCE(fee_pct, 0))
+                   FROM transactions;
+
+                   {STATISTICS_TRIGGER_V3}""",
+            ),
+        ),
+    ),
+    Migration(
+        version=4,
+        description="Time-bucketed rollups",
+        steps=(
+            # existing rows have no timestamp; they stay in the all-time
+            # statistics but are left out of the rollups
+            ExecuteSQL(
+                "Create rollups",
+                f"""ALTER TABLE transactions ADD COLUMN created_at INTEGER;
+
+                   {ROLLUPS_TABLE_V4}
+
+                   {ROLLUPS_TRIGGER_V4}""",
+            ),
+        ),
+    ),
+    Migration(
+        version=5,
+        description="Integer satoshis",
+        steps=(
+            # balances are updated in place, so the wallets are copied in the
+            # swap transaction rather than in batches
+            RebuildTable(
+                "Store wallet balances in satoshis",
+                "wallets",
+                WALLETS_TABLE,
+                columns="id, address, balance_sat",
+                select="id, address, CAST(ROUND(balance_in_btc * 100000000) "
+                "AS INTEGER)",
+                single_transaction=True,
+            ),
+            RebuildTable(
+                "Store transfer amounts in satoshis",
+                "transactions",
+                TRANSACTIONS_TABLE,
+                columns="id, wallet_id_from, wallet_id_to, amount_sat, fee_bps, "
+                "btc_usd_exchange_rate, created_at",
+                select="id, wallet_id_from, wallet_id_to, "
+                "CAST(ROUND(amount_in_btc * 100000000) AS INTEGER), "
+                "CAST(ROUND(COALESCE(fee_pct, 0) * 10000) AS INTEGER), "
+                "btc_usd_exchange_rate, created_at",
+            ),
+            # the statistics are recounted exactly from the converted ledger;
+            # the rollups cannot be, as rows before version 4 have no time
+            ExecuteSQL(
+                "Recreate indexes, statistics and rollups",
+                f"""{TRANSACTIONS_INDEXES}
+
+                   DROP TABLE statistics;
+
+                   {STATISTICS_TABLE}
+
+                   INSERT INTO statistics (id, transaction_count, profit_sat)
+                   SELECT 1, COUNT(*), COALESCE(SUM(amount_sat * fee_bps / 10000), 0)
+                   FROM transactions;
+
+                   {STATISTICS_TRIGGER}
+
+                   ALTER TABLE transaction_rollups RENAME TO transaction_rollups_v4;
+
+                   {ROLLUPS_TABLE}
+
+                   INSERT INTO transaction_rollups
+                   SELECT granularity,
+                          scope,
+                          scope_id,
+                          bucket,
+                          transfer_count,
+                          CAST(ROUND(btc_volume * 100000000) AS INTEGER),
+                          usd_volume,
+                          CAST(ROUND(btc_profit * 100000000) AS INTEGER)
+                   FROM transaction_rollups_v4;
+
+                   DROP TABLE transaction_rollups_v4;
+
+                   {ROLLUPS_TRIGGER}""",
+            ),
+        ),
+    ),
+    Migration(
+        version=6,
+        description="Cache versions",
+        steps=(ExecuteSQL("Create cache version counters", CACHE_VERSIONS_TABLE),),
+    ),
+    Migration(
+        version=7,
+        description="Idempotency keys and transfer jobs",
+        steps=(
+            ExecuteSQL("Create idempotency keys", IDEMPOTENCY_KEYS_TABLE),
+            ExecuteSQL("Create transfer job queue", TRANSFER_JOBS_TABLE),
+        ),
+    ),
+)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Migrate a bitcoin wallet database")
+    parser.add_argument("db_name", nargs="?", default="bw.db")
+    parser.add_argument("--target", type=int, default=None)
+    parser.add_argument("--status", action="store_true")
+    options = parser.parse_args(argv)
+
+    pool = SQLiteConnectionPool(options.db_name)
+    migrator = Migrator(pool, MIGRATIONS, on_progress=print_progress)
+    if options.status:
+        print(f"schema version {migrator.current_version()}")
+        for migration in migrator.pending():
+            print(f"pending {migration.version}: {migration.description}")
+    else:
+        for report in migrator.migrate(options.target):
+            print(
+                f"applied {report.version}: {report.description} "
+                f"in {report.duration:.2f}s"
+            )
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,134 +1,516 @@
-import sqlite3
+import time
+from itertools import repeat
 from sqlite3 import Cursor
-from typing import List, Optional
-
-from app.core.entities import Transaction, UserInfo, Wallet
+from typing import Any, List, Optional, Sequence, Tuple
+
+from app.core.entities import (
+    JOB_RUNNING,
+    IdempotencyRecord,
+    StatisticsBucket,
+    StatisticsInfo,
+    Transaction,
+    TransferJob,
+    UserInfo,
+    Wallet,
+)
+from app.core.money import transfer_fee
+from app.infrastructure.sqlite.connection_pool import (
+    SQLiteConnectionPool,
+    SQLitePoolConfig,
+)
+from app.infrastructure.sqlite.migrations import Migrator, ProgressCallback
+from app.infrastructure.sqlite.rows import RowFactory, entity_rows
+from app.infrastructure.sqlite.schema import MIGRATIONS
+
+WALLET_ROWS = entity_rows(Wallet)
+USER_ROWS = entity_rows(UserInfo)
+BUCKET_ROWS = entity_rows(StatisticsBucket)
+IDEMPOTENCY_ROWS = entity_rows(IdempotencyRecord)
+
+
+def _transfer_job(*values: Any) -> TransferJob:
+    job = TransferJob(*values)
+    # stored as an integer
+    if job.success is not None:
+        job.success = bool(job.success)
+    return job
+
+
+TRANSFER_JOB_ROWS = entity_rows(_transfer_job)
 
 
 class SQLiteRepository:
-    def __init__(self, db_name: str = "bw.db") -> None:
+    def __init__(
+        self,
+        db_name: str = "bw.db",
+        pool_config: Optional[SQLitePoolConfig] = None,
+        migrate: bool = True,
+        on_migration_progress: Optional[ProgressCallback] = None,
+    ) -> None:
         self.db_name = db_name
-        self.__create_tables()
-
-    def __create_tables(self) -> None:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS users (
-               id INTEGER PRIMARY KEY,
-               email TEXT NOT NULL UNIQUE,
-               api_key TEXT NOT NULL UNIQUE);"""
-        )
-        connection.commit()
-
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS wallets (
-               id INTEGER PRIMARY KEY,
-               address TEXT NOT NULL UNIQUE,
-               balance_in_btc FLOAT NOT NULL);"""
-        )
-        connection.commit()
-
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS users_wallets (
-               id INTEGER PRIMARY KEY,
-               user_id INTEGER NOT NULL,
-               wallet_id INTEGER NOT NULL);"""
-        )
-        connection.commit()
-
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS transactions (
-               id INTEGER PRIMARY KEY,
-               wallet_id_from INTEGER NOT NULL,
-               wallet_id_to INTEGER NOT NULL,
-               amount_in_btc FLOAT NOT NULL,
-               fee_pct FLOAT,
-               btc_usd_exchange_rate FLOAT NOT NULL);"""
-        )
-        connection.commit()
+        self.pool = SQLiteConnectionPool(db_name, pool_config)
+        self.migrator = Migrator(self.pool, MIGRATIONS, on_migration_progress)
+        if migrate:
+            self.migrator.migrate()
 
-        cursor.close()
-        connection.close()
+    def close(self) -> None:
+        self.pool.close()
 
     def register_user(self, user: UserInfo) -> None:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """INSERT INTO users (email, api_key)
-                     VALUES (?, ?);"""
-        args = (user.email, user.api_key)
-
-        cursor.execute(command, args)
-        connection.commit()
-
-        cursor.close()
-        connection.close()
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """INSERT INTO users (email, api_key)
+                         VALUES (?, ?);"""
+            args = (user.email, user.api_key)
+
+            cursor.execute(command, args)
+            connection.commit()
+
+            cursor.close()
+
+    def get_statistics(self) -> StatisticsInfo:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """SELECT transaction_count,
+                                profit_sat
+                         FROM statistics
+                         WHERE id = 1;"""
+
+            cursor.execute(command)
+            row = cursor.fetchone()
+
+            cursor.close()
+
+        return StatisticsInfo(total_transaction_count=row[0], total_profit_sat=row[1])
+
+    def reconcile_statistics(self) -> StatisticsInfo:
+        with self.pool.transaction() as connection:
+            cursor = connection.cursor()
+
+            command = """UPDATE statistics
+                         SET transaction_count = (SELECT COUNT(*)
+                                                  FROM transactions),
+                             profit_sat = (SELECT COALESCE(SUM(amount_sat
+                                                               * fee_bps
+                                                               / 10000), 0)
+                                           FROM transactions)
+                         WHERE id = 1;"""
+
+            cursor.execute(command)
+            cursor.close()
+
+        return self.get_statistics()
+
+    def get_cache_version(self, name: str) -> int:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """SELECT version
+                         FROM cache_versions
+                         WHERE name = ?;"""
+            args = (name,)
+
+            cursor.execute(command, args)
+            row = cursor.fetchone()
+
+            cursor.close()
+
+        return int(row[0]) if row is not None else 0
+
+    def bump_cache_version(self, name: str) -> int:
+        with self.pool.transaction() as connection:
+            cursor = connection.cursor()
+
+            command = """INSERT INTO cache_versions (name, version)
+                         VALUES (?, 1)
+                         ON CONFLICT (name)
+                         DO UPDATE SET version = version + 1;"""
+            args = (name,)
+
+            cursor.execute(command, args)
+            cursor.close()
+
+        return self.get_cache_version(name)
+
+    def get_statistics_buckets(
+        self,
+        granularity: str,
+        since: int,
+        until: int,
+        wallet_address: Optional[str] = None,
+        user_email: Optional[str] = None,
+    ) -> List[StatisticsBucket]:
+        if wallet_address is not None:
+            scope = "wallet"
+            scope_id = "(SELECT id FROM wallets WHERE address = ?)"
+            scope_args: Tuple[str, ...] = (wallet_address,)
+        elif user_email is not None:
+            scope = "user"
+            scope_id = "(SELECT id FROM users WHERE email = ?)"
+            scope_args = (user_email,)
+        else:
+            scope, scope_id, scope_args = "all", "0", ()
+
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = f"""SELECT bucket,
+                                 transfer_count,
+                                 volume_sat,
+                                 usd_volume,
+                                 profit_sat
+                          FROM transaction_rollups
+                          WHERE granularity = ?
+                          AND scope = ?
+                          AND scope_id = {scope_id}
+                          AND bucket BETWEEN ? AND ?
+                          ORDER BY bucket;"""
+            args = (granularity, scope, *scope_args, since, until)
+
+            cursor.row_factory = BUCKET_ROWS
+            cursor.execute(command, args)
+            buckets: List[StatisticsBucket] = cursor.fetchall()
+
+            cursor.close()
+
+        return buckets
 
     def fetch_all_transactions(self) -> List[Transaction]:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """SELECT w1.address,
-                            w2.address,
-                            t.amount_in_btc,
-                            t.fee_pct,
-                            t.btc_usd_exchange_rate
-                     FROM transactions t
-                     JOIN wallets w1
-                     ON t.wallet_id_from = w1.id
-                     JOIN wallets w2
-                     ON t.wallet_id_to = w2.id;"""
-
-        cursor.execute(command)
-        rows = cursor.fetchall()
-
-        cursor.close()
-        connection.close()
-
-        transactions = []
-
-        if rows:
-            for row in rows:
-                transactions.append(
-                    Transaction(
-                        wallet_address_from=row[0],
-                        wallet_address_to=row[1],
-                        btc_amount=row[2],
-                        fee_pct=row[3],
-                        exchange_rate=row[4],
-                    )
-                )
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """SELECT w1.address,
+                                w2.address,
+                                t.amount_sat,
+                                t.fee_bps,
+                                t.btc_usd_exchange_rate,
+                                t.id
+                         FROM transactions t
+                         JOIN wallets w1
+                         ON t.wallet_id_from = w1.id
+                         JOIN wallets w2
+                         ON t.wallet_id_to = w2.id;"""
+
+            cursor.row_factory = self.__transaction_rows()
+            cursor.execute(command)
+            transactions: List[Transaction] = cursor.fetchall()
+
+            cursor.close()
 
         return transactions
 
     def add_transaction(self, transaction: Transaction) -> None:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            wallet_id_from = self.__get_wallet_id(
+                cursor=cursor, wallet_address=transaction.wallet_address_from
+            )
+            wallet_id_to = self.__get_wallet_id(
+                cursor=cursor, wallet_address=transaction.wallet_address_to
+            )
+
+            command = """INSERT INTO transactions (wallet_id_from, wallet_id_to, amount_sat, fee_bps, btc_usd_exchange_rate, created_at)
+                         VALUES (?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER));"""
+            args = (
+                wallet_id_from,
+                wallet_id_to,
+                transaction.amount_sat,
+                transaction.fee_bps,
+                transaction.exchange_rate,
+            )
+
+            cursor.execute(command, args)
+            connection.commit()
+
+            cursor.close()
+
+    def execute_transfer(self, transaction: Transaction) -> bool:
+        with self.pool.transaction() as connection:
+            cursor = connection.cursor()
+            applied = self.__apply_transfer(cursor=cursor, transaction=transaction)
+            cursor.close()
+
+        return applied
+
+    def execute_transfers(
+        self,
+        transactions: List[Transaction],
+        keys: Optional[Sequence[Optional[IdempotencyRecord]]] = None,
+    ) -> List[bool]:
+        with self.pool.transaction() as connection:
+            cursor = connection.cursor()
+            applied = [
+                (
+                    self.__apply_transfer(cursor=cursor, transaction=transaction)
+                    if key is None
+                    else self.__apply_keyed_transfer(
+                        cursor=cursor, transaction=transaction, key=key
+                    )
+                )
+                for transaction, key in zip(
+                    transactions, keys if keys is not None else repeat(None)
+                )
+            ]
+            cursor.close()
+
+        return applied
+
+    @classmethod
+    def __apply_keyed_transfer(
+        cls, cursor: Cursor, transaction: Transaction, key: IdempotencyRecord
+    ) -> bool:
+        # the write lock is held, so no other transfer can take the key
+        # between this check and the insert below
+        command = """SELECT 1
+                     FROM idempotency_keys
+                     WHERE api_key = ?
+                     AND key = ?;"""
+        args = (key.api_key, key.key)
 
-        wallet_id_from = self.__get_wallet_id(
-            cursor=cursor, wallet_address=transaction.wallet_address_from
-        )
-        wallet_id_to = self.__get_wallet_id(
-            cursor=cursor, wallet_address=transaction.wallet_address_to
+        cursor.execute(command, args)
+        if cursor.fetchone() is not None:
+            return False
+        if not cls.__apply_transfer(cursor=cursor, transaction=transaction):
+            return False
+
+        # the debit and credit are updates, so the last rowid is still the
+        # ledger row's
+        command = """INSERT INTO idempotency_keys (api_key, key, wallet_address_from, wallet_address_to, amount_sat, transaction_id, created_at)
+                     VALUES (?, ?, ?, ?, ?, last_insert_rowid(), CAST(strftime('%s', 'now') AS INTEGER));"""
+        record_args = (
+            key.api_key,
+            key.key,
+            key.wallet_address_from,
+            key.wallet_address_to,
+            key.amount_sat,
         )
+        cursor.execute(command, record_args)
+
+        return True
+
+    def get_idempotency_record(
+        self, api_key: str, key: str
+    ) -> Optional[IdempotencyRecord]:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """SELECT api_key,
+                                key,
+                                wallet_address_from,
+                                wallet_address_to,
+                                amount_sat,
+                                transaction_id
+                         FROM idempotency_keys
+                         WHERE api_key = ?
+                         AND key = ?;"""
+            args = (api_key, key)
+
+            cursor.row_factory = IDEMPOTENCY_ROWS
+            cursor.execute(command, args)
+            record: Optional[IdempotencyRecord] = cursor.fetchone()
+
+            cursor.close()
+
+        return record
+
+    def enqueue_transfer(self, job: TransferJob) -> TransferJob:
+        with self.pool.transaction() as connection:
+            cursor = connection.cursor()
+
+            command = """INSERT INTO transfer_jobs (api_key, wallet_address_from, wallet_address_to, amount_sat, idempotency_key, status, created_at)
+                         VALUES (?, ?, ?, ?, ?, 'queued', CAST(strftime('%s', 'now') AS INTEGER))
+                         ON CONFLICT DO NOTHING;"""
+            args = (
+                job.api_key,
+                job.wallet_address_from,
+                job.wallet_address_to,
+                job.amount_sat,
+                job.idempotency_key,
+            )
+
+            cursor.execute(command, args)
+            if cursor.rowcount == 1:
+                job_id = cursor.lastrowid
+            else:
+                command = """SELECT id
+                             FROM transfer_jobs
+                             WHERE api_key = ?
+                             AND idempotency_key = ?;"""
+                key_args = (job.api_key, job.idempotency_key)
+                cursor.execute(command, key_args)
+                job_id = cursor.fetchone()[0]
+
+            cursor.close()
+
+        assert job_id is not None
+        queued = self.get_transfer_job(job_id)
+        assert queued is not None
+        return queued
+
+    def get_transfer_job(self, job_id: int) -> Optional[TransferJob]:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """SELECT api_key,
+                                wallet_address_from,
+                                wallet_address_to,
+                                amount_sat,
+                                idempotency_key,
+                                status,
+                                success,
+                                message,
+                                status_code,
+                                id
+                         FROM transfer_jobs
+                         WHERE id = ?;"""
+            args = (job_id,)
+
+            cursor.row_factory = TRANSFER_JOB_ROWS
+            cursor.execute(command, args)
+            job: Optional[TransferJob] = cursor.fetchone()
+
+            cursor.close()
+
+        return job
+
+    def claim_transfer_jobs(
+        self, limit: int, lease_seconds: float
+    ) -> List[TransferJob]:
+        now = time.time()
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            # idle workers poll; the write lock is only taken for work
+            command = """SELECT 1
+                         FROM transfer_jobs
+                         WHERE status != 'done'
+                         AND (status = 'queued' OR lease_until < ?)
+                         LIMIT 1;"""
+            args = (now,)
+
+            cursor.execute(command, args)
+            pending = cursor.fetchone() is not None
+
+            cursor.close()
+
+        if not pending:
+            return []
+        with self.pool.transaction() as connection:
+            cursor = connection.cursor()
+
+            # status != 'done' as in the partial index, so that it is used
+            command = """SELECT api_key,
+                                wallet_address_from,
+                                wallet_address_to,
+                                amount_sat,
+                                idempotency_key,
+                                status,
+                                success,
+                                message,
+                                status_code,
+                                id
+                         FROM transfer_jobs
+                         WHERE status != 'done'
+                         AND (status = 'queued' OR lease_until < ?)
+                         ORDER BY id
+                         LIMIT ?;"""
+            claim_args = (now, limit)
+
+            cursor.row_factory = TRANSFER_JOB_ROWS
+            cursor.execute(command, claim_args)
+            jobs: List[TransferJob] = cursor.fetchall()
+
+            command = """UPDATE transfer_jobs
+                         SET status = 'running',
+                             lease_until = ?
+                         WHERE id = ?;"""
+            cursor.executemany(
+                command, [(now + lease_seconds, job.job_id) for job in jobs]
+            )
+
+            cursor.close()
+
+        for job in jobs:
+            job.status = JOB_RUNNING
+        return jobs
+
+    def finish_transfer_jobs(self, jobs: List[TransferJob]) -> None:
+        with self.pool.transaction() as connection:
+            cursor = connection.cursor()
+
+            command = """UPDATE transfer_jobs
+                         SET status = 'done',
+                             success = ?,
+                             message = ?,
+                             status_code = ?,
+                             lease_until = NULL
+                         WHERE id = ?;"""
+            cursor.executemany(
+                command,
+                [
+                    (job.success, job.message, job.status_code, job.job_id)
+                    for job in jobs
+                ],
+            )
+
+            cursor.close()
 
-        command = """INSERT INTO transactions (wallet_id_from, wallet_id_to, amount_in_btc, fee_pct, btc_usd_exchange_rate)
-                     VALUES (?, ?, ?, ?, ?);"""
+    @staticmethod
+    def __apply_transfer(cursor: Cursor, transaction: Transaction) -> bool:
+        # the ledger row is only written if both wallets exist, the amount is
+        # positive and the source covers it; the write lock is already held, so the balance
+        # cannot change before the updates below
+        command = """INSERT INTO transactions (wallet_id_from, wallet_id_to, amount_sat, fee_bps, btc_usd_exchange_rate, created_at)
+                     SELECT w1.id, w2.id, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER)
+                     FROM wallets w1, wallets w2
+                     WHERE w1.address = ?
+                     AND w2.address = ?
+                     AND ? > 0
+                     AND w1.balance_sat >= ?;"""
         args = (
-            wallet_id_from,
-            wallet_id_to,
-            transaction.btc_amount,
-            transaction.fee_pct,
+            transaction.amount_sat,
+            transaction.fee_bps,
             transaction.exchange_rate,
+            transaction.wallet_address_from,
+            transaction.wallet_address_to,
+            transaction.amount_sat,
+            transaction.amount_sat,
         )
 
         cursor.execute(command, args)
-        connection.commit()
+        if cursor.rowcount != 1:
+            return False
+
+        command = """UPDATE wallets
+                     SET balance_sat = balance_sat - ?
+                     WHERE address = ?;"""
+        debit_args = (transaction.amount_sat, transaction.wallet_address_from)
+        cursor.execute(command, debit_args)
+
+        command = """UPDATE wallets
+                     SET balance_sat = balance_sat + ?
+                     WHERE address = ?;"""
+        credit_args = (
+            transaction.amount_sat
+            - transfer_fee(transaction.amount_sat, transaction.fee_bps),
+            transaction.wallet_address_to,
+        )
+        cursor.execute(command, credit_args)
 
-        cursor.close()
-        connection.close()
+        return True
+
+    @staticmethod
+    def __transaction_rows() -> RowFactory[Transaction]:
+        # both addresses repeat all over a history, so each is kept once
+        return entity_rows(Transaction, shared=(0, 1))
+
+    @staticmethod
+    def __page(since: Optional[int], limit: Optional[int]) -> Tuple[int, int]:
+        # ids start at 1 and a negative LIMIT means no limit
+        return since if since is not None else 0, limit if limit is not None else -1
 
     @staticmethod
     def __get_wallet_id(cursor: Cursor, wallet_address: str) -> int:
@@ -142,101 +524,108 @@ class SQLiteRepository:
 
         return int(row[0])
 
-    def get_user_transactions(self, user: UserInfo) -> List[Transaction]:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """SELECT w1.address,
-                            w2.address,
-                            t.amount_in_btc,
-                            t.fee_pct,
-                            t.btc_usd_exchange_rate
-                     FROM transactions t
-                     JOIN wallets w1
-                     ON t.wallet_id_from = w1.id
-                     JOIN wallets w2
-                     ON t.wallet_id_to = w2.id
-                     JOIN users_wallets uw1
-                     ON w1.id = uw1.wallet_id
-                     JOIN users_wallets uw2
-                     ON w2.id = uw2.wallet_id
-                     JOIN users u1
-                     ON uw1.user_id = u1.id
-                     JOIN users u2
-                     ON uw2.user_id = u2.id
-                     WHERE u1.api_key = ?
-                     OR u2.api_key = ?;"""
-        args = (user.api_key, user.api_key)
-
-        cursor.execute(command, args)
-        rows = cursor.fetchall()
-
-        cursor.close()
-        connection.close()
-
-        transactions = []
-
-        if rows:
-            for row in rows:
-                transactions.append(
-                    Transaction(
-                        wallet_address_from=row[0],
-                        wallet_address_to=row[1],
-                        btc_amount=row[2],
-                        fee_pct=row[3],
-                        exchange_rate=row[4],
-                    )
-                )
+    def get_user_transactions(
+        self, user: UserInfo, since: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Transaction]:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            # the user's wallet ids are resolved once into a list; each side
+            # then range-scans its index per wallet, and UNION drops transfers
+            # between two wallets of the same user
+            command = """SELECT w1.address,
+                                w2.address,
+                                t.amount_sat,
+                                t.fee_bps,
+                                t.btc_usd_exchange_rate,
+                                t.id
+                         FROM transactions t
+                         JOIN wallets w1
+                         ON t.wallet_id_from = w1.id
+                         JOIN wallets w2
+                         ON t.wallet_id_to = w2.id
+                         WHERE t.id IN (SELECT id
+                                        FROM (SELECT id
+                                              FROM transactions
+                                              WHERE wallet_id_from IN (SELECT uw.wallet_id
+                                                                       FROM users u
+                                                                       JOIN users_wallets uw
+                                                                       ON uw.user_id = u.id
+                                                                       WHERE u.api_key = :api_key)
+                                              AND id > :since
+                                              ORDER BY id
+                                              LIMIT :limit)
+                                        UNION
+                                        SELECT id
+                                        FROM (SELECT id
+                                              FROM transactions
+                                              WHERE wallet_id_to IN (SELECT uw.wallet_id
+                                                                     FROM users u
+                                                                     JOIN users_wallets uw
+                                                                     ON uw.user_id = u.id
+                                                                     WHERE u.api_key = :api_key)
+                                              AND id > :since
+                                              ORDER BY id
+                                              LIMIT :limit))
+                         ORDER BY t.id
+                         LIMIT :limit;"""
+            since, limit = self.__page(since, limit)
+            named_args = {"api_key": user.api_key, "since": since, "limit": limit}
+
+            cursor.row_factory = self.__transaction_rows()
+            cursor.execute(command, named_args)
+            transactions: List[Transaction] = cursor.fetchall()
+
+            cursor.close()
 
         return transactions
 
     def get_wallet_user(self, wallet: Wallet) -> UserInfo:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """SELECT u.email,
-                            u.api_key
-                     FROM wallets w
-                     JOIN users_wallets uw
-                     ON w.id = uw.wallet_id
-                     JOIN users u
-                     ON uw.user_id = u.id
-                     WHERE w.address = ?;"""
-        args = (wallet.wallet_address,)
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute(command, args)
-        row = cursor.fetchone()
+            command = """SELECT u.api_key,
+                                u.email
+                         FROM wallets w
+                         JOIN users_wallets uw
+                         ON w.id = uw.wallet_id
+                         JOIN users u
+                         ON uw.user_id = u.id
+                         WHERE w.address = ?;"""
+            args = (wallet.wallet_address,)
+
+            cursor.row_factory = USER_ROWS
+            cursor.execute(command, args)
+            user: UserInfo = cursor.fetchone()
 
-        cursor.close()
-        connection.close()
+            cursor.close()
 
-        return UserInfo(email=row[0], api_key=row[1])
+        return user
 
     def add_wallet(self, wallet: Wallet, user: UserInfo) -> None:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
 
-        command = """INSERT INTO wallets (address, balance_in_btc)
-                     VALUES (?, ?);"""
-        args = (wallet.wallet_address, wallet.btc_balance)
+            command = """INSERT INTO wallets (address, balance_sat)
+                         VALUES (?, ?);"""
+            args = (wallet.wallet_address, wallet.balance_sat)
 
-        cursor.execute(command, args)
-        connection.commit()
+            cursor.execute(command, args)
+            connection.commit()
 
-        user_id = self.__get_user_id(cursor=cursor, api_key=user.api_key)
-        wallet_id = self.__get_wallet_id(
-            cursor=cursor, wallet_address=wallet.wallet_address
-        )
+            user_id = self.__get_user_id(cursor=cursor, api_key=user.api_key)
+            wallet_id = self.__get_wallet_id(
+                cursor=cursor, wallet_address=wallet.wallet_address
+            )
 
-        command = """INSERT INTO users_wallets (user_id, wallet_id)
-                     VALUES (?, ?);"""
-        new_args = (user_id, wallet_id)
+            command = """INSERT INTO users_wallets (user_id, wallet_id)
+                         VALUES (?, ?);"""
+            new_args = (user_id, wallet_id)
 
-        cursor.execute(command, new_args)
-        connection.commit()
+            cursor.execute(command, new_args)
+            connection.commit()
 
-        cursor.close()
-        connection.close()
+            cursor.close()
 
     @staticmethod
     def __get_user_id(cursor: Cursor, api_key: str) -> int:
@@ -251,152 +640,145 @@ class SQLiteRepository:
         return int(row[0])
 
     def get_wallet(self, wallet_address: str) -> Optional[Wallet]:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """SELECT address,
-                            balance_in_btc
-                     FROM wallets
-                     WHERE address = ?;"""
-        args = (wallet_address,)
-
-        cursor.execute(command, args)
-        row = cursor.fetchone()
-
-        cursor.close()
-        connection.close()
-        if row:
-            return Wallet(wallet_address=row[0], btc_balance=row[1])
-        return None
-
-    def get_wallet_transactions(self, wallet_address: str) -> List[Transaction]:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """SELECT w1.address,
-                            w2.address,
-                            t.amount_in_btc,
-                            t.fee_pct,
-                            t.btc_usd_exchange_rate
-                     FROM transactions t
-                     JOIN wallets w1
-                     ON t.wallet_id_from = w1.id
-                     JOIN wallets w2
-                     ON t.wallet_id_to = w2.id
-                     WHERE w1.address = ?
-                     OR w2.address = ?;"""
-        args = (wallet_address, wallet_address)
-
-        cursor.execute(command, args)
-        rows = cursor.fetchall()
-
-        cursor.close()
-        connection.close()
-
-        transactions = []
-
-        if rows:
-            for row in rows:
-                transactions.append(
-                    Transaction(
-                        wallet_address_from=row[0],
-                        wallet_address_to=row[1],
-                        btc_amount=row[2],
-                        fee_pct=row[3],
-                        exchange_rate=row[4],
-                    )
-                )
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """SELECT address,
+                                balance_sat
+                         FROM wallets
+                         WHERE address = ?;"""
+            args = (wallet_address,)
+
+            cursor.row_factory = WALLET_ROWS
+            cursor.execute(command, args)
+            wallet: Optional[Wallet] = cursor.fetchone()
+
+            cursor.close()
+
+        return wallet
+
+    def get_wallet_transactions(
+        self,
+        wallet_address: str,
+        since: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Transaction]:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            # each side is a range scan of its index in id order, so a page
+            # only reads as many index entries as it returns
+            command = """SELECT w1.address,
+                                w2.address,
+                                t.amount_sat,
+                                t.fee_bps,
+                                t.btc_usd_exchange_rate,
+                                t.id
+                         FROM transactions t
+                         JOIN wallets w1
+                         ON t.wallet_id_from = w1.id
+                         JOIN wallets w2
+                         ON t.wallet_id_to = w2.id
+                         WHERE t.id IN (SELECT id
+                                        FROM (SELECT id
+                                              FROM transactions
+                                              WHERE wallet_id_from = (SELECT id
+                                                                      FROM wallets
+                                                                      WHERE address = :address)
+                                              AND id > :since
+                                              ORDER BY id
+                                              LIMIT :limit)
+                                        UNION
+                                        SELECT id
+                                        FROM (SELECT id
+                                              FROM transactions
+                                              WHERE wallet_id_to = (SELECT id
+                                                                    FROM wallets
+                                                                    WHERE address = :address)
+                                              AND id > :since
+                                              ORDER BY id
+                                              LIMIT :limit))
+                         ORDER BY t.id
+                         LIMIT :limit;"""
+            since, limit = self.__page(since, limit)
+            named_args = {"address": wallet_address, "since": since, "limit": limit}
+
+            cursor.row_factory = self.__transaction_rows()
+            cursor.execute(command, named_args)
+            transactions: List[Transaction] = cursor.fetchall()
+
+            cursor.close()
 
         return transactions
 
-    def update_wallet_balance(
-        self, wallet_address: str, new_btc_balance: float
-    ) -> None:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
+    def update_wallet_balance(self, wallet_address: str, new_balance_sat: int) -> None:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
 
-        command = """UPDATE wallets
-                     SET balance_in_btc = ?
-                     WHERE address = ?;"""
-        args = (new_btc_balance, wallet_address)
+            command = """UPDATE wallets
+                         SET balance_sat = ?
+                         WHERE address = ?;"""
+            args = (new_balance_sat, wallet_address)
 
-        cursor.execute(command, args)
-        connection.commit()
+            cursor.execute(command, args)
+            connection.commit()
 
-        cursor.close()
-        connection.close()
+            cursor.close()
 
     def get_user(self, api_key: str) -> Optional[UserInfo]:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """SELECT api_key,
-                            email
-                     FROM users
-                     WHERE api_key = ?;"""
-        args = (api_key,)
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute(command, args)
-        row = cursor.fetchone()
+            command = """SELECT api_key,
+                                email
+                         FROM users
+                         WHERE api_key = ?;"""
+            args = (api_key,)
 
-        cursor.close()
-        connection.close()
+            cursor.row_factory = USER_ROWS
+            cursor.execute(command, args)
+            user: Optional[UserInfo] = cursor.fetchone()
 
-        if row:
-            return UserInfo(api_key=row[0], email=row[1])
+            cursor.close()
 
-        return None
+        return user
 
     def get_user_by_email(self, email: str) -> Optional[UserInfo]:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
 
-        command = """SELECT api_key,
-                            email
-                     FROM users
-                     WHERE email = ?;"""
-        args = (email,)
+            command = """SELECT api_key,
+                                email
+                         FROM users
+                         WHERE email = ?;"""
+            args = (email,)
 
-        cursor.execute(command, args)
-        row = cursor.fetchone()
-
-        cursor.close()
-        connection.close()
+            cursor.row_factory = USER_ROWS
+            cursor.execute(command, args)
+            user: Optional[UserInfo] = cursor.fetchone()
 
-        if row:
-            return UserInfo(api_key=row[0], email=row[1])
+            cursor.close()
 
-        return None
+        return user
 
     def get_user_wallets(self, user: UserInfo) -> List[Wallet]:
-        connection = sqlite3.connect(self.db_name)
-        cursor = connection.cursor()
-
-        command = """SELECT w.address,
-                            w.balance_in_btc
-                     FROM wallets w
-                     JOIN users_wallets uw
-                     ON w.id = uw.wallet_id
-                     JOIN users u
-                     ON uw.user_id = u.id
-                     WHERE u.api_key = ?;"""
-        args = (user.api_key,)
-
-        cursor.execute(command, args)
-        rows = cursor.fetchall()
-
-        cursor.close()
-        connection.close()
-
-        wallets = []
-
-        if rows:
-            for row in rows:
-                wallets.append(
-                    Wallet(
-                        wallet_address=row[0],
-                        btc_balance=row[1],
-                    )
-                )
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+
+            command = """SELECT w.address,
+                                w.balance_sat
+                         FROM wallets w
+                         JOIN users_wallets uw
+                         ON w.id = uw.wallet_id
+                         JOIN users u
+                         ON uw.user_id = u.id
+                         WHERE u.api_key = ?;"""
+            args = (user.api_key,)
+
+            cursor.row_factory = WALLET_ROWS
+            cursor.execute(command, args)
+            wallets: List[Wallet] = cursor.fetchall()
+
+            cursor.close()
 
         return wallets
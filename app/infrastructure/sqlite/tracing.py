@@ -0,0 +1,46 @@
+import sqlite3
+from typing import Any, Iterable
+
+from app.core.tracing import CLIENT, Attributes, child_span, current_span
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Records every statement as a span within a sampled trace. The span
+    covers running the statement up to its first row; rows fetched later
+    are not in it."""
+
+    def execute(self, sql: str, parameters: Any = ()) -> "TracedCursor":
+        if current_span() is None:
+            super().execute(sql, parameters)
+            return self
+        with child_span("sqlite", CLIENT, statement_attributes(sql)):
+            super().execute(sql, parameters)
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters: Iterable[Any]) -> "TracedCursor":
+        if current_span() is None:
+            super().executemany(sql, seq_of_parameters)
+            return self
+        with child_span("sqlite", CLIENT, statement_attributes(sql)):
+            super().executemany(sql, seq_of_parameters)
+        return self
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose cursors, including those behind its own execute
+    shortcuts, are ``TracedCursor``s."""
+
+    def cursor(self, factory: Any = TracedCursor) -> Any:
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        cursor: TracedCursor = self.cursor()
+        return cursor.execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Iterable[Any]) -> sqlite3.Cursor:
+        cursor: TracedCursor = self.cursor()
+        return cursor.executemany(sql, seq_of_parameters)
+
+
+def statement_attributes(sql: str) -> Attributes:
+    return {"db.system": "sqlite", "db.statement": " ".join(sql.split())}
@@ -1,7 +1,62 @@
-import uvicorn
+import argparse
+from typing import List, Optional
 
-from app.runner.asgi import fastapi_app
+from app.core.tracing import Tracer
+from app.infrastructure.memory.memory_repository import MemoryRepository
+from app.infrastructure.otlp.file_exporter import OTLPFileExporter
+from app.runner.prefork import PreforkConfig, PreforkServer
+from app.runner.setup import (
+    DB_NAME,
+    JOURNAL_COMPACT_BYTES,
+    TRACE_SAMPLE_RATIO,
+    IRepository,
+    setup,
+)
 
-# couldn't run app from this file, so I extracted main in outer folder
 
-uvicorn.run(fastapi_app, host="0.0.0.0", port=8000, debug=True)
+def main(argv: Optional[List[str]] = None) -> None:
+    defaults = PreforkConfig()
+    parser = argparse.ArgumentParser(description="Serve the bitcoin wallet API")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--workers", type=int, default=defaults.workers)
+    parser.add_argument("--db", default=DB_NAME)
+    # memory keeps the state in the process, persisted to the journal
+    # <db>.log and the snapshot <db>.snapshot
+    parser.add_argument("--backend", choices=("sqlite", "memory"), default="sqlite")
+    parser.add_argument(
+        "--graceful-timeout", type=float, default=defaults.graceful_timeout
+    )
+    # sampled requests are appended to the file as OTLP/JSON
+    parser.add_argument("--trace-file", default=None)
+    parser.add_argument("--trace-sample-ratio", type=float, default=TRACE_SAMPLE_RATIO)
+    options = parser.parse_args(argv)
+    repository: Optional[IRepository] = None
+    if options.backend == "memory":
+        if options.workers != 1:
+            parser.error("the memory backend runs in a single worker")
+        repository = MemoryRepository(
+            path=options.db, compact_bytes=JOURNAL_COMPACT_BYTES
+        )
+
+    config = PreforkConfig(
+        host=options.host,
+        port=options.port,
+        workers=options.workers,
+        graceful_timeout=options.graceful_timeout,
+        # the memory backend was loaded before the fork; a replacement would
+        # start from that state instead of the one its predecessor wrote
+        replace_workers=options.backend != "memory",
+    )
+    tracer = None
+    if options.trace_file is not None:
+        tracer = Tracer(
+            OTLPFileExporter(options.trace_file),
+            sample_ratio=options.trace_sample_ratio,
+        )
+    app = setup(db_name=options.db, repository=repository, tracer=tracer)
+    PreforkServer(app, config).run()
+
+
+if __name__ == "__main__":
+    main()
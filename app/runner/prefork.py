@@ -0,0 +1,149 @@
+import os
+import signal
+import socket
+import time
+import traceback
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Dict, Optional
+
+import uvicorn
+from starlette.types import ASGIApp
+
+# how often the supervisor looks for dead workers
+POLL_INTERVAL = 0.2
+# a worker exiting sooner than this after its fork failed to boot
+BOOT_TIME = 1.0
+
+
+@dataclass
+class PreforkConfig:
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    backlog: int = 2048
+    # seconds the workers get to finish in-flight requests before being killed
+    graceful_timeout: float = 30.0
+    log_level: str = "info"
+    access_log: bool = False
+    # off when the state lives in the workers: a worker forked again from the
+    # supervisor would start from the state the supervisor had at startup
+    replace_workers: bool = True
+
+
+class WorkerBootError(Exception):
+    pass
+
+
+class WorkerExitedError(Exception):
+    pass
+
+
+class PreforkServer:
+    """Serves one preloaded application from several forked processes.
+
+    The application is built, and the database migrated, once in the parent;
+    the workers are forked from it and accept connections on the socket it
+    listens on. SIGTERM or SIGINT shuts them down gracefully: each stops
+    accepting, finishes its in-flight requests and runs the application's
+    shutdown handlers. Workers that die are replaced, unless
+    ``replace_workers`` is off; then the supervisor stops the rest and
+    raises, for a process manager to restart the whole server.
+
+    Each worker has its own memory, so in-process caches are per worker;
+    they are kept coherent through the database (see ``CacheVersionWatcher``).
+    """
+
+    def __init__(self, app: ASGIApp, config: Optional[PreforkConfig] = None):
+        self.app = app
+        self.config = config if config is not None else PreforkConfig()
+        self.__workers: Dict[int, float] = {}
+        self.__stopping = False
+
+    def run(self) -> None:
+        listener = self.__listen()
+        handlers = {
+            sig: signal.signal(sig, self.__stop)
+            for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        print(
+            f"Serving on {self.config.host}:{self.config.port} "
+            f"with {self.config.workers} workers"
+        )
+        try:
+            for _ in range(self.config.workers):
+                self.__spawn(listener)
+            while not self.__stopping:
+                for pid, started in self.__reap().items():
+                    if time.monotonic() - started < BOOT_TIME:
+                        raise WorkerBootError(f"Worker {pid} failed to boot")
+                    if not self.config.replace_workers:
+                        raise WorkerExitedError(f"Worker {pid} died")
+                    print(f"Worker {pid} died, replacing it")
+                    self.__spawn(listener)
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self.__shutdown()
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+            listener.close()
+
+    def __listen(self) -> socket.socket:
+        # asyncio only disables Nagle on accepted sockets whose protocol is
+        # explicitly TCP; without it every keep-alive response waits for the
+        # client's delayed ACK
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.config.host, self.config.port))
+        listener.listen(self.config.backlog)
+        return listener
+
+    def __spawn(self, listener: socket.socket) -> None:
+        pid = os.fork()
+        if pid:
+            self.__workers[pid] = time.monotonic()
+            return
+
+        exit_code = 1
+        try:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            server = uvicorn.Server(
+                uvicorn.Config(
+                    self.app,
+                    lifespan="on",
+                    log_level=self.config.log_level,
+                    access_log=self.config.access_log,
+                )
+            )
+            server.run(sockets=[listener])
+            exit_code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(exit_code)
+
+    def __reap(self) -> Dict[int, float]:
+        exited = {}
+        while self.__workers:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            exited[pid] = self.__workers.pop(pid)
+        return exited
+
+    def __shutdown(self) -> None:
+        for pid in self.__workers:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.config.graceful_timeout
+        while self.__workers and time.monotonic() < deadline:
+            self.__reap()
+            time.sleep(POLL_INTERVAL)
+        for pid in self.__workers:
+            print(f"Worker {pid} did not stop in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.__workers.clear()
+
+    def __stop(self, signum: int, frame: Optional[FrameType]) -> None:
+        self.__stopping = True
@@ -1,21 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Protocol
+
 from fastapi import FastAPI
 
-from app.core.facade import BTCWalletService
+from app.core.admin.admin_repository import IAdminRepository
+from app.core.cache_version import (
+    EXCHANGE_RATE_CACHE,
+    PRINCIPALS_CACHE,
+    CacheVersionWatcher,
+    ICacheVersionRepository,
+)
+from app.core.exchange_rate import (
+    AsyncCoindeskExchangeRateProvider,
+    AsyncExchangeRateRefresher,
+    AsyncTimedExchangeRateProvider,
+    CachedExchangeRateProvider,
+    CoindeskExchangeRateProvider,
+    IExchangeRateProvider,
+    TimedExchangeRateProvider,
+)
+from app.core.facade import AsyncBTCWalletService, BTCWalletService
+from app.core.metrics import TimedRepository
+from app.core.principal_cache import PrincipalCache
+from app.core.profiling import RequestProfiler, StackSampler
+from app.core.tracing import Tracer
+from app.core.transaction.transaction_repository import ITransferQueueRepository
+from app.core.transaction.transfer_workers import TransferWorkerConfig
+from app.core.user.user_repository import IUserRepository
+from app.core.wallet.wallet_repository import IWalletRepository
 from app.infrastructure.fastapi.admin import admin_api
+from app.infrastructure.fastapi.metrics import metrics_api
+from app.infrastructure.fastapi.profiling import RequestProfilingMiddleware
+from app.infrastructure.fastapi.tracing import TracingMiddleware
 from app.infrastructure.fastapi.transaction import transaction_api
 from app.infrastructure.fastapi.user import user_api
 from app.infrastructure.fastapi.wallet import wallet_api
+from app.infrastructure.sqlite.checkpoint import CheckpointPolicy, WalCheckpointer
+from app.infrastructure.sqlite.connection_pool import SQLitePoolConfig
+from app.infrastructure.sqlite.migrations import print_progress
+from app.infrastructure.sqlite.profile import DEFAULT_PROFILE
 from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
 
+DB_NAME = "bw.db"
+POOL_CONFIG = SQLitePoolConfig(
+    max_connections=8, acquire_timeout=5.0, profile=DEFAULT_PROFILE
+)
+CHECKPOINT_POLICY = CheckpointPolicy(interval=30.0, mode="PASSIVE")
+RATE_TTL = 60.0
+RATE_REFRESH_AHEAD = 10.0
+RATE_MAX_STALENESS = 300.0
+RATE_FETCH_TIMEOUT = 2.0
+PRINCIPAL_CACHE_SIZE = 10_000
+PRINCIPAL_CACHE_TTL = 300.0
+# bound on how long a worker serves cache entries invalidated by another one
+CACHE_VERSION_INTERVAL = 1.0
+# the memory backend snapshots once its journal grows past this
+JOURNAL_COMPACT_BYTES = 64 * 1024 * 1024
+# share of requests traced when a tracer is configured
+TRACE_SAMPLE_RATIO = 0.01
+# per worker process; all of them take jobs from the same queue
+TRANSFER_WORKERS = TransferWorkerConfig(
+    workers=2, batch_size=100, poll_interval=1.0, lease_seconds=30.0
+)
+
+
+class IRepository(
+    IAdminRepository,
+    ITransferQueueRepository,
+    IUserRepository,
+    IWalletRepository,
+    ICacheVersionRepository,
+    Protocol,
+):
+    def close(self) -> None:
+        pass
 
-def setup() -> FastAPI:
+
+def setup(
+    db_name: str = DB_NAME,
+    pool_config: Optional[SQLitePoolConfig] = None,
+    checkpoint_policy: Optional[CheckpointPolicy] = None,
+    rate_provider: Optional[IExchangeRateProvider] = None,
+    repository: Optional[IRepository] = None,
+    tracer: Optional[Tracer] = None,
+) -> FastAPI:
+    """Builds the application on ``repository``, or on a SQLiteRepository
+    for ``db_name`` when none is given. With a ``tracer``, sampled requests
+    are traced."""
     app = FastAPI()
+    request_profiler = RequestProfiler()
+    app.add_middleware(RequestProfilingMiddleware, profiler=request_profiler)
+    if tracer is not None:
+        app.add_middleware(TracingMiddleware, tracer=tracer)
+        app.add_event_handler("startup", tracer.start)
+        app.add_event_handler("shutdown", tracer.stop)
     app.include_router(admin_api)
+    app.include_router(metrics_api)
     app.include_router(transaction_api)
     app.include_router(user_api)
     app.include_router(wallet_api)
-    repository = SQLiteRepository()
+    if pool_config is None:
+        pool_config = POOL_CONFIG
+    checkpointer: Optional[WalCheckpointer] = None
+    if repository is None:
+        sqlite_repository = SQLiteRepository(
+            db_name=db_name,
+            pool_config=pool_config,
+            on_migration_progress=print_progress,
+        )
+        checkpointer = WalCheckpointer(
+            sqlite_repository.pool,
+            checkpoint_policy if checkpoint_policy is not None else CHECKPOINT_POLICY,
+        )
+        app.add_event_handler("startup", checkpointer.start)
+        repository = sqlite_repository
+    repository = TimedRepository(repository)
+    executor = ThreadPoolExecutor(
+        max_workers=max(pool_config.max_connections, 1), thread_name_prefix="storage"
+    )
+    if rate_provider is None:
+        cached_rate_provider = CachedExchangeRateProvider(
+            TimedExchangeRateProvider(
+                CoindeskExchangeRateProvider(timeout=RATE_FETCH_TIMEOUT), "coindesk"
+            ),
+            ttl=RATE_TTL,
+            refresh_ahead=RATE_REFRESH_AHEAD,
+            max_staleness=RATE_MAX_STALENESS,
+            fetch_timeout=RATE_FETCH_TIMEOUT,
+            version=CacheVersionWatcher(
+                repository, EXCHANGE_RATE_CACHE, CACHE_VERSION_INTERVAL
+            ),
+        )
+        refresher = AsyncExchangeRateRefresher(
+            cached_rate_provider,
+            AsyncTimedExchangeRateProvider(
+                AsyncCoindeskExchangeRateProvider(timeout=RATE_FETCH_TIMEOUT),
+                "coindesk",
+            ),
+        )
+        app.add_event_handler("startup", refresher.start)
+        app.add_event_handler("shutdown", refresher.stop)
+        rate_provider = cached_rate_provider
+    app.state.principal_cache = PrincipalCache(
+        max_size=PRINCIPAL_CACHE_SIZE,
+        ttl=PRINCIPAL_CACHE_TTL,
+        version=CacheVersionWatcher(
+            repository, PRINCIPALS_CACHE, CACHE_VERSION_INTERVAL
+        ),
+    )
     app.state.core = BTCWalletService.create(
-        repository, repository, repository, repository
+        repository,
+        repository,
+        repository,
+        repository,
+        rate_provider,
+        app.state.principal_cache,
+        profiler=StackSampler(),
+        request_profiler=request_profiler,
+        transfer_workers=TRANSFER_WORKERS,
     )
+    app.state.async_core = AsyncBTCWalletService(app.state.core, executor)
+    transfer_workers = app.state.core.transfer_workers
+    if transfer_workers is not None:
+        app.add_event_handler("startup", transfer_workers.start)
+        app.add_event_handler("shutdown", transfer_workers.stop)
+    # after the workers, which still write while they stop
+    app.add_event_handler("shutdown", executor.shutdown)
+    if checkpointer is not None:
+        # its last checkpoint runs once nothing writes any more
+        app.add_event_handler("shutdown", checkpointer.stop)
+    app.add_event_handler("shutdown", repository.close)
     return app
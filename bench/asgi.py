@@ -0,0 +1,94 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from starlette.types import ASGIApp, Message
+
+Params = Dict[str, Any]
+
+
+class LifespanError(Exception):
+    pass
+
+
+class ASGIClient:
+    """Calls an ASGI application in process, the way a server would but
+    without sockets or HTTP parsing, so that what is measured is the
+    application itself. ``startup`` and ``shutdown`` run its lifespan."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.__lifespan: Optional["asyncio.Task[None]"] = None
+
+    async def startup(self) -> None:
+        # made here, on the loop that serves the requests
+        self.__events: "asyncio.Queue[Message]" = asyncio.Queue()
+        self.__replies: "asyncio.Queue[Message]" = asyncio.Queue()
+
+        async def receive() -> Message:
+            return await self.__events.get()
+
+        async def send(message: Message) -> None:
+            await self.__replies.put(message)
+
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}}
+        self.__lifespan = asyncio.ensure_future(self.app(scope, receive, send))
+        await self.__lifespan_event("startup")
+
+    async def shutdown(self) -> None:
+        if self.__lifespan is None:
+            return
+        await self.__lifespan_event("shutdown")
+        await self.__lifespan
+        self.__lifespan = None
+
+    async def request(
+        self, method: str, path: str, params: Optional[Params] = None
+    ) -> Tuple[int, Any]:
+        """Returns the status and the decoded JSON body."""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params or {}).encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        request_sent = False
+        status = 0
+        body: List[bytes] = []
+        done = asyncio.Event()
+
+        async def receive() -> Message:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    done.set()
+
+        await self.app(scope, receive, send)
+        content = b"".join(body)
+        return status, json.loads(content) if content else None
+
+    async def __lifespan_event(self, event: str) -> None:
+        await self.__events.put({"type": f"lifespan.{event}"})
+        reply = await self.__replies.get()
+        if reply["type"] != f"lifespan.{event}.complete":
+            raise LifespanError(reply.get("message", reply["type"]))
@@ -0,0 +1,102 @@
+"""Cost of the core against the cost of storage, per service call.
+
+Runs one workload through ``BTCWalletService`` on ``MemoryRepository`` and
+on ``SQLiteRepository``. The in-memory figures are close to the cost of the
+interactors and handler chains alone; the difference to SQLite is what
+storage adds. Run with ``python -m bench.backends [--transfers N]``.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.facade import BTCWalletService
+from app.core.transaction.transaction_CoR import MakeTransactionRequest
+from app.core.user.user_interactor import RegisterUserRequest
+from app.core.wallet.wallet_interactor import AddWalletRequest, GetWalletRequest
+from app.infrastructure.memory.memory_repository import MemoryRepository
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from app.runner.setup import IRepository
+
+USER_COUNT = 100
+PAGE_SIZE = 100
+
+
+def run(repository: IRepository, transfer_count: int) -> Dict[str, float]:
+    """Median microseconds per call of each operation."""
+    service = BTCWalletService.create(
+        repository,
+        repository,
+        repository,
+        repository,
+        rate_provider=StubExchangeRateProvider(),
+    )
+    timings: Dict[str, List[float]] = {}
+
+    def timed(name: str, call: Callable[[], object]) -> None:
+        started = time.perf_counter()
+        call()
+        timings.setdefault(name, []).append(time.perf_counter() - started)
+
+    def register_user(email: str) -> str:
+        api_key = service.register_user(RegisterUserRequest(email)).api_key
+        assert api_key is not None
+        return api_key
+
+    def add_wallet(api_key: str) -> str:
+        wallet_info = service.add_wallet(AddWalletRequest(api_key)).wallet_info
+        assert wallet_info is not None
+        return wallet_info.wallet_address
+
+    api_keys: List[str] = []
+    addresses: List[str] = []
+    for i in range(USER_COUNT):
+        timed("register user", lambda: api_keys.append(register_user(f"user{i}")))
+        for _ in range(2):
+            timed("add wallet", lambda: addresses.append(add_wallet(api_keys[-1])))
+
+    for i in range(transfer_count):
+        user = i % USER_COUNT
+        request = MakeTransactionRequest(
+            api_keys[user], addresses[2 * user], addresses[2 * user + 1], 1000
+        )
+        timed("make transfer", lambda: service.make_transaction(request))
+
+    for i in range(transfer_count):
+        user = i % USER_COUNT
+        wallet = GetWalletRequest(api_keys[user], addresses[2 * user])
+        timed("get wallet", lambda: service.get_wallet(wallet))
+        timed(
+            "transaction page",
+            lambda: service.get_transactions(api_keys[user], limit=PAGE_SIZE),
+        )
+
+    return {name: statistics.median(samples) * 1e6 for name, samples in timings.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--transfers", type=int, default=10_000)
+    options = parser.parse_args(argv)
+
+    memory = run(MemoryRepository(), options.transfers)
+    with tempfile.TemporaryDirectory() as directory:
+        repository = SQLiteRepository(db_name=os.path.join(directory, "bench.db"))
+        sqlite = run(repository, options.transfers)
+        repository.close()
+
+    print(f"{'':>18}  {'memory':>10}  {'sqlite':>10}  {'storage':>8}")
+    for name, core in memory.items():
+        total = sqlite[name]
+        print(
+            f"{name:>18}: {core:7.1f} us  {total:7.1f} us  "
+            f"{(total - core) / total:7.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
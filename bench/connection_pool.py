@@ -0,0 +1,68 @@
+"""Requests/sec on ``POST /transactions`` with and without connection pooling.
+
+Run with ``python -m bench.connection_pool [--requests N]``.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict
+
+from starlette.testclient import TestClient
+
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.infrastructure.sqlite.connection_pool import SQLitePoolConfig
+from app.runner.setup import setup
+
+
+def run(pool_config: SQLitePoolConfig, request_count: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        app = setup(
+            os.path.join(directory, "bench.db"),
+            pool_config,
+            rate_provider=StubExchangeRateProvider(),
+        )
+        with TestClient(app) as client:
+            api_key = client.post("/users", params={"email": "bench"}).json()["api_key"]
+            addresses = [
+                client.post("/wallets", params={"api_key": api_key}).json()[
+                    "wallet_info"
+                ]["wallet_address"]
+                for _ in range(2)
+            ]
+
+            started = time.perf_counter()
+            for i in range(request_count):
+                response = client.post(
+                    "/transactions",
+                    params={
+                        "api_key": api_key,
+                        "wallet_address_from": addresses[i % 2],
+                        "wallet_address_to": addresses[(i + 1) % 2],
+                        "btc_amount": 0.0001,
+                    },
+                )
+                assert response.json()["success"], response.text
+            elapsed = time.perf_counter() - started
+
+    return request_count / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    options = parser.parse_args()
+
+    results: Dict[str, float] = {
+        "connection per call": run(
+            SQLitePoolConfig(max_connections=0), options.requests
+        ),
+        "pooled": run(SQLitePoolConfig(max_connections=8), options.requests),
+    }
+    for name, requests_per_second in results.items():
+        print(f"{name:>20}: {requests_per_second:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Memory and time to load transaction histories as entities.
+
+Loads a generated ledger (one user, two wallets) through the repository
+and, for comparison, maps the same rows with a plain ``__dict__``
+dataclass in a loop over ``fetchall()``, as the repository did before.
+Run with ``python -m bench.entities [--rows N]``.
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.entities import UserInfo
+from app.infrastructure.sqlite.schema import STATISTICS_TRIGGER
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+
+USER = UserInfo(api_key="key1", email="user1")
+
+LEDGER = """SELECT w1.address,
+                   w2.address,
+                   t.amount_sat,
+                   t.fee_bps,
+                   t.btc_usd_exchange_rate,
+                   t.id
+            FROM transactions t
+            JOIN wallets w1
+            ON t.wallet_id_from = w1.id
+            JOIN wallets w2
+            ON t.wallet_id_to = w2.id;"""
+
+
+@dataclass
+class PlainTransaction:
+    wallet_address_from: str
+    wallet_address_to: str
+    amount_sat: int
+    fee_bps: int
+    exchange_rate: float
+    transaction_id: Optional[int] = None
+
+
+def generate(repository: SQLiteRepository, row_count: int) -> None:
+    with repository.pool.connection() as connection:
+        existing = connection.execute("SELECT COUNT(*) FROM transactions;").fetchone()
+        if existing[0] == row_count:
+            return
+        if existing[0]:
+            raise SystemExit("database holds a ledger of another size")
+
+        connection.execute("BEGIN IMMEDIATE;")
+        connection.execute(
+            "INSERT INTO users (email, api_key) VALUES (?, ?);",
+            (USER.email, USER.api_key),
+        )
+        connection.execute("""INSERT INTO wallets (address, balance_sat)
+               VALUES ('wallet1', 0), ('wallet2', 0);""")
+        connection.execute(
+            "INSERT INTO users_wallets (user_id, wallet_id) VALUES (1, 1), (1, 2);"
+        )
+        connection.execute("DROP TRIGGER trg_transactions_statistics;")
+        connection.execute(
+            """WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c
+                                       WHERE x < :rows)
+               INSERT INTO transactions (wallet_id_from,
+                                         wallet_id_to,
+                                         amount_sat,
+                                         fee_bps,
+                                         btc_usd_exchange_rate)
+               SELECT x % 2 + 1, (x + 1) % 2 + 1, x, 150, 40000 FROM c;""",
+            {"rows": row_count},
+        )
+        connection.execute(STATISTICS_TRIGGER)
+        connection.commit()
+    repository.reconcile_statistics()
+
+
+def plain_ledger(repository: SQLiteRepository) -> List[PlainTransaction]:
+    with repository.pool.connection() as connection:
+        rows = connection.execute(LEDGER).fetchall()
+    return [PlainTransaction(*row) for row in rows]
+
+
+def measure(load: Callable[[], List[Any]], repeat: int) -> Tuple[float, float, float]:
+    """Median seconds, then peak and retained MiB of one traced load."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    loaded = load()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return statistics.median(timings), peak / 2**20, retained / 2**20
+
+
+def run(repository: SQLiteRepository, repeat: int) -> Dict[str, Tuple[float, ...]]:
+    return {
+        "plain loop, full ledger": measure(lambda: plain_ledger(repository), repeat),
+        "slotted rows, full ledger": measure(repository.fetch_all_transactions, repeat),
+        "slotted rows, history": measure(
+            lambda: repository.get_user_transactions(USER), repeat
+        ),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db", default=None)
+    options = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = options.db or os.path.join(directory, "ledger.db")
+        repository = SQLiteRepository(db_name=db_name)
+        generate(repository, options.rows)
+        results = run(repository, options.repeat)
+        repository.close()
+
+    print(f"{'':>26}  {'median':>10}  {'peak':>10}  {'retained':>10}")
+    for name, (seconds, peak, retained) in results.items():
+        print(
+            f"{name:>26}: {seconds * 1000:7.0f} ms  {peak:6.1f} MiB  "
+            f"{retained:6.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Transfer throughput of the journaled memory ledger against SQLite.
+
+Concurrent threads each move satoshis between their own pair of wallets
+through ``execute_transfer`` for a fixed number of transfers, with every
+transfer durable before it returns (SQLite runs ``DURABLE_PROFILE``). SQLite
+pays an fsync and its page writes per commit; the memory ledger appends one journal record and shares each fsync with the
+writers waiting at the same time. Also times reopening the ledger from the
+journal alone and from a snapshot. Run with
+``python -m bench.ledger [--transfers N] [--threads 1,8]``.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional
+
+from app.core.entities import Transaction, UserInfo, Wallet
+from app.infrastructure.memory.memory_repository import MemoryRepository
+from app.infrastructure.sqlite.connection_pool import SQLitePoolConfig
+from app.infrastructure.sqlite.profile import DURABLE_PROFILE
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from app.runner.setup import IRepository
+
+USER = UserInfo(api_key="bench", email="bench")
+
+
+def throughput(repository: IRepository, threads: int, transfers: int) -> float:
+    for thread in range(threads):
+        for side in "ab":
+            repository.add_wallet(Wallet(f"{threads}-{thread}{side}", 10**12), USER)
+
+    def transfer(thread: int) -> None:
+        for i in range(transfers // threads):
+            source, destination = "ab" if i % 2 else "ba"
+            repository.execute_transfer(
+                Transaction(
+                    f"{threads}-{thread}{source}",
+                    f"{threads}-{thread}{destination}",
+                    1000,
+                    150,
+                    4e4,
+                )
+            )
+
+    workers = [threading.Thread(target=transfer, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return transfers / (time.perf_counter() - started)
+
+
+def timed(call: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    call()
+    return time.perf_counter() - started
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--transfers", type=int, default=4000)
+    parser.add_argument("--threads", default="1,8")
+    options = parser.parse_args(argv)
+    counts = [int(count) for count in options.threads.split(",")]
+
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite = SQLiteRepository(
+            db_name=os.path.join(directory, "bench.db"),
+            pool_config=SQLitePoolConfig(profile=DURABLE_PROFILE),
+        )
+        memory = MemoryRepository(path=os.path.join(directory, "ledger"))
+        for repository in (sqlite, memory):
+            repository.register_user(USER)
+
+        print(f"{'':>10}  {'sqlite':>12}  {'journal':>12}")
+        for threads in counts:
+            results = [
+                throughput(repository, threads, options.transfers)
+                for repository in (sqlite, memory)
+            ]
+            print(
+                f"{threads:>3} threads: {results[0]:8.0f} tx/s  "
+                f"{results[1]:8.0f} tx/s  x{results[1] / results[0]:.1f}"
+            )
+        sqlite.close()
+
+        path = os.path.join(directory, "ledger")
+        size = os.path.getsize(f"{path}.log")
+        # a copy, as the open repository holds the lock on its files
+        replica = os.path.join(directory, "replica")
+        shutil.copy(f"{path}.log", f"{replica}.log")
+        replay = timed(lambda: MemoryRepository(path=replica))
+        memory.close()
+        reopen = timed(lambda: MemoryRepository(path=path))
+        print(
+            f"reopen: {replay * 1e3:.0f} ms replaying {size / 1e6:.1f} MB of "
+            f"journal, {reopen * 1e3:.0f} ms from a snapshot"
+        )
+
+
+if __name__ == "__main__":
+    main()
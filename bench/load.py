@@ -0,0 +1,373 @@
+"""Load test of the HTTP API, reported per endpoint as JSON.
+
+Seeds users, wallets and transfers into a scratch database, builds the real
+application on it with the exchange rate stubbed, and drives it in process
+through its ASGI interface: ``--concurrency`` clients send requests drawn
+from ``--mix`` until ``--requests`` have completed. The report gives the
+throughput and p50/p95/p99 latency of every endpoint, plus the commit it
+was measured on, so reports from two commits can be compared. Run with
+``python -m bench.load [--requests N] [--concurrency C] [--output FILE]``
+or ``make bench``.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+
+from app.core.entities import Transaction, UserInfo, Wallet
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.money import to_btc
+from app.core.transaction.transaction_CoR import FEE_BASIS_POINTS
+from app.core.wallet.wallet_CoR import DEFAULT_INITIAL_BALANCE, MAX_WALLET_COUNT
+from app.infrastructure.memory.memory_repository import MemoryRepository
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from app.runner.setup import IRepository, setup
+from bench.asgi import ASGIClient, Params
+
+ADMIN_API_KEY = "Stephane27"
+# without submit, the queued transfer, so reports compare with earlier ones
+DEFAULT_MIX = (
+    "register=2,add_wallet=2,get_wallet=40,transfer=20,history=30,statistics=6"
+)
+# small enough that seeded wallets never run dry during a run
+TRANSFER_SAT = 1000
+SEED_BATCH = 1000
+HISTORY_PAGE = 100
+PERCENTILES = (50, 95, 99)
+
+Call = Tuple[str, str, Params]
+
+
+@dataclass
+class LoadConfig:
+    users: int = 1000
+    wallets_per_user: int = 2
+    transactions: int = 20_000
+    requests: int = 20_000
+    warmup: int = 500
+    concurrency: int = 16
+    mix: Dict[str, int] = field(default_factory=lambda: parse_mix(DEFAULT_MIX))
+    backend: str = "sqlite"
+    seed: int = 0
+
+
+class Population:
+    """The users and wallets requests are drawn from; grows as the load
+    registers users and adds wallets."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.api_keys: List[str] = []
+        # (owner's api key, address)
+        self.wallets: List[Tuple[str, str]] = []
+        # wallet counts of users that can still add a wallet, and of those
+        # an add-wallet request is under way for
+        self.roomy: Dict[str, int] = {}
+        self.claimed: Dict[str, int] = {}
+        self.registered = 0
+
+    def add_user(self, api_key: str) -> None:
+        self.api_keys.append(api_key)
+        self.roomy[api_key] = 0
+
+    def claim_room(self) -> Optional[str]:
+        """A user to add a wallet to; concurrent requests get different
+        ones, so that none goes over the wallet limit."""
+        if not self.roomy:
+            return None
+        api_key, count = self.roomy.popitem()
+        self.claimed[api_key] = count
+        return api_key
+
+    def add_wallet(self, api_key: str, address: str) -> None:
+        self.wallets.append((api_key, address))
+        count = self.claimed.pop(api_key, None)
+        if count is None:
+            count = self.roomy.pop(api_key)
+        if count + 1 < MAX_WALLET_COUNT:
+            self.roomy[api_key] = count + 1
+
+    def user(self) -> str:
+        return self.rng.choice(self.api_keys)
+
+    def wallet(self) -> Tuple[str, str]:
+        return self.rng.choice(self.wallets)
+
+    def wallet_pair(self) -> List[Tuple[str, str]]:
+        return self.rng.sample(self.wallets, 2)
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {name}")
+        weights[name] = int(weight) if weight else 1
+    return weights
+
+
+def register(population: Population) -> Call:
+    population.registered += 1
+    return "POST", "/users", {"email": f"load-{population.registered}@bench"}
+
+
+def add_wallet(population: Population) -> Call:
+    # with no user left that has room, the request is sent anyway and fails
+    api_key = population.claim_room() or population.user()
+    return "POST", "/wallets", {"api_key": api_key}
+
+
+def get_wallet(population: Population) -> Call:
+    api_key, address = population.wallet()
+    return "GET", f"/wallets/{address}", {"api_key": api_key}
+
+
+def transfer(population: Population) -> Call:
+    (api_key, source), (_, destination) = population.wallet_pair()
+    return (
+        "POST",
+        "/transactions",
+        {
+            "api_key": api_key,
+            "wallet_address_from": source,
+            "wallet_address_to": destination,
+            "btc_amount": to_btc(TRANSFER_SAT),
+        },
+    )
+
+
+def submit(population: Population) -> Call:
+    # queued and answered with a job id; workers transfer in batches
+    method, path, params = transfer(population)
+    return method, path, {**params, "asynchronous": "true"}
+
+
+def history(population: Population) -> Call:
+    return "GET", "/transactions", {"api_key": population.user(), "limit": HISTORY_PAGE}
+
+
+def statistics(population: Population) -> Call:
+    return "GET", "/statistics", {"api_key": ADMIN_API_KEY}
+
+
+OPERATIONS: Dict[str, Callable[[Population], Call]] = {
+    "register": register,
+    "add_wallet": add_wallet,
+    "get_wallet": get_wallet,
+    "transfer": transfer,
+    "submit": submit,
+    "history": history,
+    "statistics": statistics,
+}
+
+
+def seed(repository: IRepository, config: LoadConfig, rng: random.Random) -> Population:
+    population = Population(rng)
+    for i in range(config.users):
+        user = UserInfo(api_key=f"seed-{i}", email=f"seed-{i}@bench")
+        repository.register_user(user)
+        population.add_user(user.api_key)
+        for j in range(config.wallets_per_user):
+            address = f"seed-{i}-{j}"
+            repository.add_wallet(Wallet(address, DEFAULT_INITIAL_BALANCE), user)
+            population.add_wallet(user.api_key, address)
+
+    rate = StubExchangeRateProvider().rate or 0.0
+    for start in range(0, config.transactions, SEED_BATCH):
+        batch = []
+        for _ in range(min(SEED_BATCH, config.transactions - start)):
+            (user_from, source), (user_to, destination) = population.wallet_pair()
+            fee_bps = FEE_BASIS_POINTS if user_from != user_to else 0
+            batch.append(Transaction(source, destination, TRANSFER_SAT, fee_bps, rate))
+        repository.execute_transfers(batch)
+    return population
+
+
+def failed(status: int, body: Any) -> bool:
+    # the API answers refusals with 200 and success=false in the body
+    return status >= 400 or (isinstance(body, dict) and body.get("success") is False)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted ``samples``."""
+    return samples[max(math.ceil(len(samples) * p / 100), 1) - 1]
+
+
+async def drive(
+    client: ASGIClient,
+    population: Population,
+    config: LoadConfig,
+    count: int,
+) -> Tuple[Dict[str, List[Tuple[float, bool]]], float]:
+    """Sends ``count`` requests from ``config.concurrency`` clients; returns
+    the (latency, failed) samples of each operation and the elapsed time."""
+    names = list(config.mix)
+    weights = [config.mix[name] for name in names]
+    samples: Dict[str, List[Tuple[float, bool]]] = {name: [] for name in names}
+    remaining = count
+
+    async def client_loop() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            name = population.rng.choices(names, weights)[0]
+            method, path, params = OPERATIONS[name](population)
+            started = time.perf_counter()
+            status, body = await client.request(method, path, params)
+            latency = time.perf_counter() - started
+            samples[name].append((latency, failed(status, body)))
+            if name == "register" and not failed(status, body):
+                population.add_user(body["api_key"])
+            elif name == "add_wallet" and not failed(status, body):
+                address = body["wallet_info"]["wallet_address"]
+                population.add_wallet(params["api_key"], address)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(config.concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(
+    samples: Dict[str, List[Tuple[float, bool]]], elapsed: float
+) -> Dict[str, Any]:
+    endpoints = {}
+    for name, results in samples.items():
+        if not results:
+            continue
+        latencies = sorted(latency for latency, _ in results)
+        endpoints[name] = {
+            "requests": len(results),
+            "errors": sum(error for _, error in results),
+            "throughput_rps": round(len(results) / elapsed, 1),
+            **{
+                f"p{p}_ms": round(percentile(latencies, p) * 1e3, 3)
+                for p in PERCENTILES
+            },
+            "max_ms": round(latencies[-1] * 1e3, 3),
+        }
+    total = sum(len(results) for results in samples.values())
+    return {
+        "total": {
+            "requests": total,
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 1),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def commit() -> Optional[str]:
+    try:
+        described = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return described.stdout.strip()
+
+
+async def measure(app: FastAPI, population: Population, config: LoadConfig) -> Any:
+    client = ASGIClient(app)
+    await client.startup()
+    try:
+        await drive(client, population, config, config.warmup)
+        return summarize(*await drive(client, population, config, config.requests))
+    finally:
+        await client.shutdown()
+
+
+def run(config: LoadConfig) -> Dict[str, Any]:
+    rng = random.Random(config.seed)
+    rate_provider = StubExchangeRateProvider()
+    with tempfile.TemporaryDirectory() as directory:
+        if config.backend == "memory":
+            memory = MemoryRepository()
+            population = seed(memory, config, rng)
+            app = setup(repository=memory, rate_provider=rate_provider)
+        else:
+            # seeded beforehand, so that the app runs as configured in setup
+            db_name = os.path.join(directory, "bench.db")
+            sqlite = SQLiteRepository(db_name=db_name)
+            population = seed(sqlite, config, rng)
+            sqlite.close()
+            app = setup(db_name=db_name, rate_provider=rate_provider)
+        report = asyncio.run(measure(app, population, config))
+    return {
+        "commit": commit(),
+        "python": sys.version.split()[0],
+        "config": asdict(config),
+        **report,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    defaults = LoadConfig()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument(
+        "--wallets-per-user",
+        type=int,
+        choices=range(1, MAX_WALLET_COUNT + 1),
+        default=defaults.wallets_per_user,
+    )
+    parser.add_argument("--transactions", type=int, default=defaults.transactions)
+    parser.add_argument("--requests", type=int, default=defaults.requests)
+    parser.add_argument("--warmup", type=int, default=defaults.warmup)
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument(
+        "--backend", choices=("sqlite", "memory"), default=defaults.backend
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", default=None, help="file for the JSON report")
+    options = parser.parse_args(argv)
+    try:
+        mix = parse_mix(options.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = run(
+        LoadConfig(
+            users=options.users,
+            wallets_per_user=options.wallets_per_user,
+            transactions=options.transactions,
+            requests=options.requests,
+            warmup=options.warmup,
+            concurrency=options.concurrency,
+            mix=mix,
+            backend=options.backend,
+            seed=options.seed,
+        )
+    )
+    text = json.dumps(report, indent=2)
+    if options.output is None:
+        print(text)
+        return
+    with open(options.output, "w") as output:
+        output.write(text + "\n")
+    total = report["total"]
+    print(
+        f"{total['requests']} requests in {total['duration_s']} s, "
+        f"{total['throughput_rps']} req/s, {total['errors']} errors; "
+        f"report in {options.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Overhead of the timing instrumentation.
+
+Times a repository read through ``TimedRepository`` against the bare
+``MemoryRepository`` (the cheapest backend, so the overhead is the largest
+share) and a single ``observe``, then relates the cost of one timed call to
+a whole ``make_transaction``. Run with ``python -m bench.metrics``.
+"""
+
+import argparse
+import timeit
+from typing import List, Optional
+
+from app.core.entities import UserInfo, Wallet
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.facade import BTCWalletService
+from app.core.metrics import REPOSITORY_SECONDS, TimedRepository
+from app.core.transaction.transaction_CoR import MakeTransactionRequest
+from app.infrastructure.memory.memory_repository import MemoryRepository
+
+USER = UserInfo(api_key="bench", email="bench")
+
+
+def per_call(statement: object, number: int) -> float:
+    """Best nanoseconds per call over five runs."""
+    runs = timeit.repeat(statement, number=number, repeat=5)  # type: ignore
+    return min(runs) / number * 1e9
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200_000)
+    options = parser.parse_args(argv)
+
+    repository = MemoryRepository()
+    repository.register_user(USER)
+    for address in "ab":
+        repository.add_wallet(Wallet(address, 10**12), USER)
+    timed = TimedRepository(repository)
+    series = REPOSITORY_SECONDS.labels("bench")
+
+    bare = per_call(lambda: repository.get_wallet("a"), options.calls)
+    wrapped = per_call(lambda: timed.get_wallet("a"), options.calls)
+    observe = per_call(lambda: series.observe(0.001), options.calls)
+    service = BTCWalletService.create(
+        timed, timed, timed, timed, StubExchangeRateProvider()
+    )
+    request = MakeTransactionRequest("bench", "a", "b", 1)
+    transfer = per_call(lambda: service.make_transaction(request), options.calls // 20)
+
+    print(f"observe:                  {observe:8.0f} ns")
+    print(f"get_wallet:               {bare:8.0f} ns")
+    print(f"get_wallet, timed:        {wrapped:8.0f} ns (+{wrapped - bare:.0f})")
+    print(
+        f"make_transaction, timed:  {transfer:8.0f} ns, of which one timed call "
+        f"is {(wrapped - bare) / transfer:.1%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Throughput of the pre-forked server as workers are added.
+
+Starts ``PreforkServer`` with 1, 2, 4, ... workers up to the core count and
+drives ``GET /wallets/{address}`` (API key lookup, wallet read and rate
+conversion) from keep-alive client processes for a fixed time. Load
+generators share the machine with the server, so scaling flattens once
+clients and workers together exceed the cores. Run with
+``python -m bench.prefork [--workers 1,2,4] [--duration S]``.
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from app.core.entities import UserInfo, Wallet
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from app.runner.prefork import PreforkConfig, PreforkServer
+from app.runner.setup import setup
+
+USER = UserInfo(api_key="bench", email="bench")
+WALLET = Wallet(wallet_address="bench-wallet", balance_sat=100_000_000)
+PATH = f"/wallets/{WALLET.wallet_address}?api_key={USER.api_key}"
+
+
+def serve(db_name: str, port: int, workers: int) -> None:
+    app = setup(db_name, rate_provider=StubExchangeRateProvider())
+    config = PreforkConfig(
+        host="127.0.0.1", port=port, workers=workers, log_level="warning"
+    )
+    PreforkServer(app, config).run()
+
+
+def seed(db_name: str) -> None:
+    repository = SQLiteRepository(db_name=db_name)
+    repository.register_user(USER)
+    repository.add_wallet(WALLET, USER)
+    repository.close()
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port: int = probe.getsockname()[1]
+        return port
+
+
+def wait_until_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", PATH)
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit("server did not come up")
+
+
+def client(args: Tuple[int, float]) -> int:
+    port, duration = args
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    done = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        connection.request("GET", PATH)
+        response = connection.getresponse()
+        response.read()
+        assert response.status == 200
+        done += 1
+    connection.close()
+    return done
+
+
+def measure(db_name: str, workers: int, clients: int, duration: float) -> float:
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "bench.prefork",
+            "serve",
+            "--db",
+            db_name,
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ]
+    )
+    try:
+        wait_until_ready(port)
+        with multiprocessing.Pool(clients) as pool:
+            done = sum(pool.map(client, [(port, duration)] * clients))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    return done / duration
+
+
+def worker_counts(cores: int) -> List[int]:
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("mode", nargs="?", choices=("load", "serve"), default="load")
+    parser.add_argument("--workers", default=None)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients-per-worker", type=int, default=2)
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--port", type=int, default=8000)
+    options = parser.parse_args(argv)
+
+    if options.mode == "serve":
+        serve(options.db, options.port, int(options.workers))
+        return
+
+    cores = os.cpu_count() or 1
+    counts = (
+        [int(count) for count in options.workers.split(",")]
+        if options.workers
+        else worker_counts(cores)
+    )
+    print(f"{cores} cores")
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, "bench.db")
+        seed(db_name)
+        baseline = None
+        for workers in counts:
+            clients = workers * options.clients_per_worker
+            throughput = measure(db_name, workers, clients, options.duration)
+            baseline = baseline or throughput
+            speedup = throughput / baseline
+            print(
+                f"{workers:>3} workers, {clients:>3} clients: "
+                f"{throughput:8.0f} req/s  x{speedup:4.2f}  "
+                f"({speedup / workers:4.0%} of linear)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Latency of a user's transaction history on a generated ledger.
+
+Compares the former four-way join with OR against
+``SQLiteRepository.get_user_transactions``, for the full history and for
+single pages. Run with ``python -m bench.user_transactions [--rows N]``;
+pass ``--db PATH`` to keep the generated ledger and reuse it across runs.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.entities import UserInfo
+from app.infrastructure.sqlite.schema import STATISTICS_TRIGGER
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+
+WALLETS_PER_USER = 2
+TRANSACTIONS_PER_USER = 20_000
+BATCH_SIZE = 1_000_000
+PAGE_SIZE = 100
+
+LEGACY_USER_TRANSACTIONS = """SELECT w1.address,
+                                     w2.address,
+                                     t.amount_sat,
+                                     t.fee_bps,
+                                     t.btc_usd_exchange_rate
+                              FROM transactions t
+                              JOIN wallets w1
+                              ON t.wallet_id_from = w1.id
+                              JOIN wallets w2
+                              ON t.wallet_id_to = w2.id
+                              JOIN users_wallets uw1
+                              ON w1.id = uw1.wallet_id
+                              JOIN users_wallets uw2
+                              ON w2.id = uw2.wallet_id
+                              JOIN users u1
+                              ON uw1.user_id = u1.id
+                              JOIN users u2
+                              ON uw2.user_id = u2.id
+                              WHERE u1.api_key = ?
+                              OR u2.api_key = ?;"""
+
+
+def generate(repository: SQLiteRepository, row_count: int) -> None:
+    user_count = max(row_count // TRANSACTIONS_PER_USER, 1)
+    wallet_count = user_count * WALLETS_PER_USER
+
+    with repository.pool.connection() as connection:
+        existing = connection.execute("SELECT COUNT(*) FROM transactions;").fetchone()
+        if existing[0] == row_count:
+            return
+        if existing[0]:
+            raise SystemExit("database holds a ledger of another size")
+
+        print(f"generating {user_count} users, {wallet_count} wallets")
+        connection.execute("BEGIN IMMEDIATE;")
+        connection.execute(
+            """WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c
+                                       WHERE x < ?)
+               INSERT INTO users (email, api_key)
+               SELECT 'user' || x, 'key' || x FROM c;""",
+            (user_count,),
+        )
+        connection.execute(
+            """WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c
+                                       WHERE x < ?)
+               INSERT INTO wallets (address, balance_sat)
+               SELECT 'wallet' || x, 100000000000000 FROM c;""",
+            (wallet_count,),
+        )
+        connection.execute(
+            """INSERT INTO users_wallets (user_id, wallet_id)
+               SELECT (id - 1) / ? + 1, id FROM wallets;""",
+            (WALLETS_PER_USER,),
+        )
+        connection.commit()
+
+        # the running statistics are rebuilt once at the end instead of
+        # being updated for every generated row
+        connection.execute("DROP TRIGGER trg_transactions_statistics;")
+        started = time.perf_counter()
+        for done in range(0, row_count, BATCH_SIZE):
+            connection.execute("BEGIN IMMEDIATE;")
+            connection.execute(
+                """WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c
+                                           WHERE x < :rows)
+                   INSERT INTO transactions (wallet_id_from,
+                                             wallet_id_to,
+                                             amount_sat,
+                                             fee_bps,
+                                             btc_usd_exchange_rate)
+                   SELECT abs(random()) % :wallets + 1,
+                          abs(random()) % :wallets + 1,
+                          100000,
+                          150,
+                          40000
+                   FROM c;""",
+                {"rows": min(BATCH_SIZE, row_count - done), "wallets": wallet_count},
+            )
+            connection.commit()
+            print(
+                f"generated {min(done + BATCH_SIZE, row_count)}/{row_count} rows "
+                f"({time.perf_counter() - started:.1f}s)"
+            )
+        connection.execute(STATISTICS_TRIGGER)
+        connection.commit()
+    repository.reconcile_statistics()
+
+
+def measure(call: Callable[[], int], repeat: int) -> Tuple[float, int]:
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), rows
+
+
+def run(repository: SQLiteRepository, repeat: int) -> Dict[str, Tuple[float, int]]:
+    user = UserInfo(api_key="key1", email="user1")
+    history = repository.get_user_transactions(user)
+    last_page_since = history[-PAGE_SIZE - 1].transaction_id if history else None
+
+    def legacy() -> int:
+        with repository.pool.connection() as connection:
+            rows = connection.execute(
+                LEGACY_USER_TRANSACTIONS, (user.api_key, user.api_key)
+            ).fetchall()
+        return len(rows)
+
+    def page(since: Optional[int]) -> Callable[[], int]:
+        return lambda: len(repository.get_user_transactions(user, since, PAGE_SIZE))
+
+    return {
+        "legacy join, full history": measure(legacy, repeat),
+        "union, full history": measure(
+            lambda: len(repository.get_user_transactions(user)), repeat
+        ),
+        "union, first page": measure(page(None), repeat),
+        "union, last page": measure(page(last_page_since), repeat),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", default=None)
+    options = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = options.db or os.path.join(directory, "ledger.db")
+        repository = SQLiteRepository(db_name=db_name)
+        generate(repository, options.rows)
+        results = run(repository, options.repeat)
+        repository.close()
+
+    for name, (seconds, rows) in results.items():
+        print(f"{name:>26}: {seconds * 1000:10.2f} ms  ({rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
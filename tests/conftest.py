@@ -0,0 +1,28 @@
+import os
+from typing import Generator
+
+import pytest
+from _pytest.fixtures import SubRequest
+
+from app.infrastructure.memory.memory_repository import MemoryRepository
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from app.runner.setup import IRepository
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request: SubRequest) -> Generator[IRepository, None, None]:
+    """Every repository implementation, for tests of the core."""
+    if request.param == "memory":
+        memory = MemoryRepository()
+        yield memory
+        memory.close()
+        return
+
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
+    repository = SQLiteRepository(db_name=TEST_DB_NAME)
+    yield repository
+    repository.close()
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
@@ -1,15 +1,23 @@
-import os
-from typing import Generator
-
 import pytest
 
-from app.core.admin.admin_interactor import StatisticsRequest, StatisticsResponse
+from app.core.admin.admin_interactor import (
+    ProfileRequest,
+    RequestProfileRequest,
+    StatisticsRequest,
+    StatisticsResponse,
+    TimeSeriesRequest,
+)
+from app.core.cache_version import CACHE_NAMES
+from app.core.exchange_rate import StubExchangeRateProvider
 from app.core.facade import BTCWalletService
-from app.core.transaction.transaction_CoR import FEE_PERCENTAGE, MakeTransactionRequest
+from app.core.money import SATOSHIS_PER_BTC, transfer_fee
+from app.core.transaction.transaction_CoR import (
+    FEE_BASIS_POINTS,
+    MakeTransactionRequest,
+)
 from app.core.user.user_interactor import RegisterUserRequest
 from app.core.wallet.wallet_interactor import AddWalletRequest
-from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
-from tests.test_sqlite_repository import TEST_DB_NAME
+from app.runner.setup import IRepository
 
 ADMIN_API_KEY = "Stephane27"
 
@@ -39,7 +47,7 @@ def test_empty_statistics(service: BTCWalletService) -> None:
     assert response.success is True
     assert response.status_code == 200
     assert response.statistics_info is not None
-    assert response.statistics_info.total_btc_profit == 0
+    assert response.statistics_info.total_profit_sat == 0
     assert response.statistics_info.total_transaction_count == 0
 
 
@@ -69,7 +77,7 @@ def test_valid_statistics(service: BTCWalletService) -> None:
             api_key=api_key_1,
             wallet_address_from=wallet_address_1_1,
             wallet_address_to=wallet_address_1_2,
-            btc_amount=0.1,
+            amount_sat=10_000_000,
         )
     )
 
@@ -78,7 +86,7 @@ def test_valid_statistics(service: BTCWalletService) -> None:
     assert response.success is True
     assert response.status_code == 200
     assert response.statistics_info is not None
-    assert response.statistics_info.total_btc_profit == 0
+    assert response.statistics_info.total_profit_sat == 0
     assert response.statistics_info.total_transaction_count == 1
 
     service.make_transaction(
@@ -86,7 +94,7 @@ def test_valid_statistics(service: BTCWalletService) -> None:
             api_key=api_key_1,
             wallet_address_from=wallet_address_1_2,
             wallet_address_to=wallet_address_2_1,
-            btc_amount=1,
+            amount_sat=SATOSHIS_PER_BTC,
         )
     )
 
@@ -95,15 +103,81 @@ def test_valid_statistics(service: BTCWalletService) -> None:
     assert response.success is True
     assert response.status_code == 200
     assert response.statistics_info is not None
-    assert response.statistics_info.total_btc_profit == 1 * FEE_PERCENTAGE
+    assert response.statistics_info.total_profit_sat == transfer_fee(
+        SATOSHIS_PER_BTC, FEE_BASIS_POINTS
+    )
     assert response.statistics_info.total_transaction_count == 2
 
 
+def test_reconcile_statistics(service: BTCWalletService) -> None:
+    response = service.reconcile_statistics(StatisticsRequest(api_key=""))
+    assert response.status_code == 401
+    assert response.statistics_info is None
+
+    response = service.reconcile_statistics(StatisticsRequest(api_key=ADMIN_API_KEY))
+    assert response.status_code == 200
+    assert response.statistics_info is not None
+    assert response.statistics_info.total_transaction_count == 0
+
+
+def test_time_series(service: BTCWalletService) -> None:
+    api_key = service.register_user(RegisterUserRequest("test_email")).api_key
+    assert api_key is not None
+    wallets = [service.add_wallet(AddWalletRequest(api_key)) for _ in range(2)]
+    addresses = [w.wallet_info.wallet_address for w in wallets if w.wallet_info]
+    service.make_transaction(
+        MakeTransactionRequest(api_key, addresses[0], addresses[1], 50_000_000)
+    )
+
+    response = service.get_time_series(TimeSeriesRequest(ADMIN_API_KEY, "minute"))
+    assert response.status_code == 200
+    assert response.buckets is not None
+    assert [b.transfer_count for b in response.buckets] == [1]
+    assert response.buckets[0].volume_sat == 50_000_000
+
+    response = service.get_time_series(
+        TimeSeriesRequest(ADMIN_API_KEY, "day", user_email="unknown")
+    )
+    assert response.buckets == []
+
+
+def test_time_series_invalid_requests(service: BTCWalletService) -> None:
+    assert service.get_time_series(TimeSeriesRequest("")).status_code == 401
+    for request in [
+        TimeSeriesRequest(ADMIN_API_KEY, "week"),
+        TimeSeriesRequest(ADMIN_API_KEY, wallet_address="a", user_email="b"),
+        TimeSeriesRequest(ADMIN_API_KEY, "minute", since=0, until=86400),
+        TimeSeriesRequest(ADMIN_API_KEY, since=7200, until=0),
+    ]:
+        response = service.get_time_series(request)
+        assert response.status_code == 400
+        assert response.buckets is None
+
+
+def test_invalidate_caches(service: BTCWalletService, backend: IRepository) -> None:
+    response = service.invalidate_caches(StatisticsRequest("invalid"))
+    assert response.status_code == 401
+
+    response = service.invalidate_caches(StatisticsRequest(ADMIN_API_KEY))
+    assert response.status_code == 200
+    assert [backend.get_cache_version(name) for name in CACHE_NAMES] == [1, 1]
+
+
 @pytest.fixture
-def service() -> Generator[BTCWalletService, None, None]:
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
-    repository = SQLiteRepository(db_name=TEST_DB_NAME)
-    yield BTCWalletService.create(repository, repository, repository, repository)
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
+def service(backend: IRepository) -> BTCWalletService:
+    return BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+    )
+
+
+def test_profile_invalid_requests(service: BTCWalletService) -> None:
+    # the service of these tests is created without profilers
+    assert service.profile(ProfileRequest("", 1.0)).status_code == 401
+    assert service.profile(ProfileRequest(ADMIN_API_KEY, 1.0)).status_code == 501
+    request = RequestProfileRequest("", "GET /statistics", 1)
+    assert service.profile_requests(request).status_code == 401
+    assert service.get_request_profiles(StatisticsRequest("")).status_code == 401
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.facade import AsyncBTCWalletService, BTCWalletService
+from app.core.transaction.transaction_CoR import MakeTransactionRequest
+from app.core.user.user_interactor import RegisterUserRequest
+from app.core.wallet.wallet_interactor import AddWalletRequest, GetWalletRequest
+from app.runner.setup import IRepository, setup
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+
+def test_should_run_concurrent_calls_on_executor(
+    async_service: AsyncBTCWalletService,
+) -> None:
+    async def scenario() -> None:
+        user = await async_service.register_user(RegisterUserRequest("test"))
+        assert user.api_key is not None
+        wallet_from = await async_service.add_wallet(AddWalletRequest(user.api_key))
+        wallet_to = await async_service.add_wallet(AddWalletRequest(user.api_key))
+        assert wallet_from.wallet_info is not None
+        assert wallet_to.wallet_info is not None
+
+        request = MakeTransactionRequest(
+            user.api_key,
+            wallet_from.wallet_info.wallet_address,
+            wallet_to.wallet_info.wallet_address,
+            12_500_000,
+        )
+        responses = await asyncio.gather(
+            *(async_service.make_transaction(request) for _ in range(16))
+        )
+        assert [r.status_code for r in responses].count(200) == 8
+        assert [r.status_code for r in responses].count(402) == 8
+
+        wallet = await async_service.get_wallet(
+            GetWalletRequest(user.api_key, wallet_from.wallet_info.wallet_address)
+        )
+        assert wallet.wallet_info is not None
+        assert wallet.wallet_info.balance_sat == 0
+
+    asyncio.run(scenario())
+
+
+def test_should_serve_async_routes() -> None:
+    with TestClient(
+        setup(TEST_DB_NAME, rate_provider=StubExchangeRateProvider())
+    ) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        wallet = client.post("/wallets", params={"api_key": api_key}).json()
+        address = wallet["wallet_info"]["wallet_address"]
+        response = client.get(f"/wallets/{address}", params={"api_key": api_key})
+        assert response.json()["status_code"] == 200
+        assert response.json()["wallet_info"]["btc_balance"] == 1
+
+        other = client.post("/wallets", params={"api_key": api_key}).json()
+        for _ in range(3):
+            client.post(
+                "/transactions",
+                params={
+                    "api_key": api_key,
+                    "wallet_address_from": address,
+                    "wallet_address_to": other["wallet_info"]["wallet_address"],
+                    "btc_amount": 0.1,
+                },
+            )
+        response = client.get(
+            f"/wallets/{address}/transactions",
+            params={"api_key": api_key, "since": "1", "stream": "true"},
+        )
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["transaction_id"] for line in lines] == [2, 3]
+
+        response = client.get("/transactions", params={"api_key": "", "stream": "true"})
+        assert response.json()["status_code"] == 401
+    os.remove(TEST_DB_NAME)
+
+
+def test_should_convert_btc_at_api_edge() -> None:
+    with TestClient(
+        setup(TEST_DB_NAME, rate_provider=StubExchangeRateProvider(40000.0))
+    ) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        addresses = [
+            client.post("/wallets", params={"api_key": api_key}).json()["wallet_info"][
+                "wallet_address"
+            ]
+            for _ in range(2)
+        ]
+        transfer = {
+            "api_key": api_key,
+            "wallet_address_from": addresses[0],
+            "wallet_address_to": addresses[1],
+        }
+        responses = client.post(
+            "/transactions/batch",
+            json=[
+                {**transfer, "btc_amount": 0.1},
+                {**transfer, "btc_amount": 0.000000001},
+                {**transfer, "btc_amount": 0.2},
+            ],
+        ).json()
+        assert [r["status_code"] for r in responses] == [200, 400, 200]
+
+        response = client.get("/transactions", params={"api_key": api_key}).json()
+        assert [t["btc_amount"] for t in response["transactions"]] == [0.1, 0.2]
+        assert response["transactions"][0]["fee_pct"] == 0
+
+        wallet = client.get(
+            f"/wallets/{addresses[0]}", params={"api_key": api_key}
+        ).json()["wallet_info"]
+        assert wallet["btc_balance"] == 0.7
+        assert wallet["usd_balance"] == 28000
+    os.remove(TEST_DB_NAME)
+
+
+def test_should_reject_amounts_that_are_not_positive() -> None:
+    with TestClient(
+        setup(TEST_DB_NAME, rate_provider=StubExchangeRateProvider())
+    ) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        addresses = [
+            client.post("/wallets", params={"api_key": api_key}).json()["wallet_info"][
+                "wallet_address"
+            ]
+            for _ in range(2)
+        ]
+        transfer = {
+            "api_key": api_key,
+            "wallet_address_from": addresses[0],
+            "wallet_address_to": addresses[1],
+        }
+        amounts = [float("inf"), 0.0, -0.5]
+        for btc_amount in amounts:
+            response = client.post(
+                "/transactions", params={**transfer, "btc_amount": btc_amount}
+            )
+            assert response.status_code == 200
+            assert response.json()["status_code"] == 400
+        # written by hand: the client will not encode inf, the server reads it
+        responses = client.post(
+            "/transactions/batch",
+            data=json.dumps(
+                [{**transfer, "btc_amount": btc_amount} for btc_amount in amounts]
+            ),
+            headers={"content-type": "application/json"},
+        ).json()
+        assert [r["status_code"] for r in responses] == [400, 400, 400]
+
+        response = client.get("/transactions", params={"api_key": api_key}).json()
+        assert response["transactions"] == []
+        wallet = client.get(
+            f"/wallets/{addresses[0]}", params={"api_key": api_key}
+        ).json()["wallet_info"]
+        assert wallet["btc_balance"] == 1
+    os.remove(TEST_DB_NAME)
+
+
+@pytest.fixture
+def async_service(
+    backend: IRepository,
+) -> Generator[AsyncBTCWalletService, None, None]:
+    service = BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+    )
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield AsyncBTCWalletService(service, executor)
+    executor.shutdown()
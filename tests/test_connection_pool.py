@@ -0,0 +1,184 @@
+import os
+import threading
+from typing import Generator, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.infrastructure.sqlite.checkpoint import CheckpointPolicy, WalCheckpointer
+from app.infrastructure.sqlite.connection_pool import (
+    PoolTimeoutError,
+    SQLiteConnectionPool,
+    SQLitePoolConfig,
+)
+from app.infrastructure.sqlite.profile import LEGACY_PROFILE, SQLiteProfile
+from app.runner.setup import setup
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+
+def test_should_reuse_connection(pool: SQLiteConnectionPool) -> None:
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert pool.size == 1
+
+
+def test_should_share_connection_when_nested(pool: SQLiteConnectionPool) -> None:
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+
+    assert pool.size == 1
+
+
+def test_should_apply_pragmas_once(db_name: str) -> None:
+    pool = SQLiteConnectionPool(
+        db_name, SQLitePoolConfig(pragmas={"cache_size": -4096})
+    )
+    with pool.connection() as connection:
+        assert connection.execute("PRAGMA cache_size;").fetchone()[0] == -4096
+    pool.close()
+
+
+def test_should_apply_profile(db_name: str) -> None:
+    pool = SQLiteConnectionPool(
+        db_name,
+        SQLitePoolConfig(profile=SQLiteProfile(synchronous="FULL", busy_timeout=250)),
+    )
+    with pool.connection() as connection:
+        assert connection.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+        assert connection.execute("PRAGMA synchronous;").fetchone()[0] == 2
+        assert connection.execute("PRAGMA busy_timeout;").fetchone()[0] == 250
+        assert connection.execute("PRAGMA temp_store;").fetchone()[0] == 2
+    pool.close()
+
+
+def test_should_reject_unknown_profile_values() -> None:
+    with pytest.raises(ValueError):
+        SQLiteProfile(journal_mode="fast")
+
+
+def test_should_checkpoint_wal(pool: SQLiteConnectionPool) -> None:
+    with pool.connection() as connection:
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY);")
+        connection.commit()
+
+    checkpointer = WalCheckpointer(pool, CheckpointPolicy(interval=0))
+    checkpointer.start()
+    busy, _, _ = checkpointer.checkpoint("TRUNCATE")
+    checkpointer.stop()
+
+    assert busy == 0
+    assert os.path.getsize(f"{pool.db_name}-wal") == 0
+
+
+def test_should_checkpoint_after_writers_stop(db_name: str) -> None:
+    app = setup(db_name, rate_provider=StubExchangeRateProvider())
+    names = [handler.__qualname__ for handler in app.router.on_shutdown]
+
+    # the last checkpoint runs once nothing writes any more
+    assert names[-4:] == [
+        "TransferWorkers.stop",
+        "ThreadPoolExecutor.shutdown",
+        "WalCheckpointer.stop",
+        "SQLiteRepository.close",
+    ]
+    with TestClient(app):
+        pass
+
+
+def test_should_not_use_wal_with_legacy_profile(db_name: str) -> None:
+    pool = SQLiteConnectionPool(db_name, SQLitePoolConfig(profile=LEGACY_PROFILE))
+    with pool.connection() as connection:
+        assert connection.execute("PRAGMA journal_mode;").fetchone()[0] == "delete"
+    pool.close()
+
+
+def test_should_not_exceed_max_connections(db_name: str) -> None:
+    pool = SQLiteConnectionPool(
+        db_name, SQLitePoolConfig(max_connections=1, acquire_timeout=0.05)
+    )
+    errors: List[Exception] = []
+
+    def checkout() -> None:
+        try:
+            with pool.connection():
+                pass
+        except PoolTimeoutError as e:
+            errors.append(e)
+
+    with pool.connection():
+        thread = threading.Thread(target=checkout)
+        thread.start()
+        thread.join()
+
+    assert pool.size == 1
+    assert len(errors) == 1
+    pool.close()
+
+
+def test_should_rollback_unfinished_transaction(pool: SQLiteConnectionPool) -> None:
+    with pool.connection() as connection:
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY);")
+        connection.commit()
+        connection.execute("INSERT INTO t (id) VALUES (1);")
+
+    with pool.connection() as connection:
+        assert connection.execute("SELECT COUNT(*) FROM t;").fetchone()[0] == 0
+
+
+def test_should_open_connection_per_checkout_when_disabled(db_name: str) -> None:
+    pool = SQLiteConnectionPool(db_name, SQLitePoolConfig(max_connections=0))
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is not second
+    assert pool.size == 0
+
+
+def test_should_not_share_connections_across_fork(
+    pool: SQLiteConnectionPool,
+) -> None:
+    with pool.connection() as connection:
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY);")
+        connection.commit()
+    assert pool.size == 1
+
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            with pool.connection() as child_connection:
+                assert child_connection is not connection
+                child_connection.execute("INSERT INTO t (id) VALUES (1);")
+                child_connection.commit()
+            exit_code = 0
+        finally:
+            os._exit(exit_code)
+
+    assert os.waitpid(pid, 0)[1] == 0
+    assert pool.size == 0
+    with pool.connection() as connection:
+        assert connection.execute("SELECT COUNT(*) FROM t;").fetchone()[0] == 1
+
+
+@pytest.fixture
+def pool(db_name: str) -> Generator[SQLiteConnectionPool, None, None]:
+    pool = SQLiteConnectionPool(db_name)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def db_name() -> Generator[str, None, None]:
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
+    yield TEST_DB_NAME
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
@@ -0,0 +1,46 @@
+import pickle
+import sqlite3
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from app.core.entities import Transaction, UserInfo, Wallet
+from app.infrastructure.sqlite.rows import entity_rows
+
+
+def test_should_store_entities_in_slots() -> None:
+    transaction = Transaction("a", "b", 1, 150, 40000.0)
+
+    assert not hasattr(transaction, "__dict__")
+    assert transaction.transaction_id is None
+    assert transaction == Transaction("a", "b", 1, 150, 40000.0, transaction_id=7)
+    with pytest.raises(AttributeError):
+        setattr(transaction, "note", "")
+
+
+def test_should_freeze_users_only() -> None:
+    user = UserInfo(api_key="key", email="email")
+    with pytest.raises(FrozenInstanceError):
+        setattr(user, "email", "other")
+    assert {user} == {UserInfo(api_key="key", email="other")}
+    assert pickle.loads(pickle.dumps(user)) == user
+
+    wallet = Wallet("a", 1)
+    wallet.balance_sat += 1
+    assert pickle.loads(pickle.dumps(wallet)).balance_sat == 2
+
+
+def test_should_build_entities_from_rows() -> None:
+    connection = sqlite3.connect(":memory:")
+    cursor = connection.cursor()
+    cursor.row_factory = entity_rows(Transaction, shared=(0, 1))
+    rows = cursor.execute("""SELECT 'wallet_a', 'wallet_b', 1, 150, 40000.0, 1
+           UNION ALL
+           SELECT 'wallet_a', 'wallet_a', 2, 0, 40000.0, 2;""").fetchall()
+    connection.close()
+
+    assert rows == [
+        Transaction("wallet_a", "wallet_b", 1, 150, 40000.0),
+        Transaction("wallet_a", "wallet_a", 2, 0, 40000.0),
+    ]
+    assert rows[0].wallet_address_from is rows[1].wallet_address_to
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+import pytest
+import requests
+
+from app.core.cache_version import EXCHANGE_RATE_CACHE, CacheVersionWatcher
+from app.core.exchange_rate import (
+    AsyncCoindeskExchangeRateProvider,
+    AsyncExchangeRateRefresher,
+    CachedExchangeRateProvider,
+)
+
+
+class FakeUpstream:
+    def __init__(self, rate: Optional[float] = 100.0):
+        self.rate = rate
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def get_btc_to_usd_rate(self) -> Optional[float]:
+        self.calls += 1
+        self.gate.wait()
+        return self.rate
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def provider(
+    upstream: FakeUpstream, clock: FakeClock, fetch_timeout: float = 1.0
+) -> CachedExchangeRateProvider:
+    return CachedExchangeRateProvider(
+        upstream,
+        ttl=60,
+        refresh_ahead=10,
+        max_staleness=300,
+        fetch_timeout=fetch_timeout,
+        retry_interval=5,
+        clock=clock,
+    )
+
+
+def test_should_serve_fresh_rate_from_cache() -> None:
+    upstream, clock = FakeUpstream(), FakeClock()
+    cache = provider(upstream, clock)
+
+    assert cache.get_btc_to_usd_rate() == 100.0
+    clock.now += 30
+    assert cache.get_btc_to_usd_rate() == 100.0
+    assert upstream.calls == 1
+
+
+def test_should_refresh_ahead_without_waiting() -> None:
+    upstream, clock = FakeUpstream(), FakeClock()
+    cache = provider(upstream, clock)
+    cache.get_btc_to_usd_rate()
+
+    upstream.rate = 200.0
+    upstream.gate.clear()
+    clock.now += 55
+    assert cache.get_btc_to_usd_rate() == 100.0
+
+    upstream.gate.set()
+    assert cache.refresh() == 200.0
+    assert upstream.calls == 2
+
+
+def test_should_serve_stale_rate_within_bound() -> None:
+    upstream, clock = FakeUpstream(), FakeClock()
+    cache = provider(upstream, clock)
+    cache.get_btc_to_usd_rate()
+
+    upstream.rate = None
+    clock.now += 200
+    assert cache.get_btc_to_usd_rate() == 100.0
+
+    clock.now += 200
+    assert cache.get_btc_to_usd_rate() is None
+
+
+def test_should_share_one_fetch_between_callers() -> None:
+    upstream, clock = FakeUpstream(), FakeClock()
+    upstream.gate.clear()
+    cache = provider(upstream, clock)
+    results: List[Optional[float]] = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_btc_to_usd_rate()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    upstream.gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [100.0] * 8
+    assert upstream.calls == 1
+
+
+def test_should_give_up_after_fetch_timeout() -> None:
+    upstream, clock = FakeUpstream(), FakeClock()
+    upstream.gate.clear()
+    cache = provider(upstream, clock, fetch_timeout=0.05)
+
+    assert cache.get_btc_to_usd_rate() is None
+    upstream.gate.set()
+
+
+def test_should_back_off_after_failure() -> None:
+    upstream, clock = FakeUpstream(rate=None), FakeClock()
+    cache = provider(upstream, clock)
+
+    assert cache.get_btc_to_usd_rate() is None
+    assert cache.get_btc_to_usd_rate() is None
+    assert upstream.calls == 1
+
+    upstream.rate = 100.0
+    clock.now += 5
+    assert cache.get_btc_to_usd_rate() == 100.0
+    assert upstream.calls == 2
+
+
+class FakeAsyncUpstream:
+    def __init__(self, rate: Optional[float] = 100.0):
+        self.rate = rate
+
+    async def get_btc_to_usd_rate(self) -> Optional[float]:
+        return self.rate
+
+
+class FakeVersions:
+    def __init__(self) -> None:
+        self.versions: Dict[str, int] = {}
+
+    def get_cache_version(self, name: str) -> int:
+        return self.versions.get(name, 0)
+
+    def bump_cache_version(self, name: str) -> int:
+        self.versions[name] = self.get_cache_version(name) + 1
+        return self.versions[name]
+
+
+def test_should_discard_rate_when_version_bumped() -> None:
+    upstream, clock, versions = FakeUpstream(), FakeClock(), FakeVersions()
+    cache = provider(upstream, clock)
+    cache.version = CacheVersionWatcher(
+        versions, EXCHANGE_RATE_CACHE, interval=1, clock=clock
+    )
+    assert cache.get_btc_to_usd_rate() == 100.0
+
+    upstream.rate = 200.0
+    cache.version.bump()
+    assert cache.get_btc_to_usd_rate() == 100.0
+    clock.now += 1
+    assert cache.get_btc_to_usd_rate() == 200.0
+    assert upstream.calls == 2
+
+
+def test_should_warm_cache_from_event_loop() -> None:
+    upstream, clock = FakeUpstream(rate=None), FakeClock()
+    cache = provider(upstream, clock)
+    refresher = AsyncExchangeRateRefresher(cache, FakeAsyncUpstream(200.0))
+
+    async def scenario() -> None:
+        await refresher.start()
+        assert cache.get_btc_to_usd_rate() == 200.0
+        await refresher.stop()
+
+    asyncio.run(scenario())
+    assert upstream.calls == 0
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+    def json(self) -> Dict[str, Any]:
+        return {"bpi": {"USD": {"rate_float": 40000.0}}}
+
+
+def test_should_fetch_rate_off_the_event_loop(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls: List[Any] = []
+
+    def get(url: str, timeout: Optional[float] = None) -> FakeResponse:
+        calls.append((timeout, threading.current_thread()))
+        return FakeResponse(200 if len(calls) == 1 else 503)
+
+    monkeypatch.setattr(requests, "get", get)
+    provider = AsyncCoindeskExchangeRateProvider(timeout=1.5)
+
+    async def fetch() -> List[Optional[float]]:
+        return [await provider.get_btc_to_usd_rate() for _ in range(2)]
+
+    assert asyncio.run(fetch()) == [40000.0, None]
+    assert [timeout for timeout, _ in calls] == [1.5, 1.5]
+    assert all(thread is not threading.main_thread() for _, thread in calls)
@@ -0,0 +1,96 @@
+import os
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from app.infrastructure.memory.journal import HEADER, Journal, JournalCorruptError
+
+
+def write(path: str, payloads: List[bytes]) -> None:
+    journal = Journal(path)
+    for payload in payloads:
+        journal.sync(journal.append(payload))
+    journal.close()
+
+
+def test_should_replay_records_in_order(tmp_path: Path) -> None:
+    path = str(tmp_path / "journal")
+    write(path, [b"one", b"", b"three"])
+
+    journal = Journal(path)
+    assert list(journal.replay()) == [b"one", b"", b"three"]
+    assert journal.size == 3 * HEADER.size + 8
+    journal.close()
+
+
+def test_should_cut_off_torn_tail(tmp_path: Path) -> None:
+    path = str(tmp_path / "journal")
+    write(path, [b"one", b"two"])
+    size = os.path.getsize(path)
+    with open(path, "r+b") as file:
+        file.truncate(size - 1)
+
+    journal = Journal(path)
+    assert list(journal.replay()) == [b"one"]
+    journal.sync(journal.append(b"four"))
+    journal.close()
+    assert list(Journal(path).replay()) == [b"one", b"four"]
+
+
+def test_should_refuse_damaged_record_before_the_end(tmp_path: Path) -> None:
+    path = str(tmp_path / "journal")
+    write(path, [b"one", b"two"])
+    with open(path, "r+b") as file:
+        file.seek(HEADER.size)
+        file.write(b"x")
+
+    with pytest.raises(JournalCorruptError):
+        list(Journal(path).replay())
+
+
+def test_should_rotate_into_an_empty_file(tmp_path: Path) -> None:
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    list(journal.replay())
+    ticket = journal.append(b"one")
+    journal.rotate(f"{path}.1")
+    # synced by the rotation
+    journal.sync(ticket)
+    assert journal.size == 0
+    journal.sync(journal.append(b"two"))
+    journal.close()
+
+    assert list(Journal(f"{path}.1").replay()) == [b"one"]
+    assert list(Journal(path).replay()) == [b"two"]
+
+
+def test_should_share_fsyncs_between_writers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    fsyncs = []
+    fsync = os.fsync
+
+    def slow_fsync(fd: int) -> None:
+        fsyncs.append(fd)
+        threading.Event().wait(0.01)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    journal = Journal(str(tmp_path / "journal"))
+    list(journal.replay())
+
+    def writer() -> None:
+        for _ in range(20):
+            journal.sync(journal.append(b"record"))
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    assert len(list(Journal(journal.path).replay())) == 160
+    assert len(fsyncs) < 160
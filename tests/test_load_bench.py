@@ -0,0 +1,42 @@
+import pytest
+
+from bench.load import (
+    DEFAULT_MIX,
+    OPERATIONS,
+    LoadConfig,
+    parse_mix,
+    percentile,
+    run,
+)
+
+
+def test_should_report_every_endpoint() -> None:
+    # queued transfers are left out of the default mix
+    config = LoadConfig(
+        users=20,
+        transactions=200,
+        requests=400,
+        warmup=20,
+        concurrency=4,
+        mix=parse_mix(f"{DEFAULT_MIX},submit=10"),
+    )
+
+    report = run(config)
+
+    assert report["total"]["requests"] == 400
+    assert report["total"]["errors"] == 0
+    assert set(report["endpoints"]) == set(OPERATIONS)
+    for endpoint in report["endpoints"].values():
+        assert 0 < endpoint["p50_ms"] <= endpoint["p95_ms"] <= endpoint["p99_ms"]
+
+
+def test_should_take_nearest_rank() -> None:
+    samples = [float(i) for i in range(1, 101)]
+    assert [percentile(samples, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([7.0], 99) == 7.0
+
+
+def test_should_parse_mix() -> None:
+    assert parse_mix("get_wallet=3,transfer") == {"get_wallet": 3, "transfer": 1}
+    with pytest.raises(ValueError):
+        parse_mix("teleport=1")
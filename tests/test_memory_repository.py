@@ -0,0 +1,325 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.entities import (
+    JOB_DONE,
+    JOB_QUEUED,
+    IdempotencyRecord,
+    Transaction,
+    TransferJob,
+    UserInfo,
+    Wallet,
+)
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.infrastructure.memory.journal import HEADER
+from app.infrastructure.memory.memory_repository import (
+    MemoryRepository,
+    RepositoryLockedError,
+)
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from app.runner.setup import IRepository, setup
+from tests.test_exchange_rate import FakeClock
+
+USERS = [UserInfo("key1", "user1"), UserInfo("key2", "user2")]
+
+
+def populate(repository: IRepository) -> None:
+    for user in USERS:
+        repository.register_user(user)
+    for i, address in enumerate("abcd"):
+        repository.add_wallet(Wallet(f"wallet_{address}", 1000), USERS[i // 2])
+    pairs = ["ab", "ac", "ba", "cd", "dc", "da", "aa", "bd"]
+    # the last transfer overdraws its wallet and is refused
+    repository.execute_transfers(
+        [
+            Transaction(f"wallet_{pair[0]}", f"wallet_{pair[1]}", 100 + i, 150, 4e4)
+            for i, pair in enumerate(pairs * 3)
+        ]
+        + [Transaction("wallet_a", "wallet_b", 10_000, 150, 4e4)]
+    )
+
+
+def balances(wallets: List[Optional[Wallet]]) -> List[Optional[Tuple[str, int]]]:
+    # wallets compare by address alone
+    return [(w.wallet_address, w.balance_sat) if w else None for w in wallets]
+
+
+def observe(repository: IRepository) -> List[Any]:
+    return [
+        repository.fetch_all_transactions(),
+        repository.get_statistics(),
+        balances([repository.get_wallet(f"wallet_{address}") for address in "abcdz"]),
+        [balances(list(repository.get_user_wallets(user))) for user in USERS],
+        [
+            repository.get_user_transactions(user, since, limit)
+            for user in USERS
+            for since in (None, 0, 5, 23)
+            for limit in (None, 0, 1, 4, -1)
+        ],
+        [
+            repository.get_wallet_transactions(f"wallet_{address}", since, limit)
+            for address in "adz"
+            for since in (None, 3)
+            for limit in (None, 2)
+        ],
+        [
+            repository.get_statistics_buckets(
+                granularity, 0, 2**40, wallet_address, user_email
+            )
+            for granularity in ("minute", "day", "week")
+            for wallet_address, user_email in (
+                (None, None),
+                ("wallet_a", None),
+                (None, "user2"),
+                (None, "nobody"),
+            )
+        ],
+        repository.get_wallet_user(Wallet("wallet_c", 0)),
+        repository.get_user_by_email("user2"),
+    ]
+
+
+def crashed(path: str) -> MemoryRepository:
+    """Opens a copy of the files at ``path``, as a process that took over from
+    one that crashed would find them; the original stays open and locked."""
+    copy = os.path.join(tempfile.mkdtemp(dir=os.path.dirname(path)), "bw")
+    for suffix in (".log", ".log.1", ".snapshot"):
+        if os.path.exists(f"{path}{suffix}"):
+            shutil.copy(f"{path}{suffix}", f"{copy}{suffix}")
+    return MemoryRepository(path=copy)
+
+
+def test_should_match_sqlite(tmp_path: Path) -> None:
+    sqlite = SQLiteRepository(db_name=str(tmp_path / "bw.db"))
+    memory = MemoryRepository()
+    populate(sqlite)
+    populate(memory)
+
+    assert observe(memory) == observe(sqlite)
+    assert [t.transaction_id for t in memory.fetch_all_transactions()] == [
+        t.transaction_id for t in sqlite.fetch_all_transactions()
+    ]
+    sqlite.close()
+
+
+def test_should_hand_out_copies() -> None:
+    repository = MemoryRepository()
+    populate(repository)
+
+    wallet = repository.get_wallet("wallet_a")
+    assert wallet is not None
+    wallet.balance_sat = 0
+    assert balances([repository.get_wallet("wallet_a")]) == [("wallet_a", 1009)]
+
+
+def test_should_restore_from_log_and_snapshot(tmp_path: Path) -> None:
+    path = str(tmp_path / "bw")
+    repository = MemoryRepository(path=path)
+    populate(repository)
+    repository.bump_cache_version("principals")
+    expected = observe(repository)
+
+    # reopened without close(), as after a crash: the log alone
+    assert observe(crashed(path)) == expected
+
+    repository.close()
+    assert os.path.getsize(f"{path}.log") == 0
+    reopened = MemoryRepository(path=path)
+    assert observe(reopened) == expected
+    assert reopened.get_cache_version("principals") == 1
+    reopened.close()
+
+
+def test_should_restore_keys_and_jobs(tmp_path: Path) -> None:
+    path = str(tmp_path / "bw")
+    repository = MemoryRepository(path=path)
+    populate(repository)
+    key = IdempotencyRecord("key1", "k", "wallet_a", "wallet_b", 10)
+    transfer = Transaction("wallet_a", "wallet_b", 10, 0, 4e4)
+    assert repository.execute_transfers([transfer, transfer], [key, key]) == [
+        True,
+        False,
+    ]
+    for amount_sat in (1, 2):
+        repository.enqueue_transfer(
+            TransferJob("key1", "wallet_a", "wallet_b", amount_sat)
+        )
+    done = repository.claim_transfer_jobs(1, 30.0)[0]
+    repository.finish_transfer_jobs(
+        [replace(done, status=JOB_DONE, success=True, message="OK", status_code=200)]
+    )
+    # claimed by a worker that never finished it
+    assert len(repository.claim_transfer_jobs(1, 30.0)) == 1
+
+    def check(reopened: MemoryRepository) -> None:
+        record = reopened.get_idempotency_record("key1", "k")
+        assert record == key
+        assert record is not None and record.transaction_id is not None
+        job = reopened.get_transfer_job(1)
+        assert job is not None and (job.status, job.status_code) == (JOB_DONE, 200)
+        # claims are not kept; the unfinished job is queued again
+        job = reopened.get_transfer_job(2)
+        assert job is not None and job.status == JOB_QUEUED
+        assert [j.job_id for j in reopened.claim_transfer_jobs(10, 30.0)] == [2]
+
+    check(crashed(path))
+    repository.close()
+    reopened = MemoryRepository(path=path)
+    check(reopened)
+    reopened.close()
+
+
+def test_should_not_replay_records_taken_into_snapshot(tmp_path: Path) -> None:
+    path = str(tmp_path / "bw")
+    repository = MemoryRepository(path=path)
+    populate(repository)
+    shutil.copy(f"{path}.log", tmp_path / "before_snapshot.log")
+    repository.snapshot()
+    expected = observe(repository)
+    repository.close()
+
+    # a crash between writing the snapshot and emptying the log
+    shutil.copy(tmp_path / "before_snapshot.log", f"{path}.log")
+    assert observe(MemoryRepository(path=path)) == expected
+
+
+def test_should_drop_torn_last_record(tmp_path: Path) -> None:
+    path = str(tmp_path / "bw")
+    repository = MemoryRepository(path=path)
+    populate(repository)
+    expected = observe(repository)
+    payload = b'[99,"balance","wallet_a",0]'
+    with open(f"{path}.log", "ab") as log:
+        log.write(HEADER.pack(len(payload), zlib.crc32(payload)) + payload[:-3])
+
+    reopened = crashed(path)
+    assert observe(reopened) == expected
+    reopened.update_wallet_balance("wallet_a", 1)
+    assert reopened.path is not None
+    assert balances([crashed(reopened.path).get_wallet("wallet_a")]) == [
+        ("wallet_a", 1)
+    ]
+
+
+def test_should_compact_past_threshold(tmp_path: Path) -> None:
+    path = str(tmp_path / "bw")
+    repository = MemoryRepository(path=path, compact_bytes=1024)
+    populate(repository)
+    for balance in range(100):
+        repository.update_wallet_balance("wallet_a", balance)
+        assert os.path.getsize(f"{path}.log") < 1024
+    expected = observe(repository)
+
+    repository.wait_for_snapshot()
+    assert os.path.exists(f"{path}.snapshot")
+    assert not os.path.exists(f"{path}.log.1")
+    assert observe(crashed(path)) == expected
+
+
+def test_should_write_snapshots_in_the_background(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    released = threading.Event()
+    dump = json.dump
+
+    def stalled_dump(state: Any, file: Any, **kwargs: Any) -> None:
+        released.wait(10)
+        dump(state, file, **kwargs)
+
+    monkeypatch.setattr(json, "dump", stalled_dump)
+    path = str(tmp_path / "bw")
+    repository = MemoryRepository(path=path, compact_bytes=1024)
+    populate(repository)
+    # the snapshot is stalled, yet writes go on and the journal starts afresh
+    for balance in range(100):
+        repository.update_wallet_balance("wallet_a", balance)
+    assert os.path.exists(f"{path}.log.1")
+    assert not os.path.exists(f"{path}.snapshot")
+    expected = observe(repository)
+
+    # a crash before the snapshot is written: both journals are replayed
+    crashed = tmp_path / "crashed"
+    crashed.mkdir()
+    for suffix in (".log", ".log.1"):
+        shutil.copy(f"{path}{suffix}", crashed / f"bw{suffix}")
+    released.set()
+    recovered = MemoryRepository(path=str(crashed / "bw"))
+    assert observe(recovered) == expected
+    assert not os.path.exists(crashed / "bw.log.1")
+    recovered.close()
+
+    repository.wait_for_snapshot()
+    assert not os.path.exists(f"{path}.log.1")
+    repository.close()
+    assert observe(MemoryRepository(path=path)) == expected
+
+
+def test_should_refuse_a_second_writer(tmp_path: Path) -> None:
+    path = str(tmp_path / "bw")
+    repository = MemoryRepository(path=path)
+    populate(repository)
+
+    pid = os.fork()
+    if pid == 0:
+        # a second process opening the same files, as a respawned worker would
+        try:
+            MemoryRepository(path=path)
+            os._exit(1)
+        except RepositoryLockedError:
+            os._exit(0)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+    repository.close()
+    reopened = MemoryRepository(path=path)
+    assert reopened.get_wallet("wallet_a") is not None
+    reopened.close()
+
+
+def test_should_bucket_by_clock() -> None:
+    clock = FakeClock()
+    clock.now = 7200.0
+    repository = MemoryRepository(clock=clock)
+    populate(repository)
+    clock.now += 3600
+    repository.execute_transfer(Transaction("wallet_a", "wallet_b", 100, 150, 1.0))
+
+    buckets = repository.get_statistics_buckets("hour", 0, 2**40)
+    assert [(b.bucket_start, b.transfer_count) for b in buckets] == [
+        (7200, 24),
+        (10800, 1),
+    ]
+    assert repository.get_statistics_buckets("hour", 7201, 10800) == buckets[1:]
+
+
+def test_should_serve_api_from_memory(tmp_path: Path) -> None:
+    path = str(tmp_path / "bw")
+
+    def app() -> FastAPI:
+        return setup(
+            repository=MemoryRepository(path=path),
+            rate_provider=StubExchangeRateProvider(),
+        )
+
+    with TestClient(app()) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        address = client.post("/wallets", params={"api_key": api_key}).json()[
+            "wallet_info"
+        ]["wallet_address"]
+
+    with TestClient(app()) as client:
+        response = client.get(f"/wallets/{address}", params={"api_key": api_key})
+        assert response.json()["wallet_info"]["btc_balance"] == 1.0
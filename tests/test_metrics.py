@@ -0,0 +1,198 @@
+import time
+from typing import Dict, Optional
+
+from fastapi.testclient import TestClient
+
+from app.core.entities import UserInfo
+from app.core.exchange_rate import StubExchangeRateProvider, TimedExchangeRateProvider
+from app.core.facade import BTCWalletService
+from app.core.metrics import (
+    CONTENT_TYPE,
+    HANDLER_SECONDS,
+    RATE_FETCH_SECONDS,
+    REPOSITORY_SECONDS,
+    MetricsRegistry,
+    TimedRepository,
+)
+from app.core.principal_cache import PrincipalCache
+from app.core.transaction.transaction_CoR import MakeTransactionRequest
+from app.core.user.user_interactor import RegisterUserRequest
+from app.core.wallet.wallet_interactor import AddWalletRequest
+from app.infrastructure.memory.memory_repository import MemoryRepository
+from app.runner.setup import setup
+
+
+class SlowRateProvider:
+    def get_btc_to_usd_rate(self) -> Optional[float]:
+        time.sleep(0.05)
+        return 40000.0
+
+
+def seconds(*labels: str) -> float:
+    return HANDLER_SECONDS.labels(*labels).snapshot()[1]
+
+
+def test_should_render_prometheus_histogram() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Help.", ("path",), (0.1, 1.0))
+    series = histogram.labels('a"b')
+    for value in (0.05, 0.1, 0.5, 3.0):
+        series.observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Help.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{path="a\\"b",le="0.1"} 2',
+        'latency_seconds_bucket{path="a\\"b",le="1.0"} 3',
+        'latency_seconds_bucket{path="a\\"b",le="+Inf"} 4',
+        'latency_seconds_sum{path="a\\"b"} 3.65',
+        'latency_seconds_count{path="a\\"b"} 4',
+    ]
+
+
+def test_should_render_prometheus_counter() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("lookups_total", "Help.", ("result",))
+    counter.labels("hit").inc(2)
+    counter.labels("miss").inc()
+
+    assert registry.render().splitlines() == [
+        "# HELP lookups_total Help.",
+        "# TYPE lookups_total counter",
+        'lookups_total{result="hit"} 2.0',
+        'lookups_total{result="miss"} 1.0',
+    ]
+
+
+def test_should_time_handlers_without_the_ones_after_them() -> None:
+    repository = MemoryRepository()
+    service = BTCWalletService.create(
+        repository, repository, repository, repository, SlowRateProvider()
+    )
+    api_key = service.register_user(RegisterUserRequest("test")).api_key
+    assert api_key is not None
+    addresses = []
+    for _ in range(2):
+        wallet_info = service.add_wallet(AddWalletRequest(api_key)).wallet_info
+        assert wallet_info is not None
+        addresses.append(wallet_info.wallet_address)
+    before: Dict[str, float] = {
+        name: seconds("transaction", name)
+        for name in ("WalletCheckHandler", "ExchangeRateHandler")
+    }
+
+    response = service.make_transaction(
+        MakeTransactionRequest(api_key, addresses[0], addresses[1], 1000)
+    )
+
+    assert response.success is True
+    rate = seconds("transaction", "ExchangeRateHandler") - before["ExchangeRateHandler"]
+    first = seconds("transaction", "WalletCheckHandler") - before["WalletCheckHandler"]
+    assert rate >= 0.05
+    assert first < 0.05
+
+
+def test_should_time_repository_methods() -> None:
+    repository = TimedRepository(MemoryRepository())
+    before = sum(REPOSITORY_SECONDS.labels("get_wallet").snapshot()[0])
+
+    assert repository.get_wallet("nowhere") is None
+    assert repository.get_wallet("nowhere") is None
+
+    assert sum(REPOSITORY_SECONDS.labels("get_wallet").snapshot()[0]) == before + 2
+
+
+def test_should_time_rate_fetches() -> None:
+    provider = TimedExchangeRateProvider(StubExchangeRateProvider(), "stub")
+
+    assert provider.get_btc_to_usd_rate() == 40000.0
+    assert sum(RATE_FETCH_SECONDS.labels("stub").snapshot()[0]) >= 1
+
+
+def test_should_serve_metrics() -> None:
+    app = setup(repository=MemoryRepository(), rate_provider=StubExchangeRateProvider())
+    with TestClient(app) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        client.post("/wallets", params={"api_key": api_key})
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    lines = response.text.splitlines()
+    assert "# TYPE bw_handler_seconds histogram" in lines
+    assert any(
+        line.startswith(
+            'bw_handler_seconds_count{chain="wallet",handler="AddWalletHandler"}'
+        )
+        for line in lines
+    )
+    assert any(
+        line.startswith('bw_repository_seconds_count{method="register_user"}')
+        for line in lines
+    )
+
+
+def scraped(client: TestClient, series: str) -> float:
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.split()[-1])
+    return 0.0
+
+
+def test_should_count_unit_of_work_lookups() -> None:
+    app = setup(repository=MemoryRepository(), rate_provider=StubExchangeRateProvider())
+    with TestClient(app) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        addresses = [
+            client.post("/wallets", params={"api_key": api_key}).json()["wallet_info"][
+                "wallet_address"
+            ]
+            for _ in range(2)
+        ]
+        names = [
+            'bw_unit_of_work_lookups_total{interactor="transaction",result="hit"}',
+            'bw_unit_of_work_lookups_total{interactor="transaction",result="miss"}',
+            'bw_unit_of_work_flushed_total{interactor="transaction"}',
+        ]
+        before = [scraped(client, name) for name in names]
+        response = client.post(
+            "/transactions",
+            params={
+                "api_key": api_key,
+                "wallet_address_from": addresses[0],
+                "wallet_address_to": addresses[1],
+                "btc_amount": 0.1,
+            },
+        )
+        assert response.json()["status_code"] == 200
+        after = [scraped(client, name) for name in names]
+
+    hits, misses, flushed = [b - a for a, b in zip(before, after)]
+    assert hits > 0
+    assert misses > 0
+    # the transfer itself
+    assert flushed >= 1
+
+
+def test_should_count_principal_cache_lookups() -> None:
+    app = setup(repository=MemoryRepository(), rate_provider=StubExchangeRateProvider())
+    names = [
+        'bw_principal_cache_lookups_total{result="hit"}',
+        'bw_principal_cache_lookups_total{result="miss"}',
+        "bw_principal_cache_evictions_total",
+    ]
+    with TestClient(app) as client:
+        before = [scraped(client, name) for name in names]
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        for _ in range(2):
+            client.post("/wallets", params={"api_key": api_key})
+        # a cache holding a single user drops the first for the second
+        cache = PrincipalCache(max_size=1)
+        for key in ("a", "b"):
+            cache.get(key, lambda key: UserInfo(key, "test"))
+        after = [scraped(client, name) for name in names]
+
+    hits, misses, evictions = [b - a for a, b in zip(before, after)]
+    assert hits > 0
+    assert misses >= 2
+    assert evictions == 1
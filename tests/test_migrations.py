@@ -0,0 +1,197 @@
+import os
+from sqlite3 import Connection
+from typing import Callable, Generator, List
+
+import pytest
+
+from app.core.admin.admin_repository import BUCKET_WIDTHS
+from app.infrastructure.sqlite.connection_pool import SQLiteConnectionPool
+from app.infrastructure.sqlite.migrations import (
+    BatchedSQL,
+    ExecuteSQL,
+    Migration,
+    MigrationError,
+    MigrationProgress,
+    MigrationStep,
+    Migrator,
+    RebuildTable,
+)
+from app.infrastructure.sqlite.schema import MIGRATIONS, ROLLUP_WIDTHS
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+ITEMS = Migration(
+    version=1,
+    description="Items",
+    steps=(
+        ExecuteSQL(
+            "Create items",
+            """CREATE TABLE items (id INTEGER PRIMARY KEY, value INTEGER NOT NULL);
+               WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n
+                                       WHERE i < 25)
+               INSERT INTO items (value) SELECT i FROM n;""",
+        ),
+    ),
+)
+
+
+def test_should_apply_all_migrations(pool: SQLiteConnectionPool) -> None:
+    migrator = Migrator(pool, MIGRATIONS)
+    reports = migrator.migrate()
+
+    assert [r.version for r in reports] == [m.version for m in MIGRATIONS]
+    assert migrator.current_version() == MIGRATIONS[-1].version
+    assert migrator.pending() == []
+    assert migrator.migrate() == []
+
+
+def test_should_keep_a_rollup_per_bucket_width() -> None:
+    # a change to the widths needs a migration that rebuilds the rollups
+    assert BUCKET_WIDTHS == ROLLUP_WIDTHS
+
+
+def test_should_stop_at_target_version(pool: SQLiteConnectionPool) -> None:
+    migrator = Migrator(pool, MIGRATIONS)
+    migrator.migrate(target=1)
+
+    assert migrator.current_version() == 1
+    assert [m.version for m in migrator.pending()] == [
+        m.version for m in MIGRATIONS[1:]
+    ]
+
+
+def test_should_run_batches_and_report_progress(pool: SQLiteConnectionPool) -> None:
+    progress: List[MigrationProgress] = []
+    double = Migration(
+        version=2,
+        description="Double values",
+        steps=(
+            BatchedSQL(
+                "Double values",
+                "items",
+                "UPDATE items SET value = value * 2 WHERE id > :lo AND id <= :hi;",
+                batch_size=10,
+            ),
+        ),
+    )
+    Migrator(pool, (ITEMS, double), on_progress=progress.append).migrate()
+
+    batches = [p for p in progress if p.version == 2]
+    assert [(p.rows_done, p.rows_total) for p in batches] == [
+        (10, 25),
+        (20, 25),
+        (25, 25),
+    ]
+    with pool.connection() as connection:
+        total = connection.execute("SELECT SUM(value) FROM items;").fetchone()[0]
+    assert total == 2 * sum(range(1, 26))
+
+
+def test_should_rebuild_table(pool: SQLiteConnectionPool) -> None:
+    rebuild = Migration(
+        version=2,
+        description="Add label",
+        steps=(
+            RebuildTable(
+                "Add label",
+                "items",
+                """CREATE TABLE {table} (id INTEGER PRIMARY KEY,
+                                         value INTEGER NOT NULL,
+                                         label TEXT NOT NULL);""",
+                columns="id, value, label",
+                select="id, value, 'item ' || value",
+                batch_size=7,
+            ),
+        ),
+    )
+    Migrator(pool, (ITEMS, rebuild)).migrate()
+
+    with pool.connection() as connection:
+        rows = connection.execute("SELECT id, value, label FROM items;").fetchall()
+        tables = connection.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'items%';"
+        ).fetchall()
+    assert len(rows) == 25
+    assert rows[-1] == (25, 25, "item 25")
+    assert tables == [("items",)]
+
+
+def test_should_record_failed_migration_as_pending(pool: SQLiteConnectionPool) -> None:
+    broken = Migration(2, "Broken", (ExecuteSQL("Broken", "SELECT * FROM nowhere;"),))
+    migrator = Migrator(pool, (ITEMS, broken))
+
+    with pytest.raises(Exception):
+        migrator.migrate()
+    assert migrator.current_version() == 1
+
+
+class FailOnce(MigrationStep):
+    description = "Fail once"
+
+    def __init__(self) -> None:
+        self.runs = 0
+
+    def apply(
+        self,
+        connection: Connection,
+        report: Callable[[int, int], None],
+        finish: str,
+    ) -> None:
+        self.runs += 1
+        if self.runs == 1:
+            raise RuntimeError("Interrupted")
+        connection.execute(finish)
+        connection.commit()
+
+
+def test_should_resume_after_completed_steps(pool: SQLiteConnectionPool) -> None:
+    fail_once = FailOnce()
+    label = RebuildTable(
+        "Add label",
+        "items",
+        """CREATE TABLE {table} (id INTEGER PRIMARY KEY,
+                                 value INTEGER NOT NULL,
+                                 label TEXT NOT NULL);""",
+        columns="id, value, label",
+        select="id, value, 'item ' || value",
+    )
+    # the table cannot be created twice, so the first step must not run again
+    partial = Migration(
+        2,
+        "Partial",
+        (
+            ExecuteSQL("Create other", "CREATE TABLE other (id INTEGER);"),
+            label,
+            fail_once,
+        ),
+    )
+    migrator = Migrator(pool, (ITEMS, partial))
+
+    with pytest.raises(RuntimeError):
+        migrator.migrate()
+    assert migrator.current_version() == 1
+
+    assert [r.version for r in migrator.migrate()] == [2]
+    assert fail_once.runs == 2
+    assert migrator.current_version() == 2
+    with pool.connection() as connection:
+        steps = connection.execute("SELECT * FROM schema_migration_steps;").fetchall()
+        labels = connection.execute("SELECT COUNT(label) FROM items;").fetchone()
+    assert steps == []
+    assert labels == (25,)
+
+
+def test_should_reject_unordered_migrations(pool: SQLiteConnectionPool) -> None:
+    with pytest.raises(MigrationError):
+        Migrator(pool, (Migration(2, "Second"), Migration(1, "First")))
+
+
+@pytest.fixture
+def pool() -> Generator[SQLiteConnectionPool, None, None]:
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
+
+    pool = SQLiteConnectionPool(TEST_DB_NAME)
+    yield pool
+    pool.close()
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
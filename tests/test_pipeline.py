@@ -0,0 +1,167 @@
+from dataclasses import replace
+from typing import List
+
+import pytest
+
+from app.core.entities import Response
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.facade import BTCWalletService
+from app.core.pipeline import Handler, Next, Pipeline
+from app.core.transaction.transaction_CoR import (
+    MakeTransactionArgs,
+    MakeTransactionHandler,
+    MakeTransactionRequest,
+    TransactionHandler,
+    WalletCheckHandler,
+    default_transaction_pipelines,
+)
+from app.core.user.user_interactor import RegisterUserRequest
+from app.core.wallet.wallet_interactor import AddWalletRequest
+from app.runner.setup import IRepository
+
+
+class Append(Handler[List[str]]):
+    def __init__(self, name: str):
+        self.name = name
+
+    def handle(self, args: List[str], next_handler: Next[List[str]]) -> Response:
+        args.append(self.name)
+        return next_handler(args)
+
+
+class Refuse(Handler[List[str]]):
+    def handle(self, args: List[str], next_handler: Next[List[str]]) -> Response:
+        return Response(success=False, message="Refused", status_code=403)
+
+
+class RateLimitHandler(TransactionHandler):
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.seen = 0
+
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
+        self.seen += 1
+        if self.seen > self.limit:
+            return Response(success=False, message="Slow down", status_code=429)
+        return next_handler(args)
+
+
+class DryRunHandler(TransactionHandler):
+    """Answers for transfers of a single satoshi without making them."""
+
+    def handle(
+        self, args: MakeTransactionArgs, next_handler: Next[MakeTransactionArgs]
+    ) -> Response:
+        if args.request.amount_sat == 1:
+            return Response(success=True, message="Dry run", status_code=200)
+        return next_handler(args)
+
+
+def test_should_run_stages_in_order_and_stop_at_a_refusal() -> None:
+    pipeline = Pipeline([Append("a"), Append("b")], "Done")
+    calls: List[str] = []
+
+    response = pipeline(calls)
+    assert response.success is True
+    assert response.message == "Done"
+    assert calls == ["a", "b"]
+
+    refusing = pipeline.inserted(Refuse(), after=Append)
+    calls = []
+    assert refusing(calls).status_code == 403
+    assert calls == ["a"]
+    # the original is left as it was
+    assert pipeline.names() == ["Append", "Append"]
+
+
+def test_should_insert_and_remove_stages() -> None:
+    pipeline = Pipeline([Append("a")])
+
+    assert pipeline.inserted(Refuse(), before=Append).names() == ["Refuse", "Append"]
+    assert pipeline.inserted(Refuse()).names() == ["Append", "Refuse"]
+    assert pipeline.removed(Append).names() == []
+    with pytest.raises(ValueError):
+        pipeline.removed(Refuse)
+    with pytest.raises(ValueError):
+        pipeline.inserted(Refuse(), before=Append, after=Append)
+
+
+def test_should_run_configured_stages(backend: IRepository) -> None:
+    pipelines = default_transaction_pipelines()
+    rate_limit = RateLimitHandler(limit=1)
+    pipelines = replace(
+        pipelines,
+        transfer=pipelines.transfer.inserted(rate_limit, before=WalletCheckHandler),
+    )
+    service = BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+        transaction_pipelines=pipelines,
+    )
+    api_key = service.register_user(RegisterUserRequest("test")).api_key
+    assert api_key is not None
+    addresses = []
+    for _ in range(2):
+        wallet_info = service.add_wallet(AddWalletRequest(api_key)).wallet_info
+        assert wallet_info is not None
+        addresses.append(wallet_info.wallet_address)
+    request = MakeTransactionRequest(api_key, addresses[0], addresses[1], 1000)
+
+    assert service.make_transaction(request).success is True
+    response = service.make_transaction(request)
+    assert response.success is False
+    assert response.status_code == 429
+    assert rate_limit.seen == 2
+
+
+def test_should_answer_for_stages_that_transfer_nothing(backend: IRepository) -> None:
+    pipelines = default_transaction_pipelines()
+    pipelines = replace(
+        pipelines,
+        transfer=pipelines.transfer.inserted(
+            DryRunHandler(), before=MakeTransactionHandler
+        ),
+        batch_transfer=pipelines.batch_transfer.inserted(
+            DryRunHandler(), before=MakeTransactionHandler
+        ),
+    )
+    service = BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+        transaction_pipelines=pipelines,
+    )
+    api_key = service.register_user(RegisterUserRequest("test")).api_key
+    assert api_key is not None
+    addresses = []
+    for _ in range(2):
+        wallet_info = service.add_wallet(AddWalletRequest(api_key)).wallet_info
+        assert wallet_info is not None
+        addresses.append(wallet_info.wallet_address)
+
+    dry_run = MakeTransactionRequest(
+        api_key, addresses[0], addresses[1], 1, idempotency_key="k"
+    )
+    assert service.make_transaction(dry_run).message == "Dry run"
+    responses = service.make_transactions(
+        [
+            dry_run,
+            MakeTransactionRequest(api_key, addresses[0], addresses[1], 1000),
+            dry_run,
+        ]
+    )
+    assert [r.message for r in responses] == [
+        "Dry run",
+        "Transaction successful",
+        "Dry run",
+    ]
+    response = service.get_transactions(api_key)
+    assert response.transactions is not None
+    assert [t.amount_sat for t in response.transactions] == [1000]
@@ -0,0 +1,113 @@
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Generator, List
+
+import pytest
+
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+
+def test_should_serve_from_workers_and_stop_gracefully(
+    server: subprocess.Popen,  # type: ignore[type-arg]
+    port: int,
+) -> None:
+    api_keys = set()
+    for i in range(4):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        connection.request("POST", f"/users?email=user{i}")
+        body = json.loads(connection.getresponse().read())
+        assert body["status_code"] == 201
+        api_keys.add(body["api_key"])
+        connection.close()
+    assert len(api_keys) == 4
+
+    server.send_signal(signal.SIGTERM)
+    assert server.wait(timeout=30) == 0
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/task"), reason="finds the worker through /proc"
+)
+def test_should_not_replace_memory_worker(port: int) -> None:
+    server = start(port, ["--workers", "1", "--backend", "memory"])
+    try:
+        (worker,) = workers(server)
+        # past the boot time, so this is a crash rather than a failed boot
+        time.sleep(1.0)
+        os.kill(worker, signal.SIGKILL)
+        assert server.wait(timeout=30) != 0
+    finally:
+        stop(server)
+
+
+def workers(server: subprocess.Popen) -> List[int]:  # type: ignore[type-arg]
+    # the supervisor listens before it forks, so they may not be there yet
+    deadline = time.monotonic() + 30
+    path = f"/proc/{server.pid}/task/{server.pid}/children"
+    while time.monotonic() < deadline:
+        with open(path) as children:
+            pids = [int(pid) for pid in children.read().split()]
+        if pids:
+            return pids
+        time.sleep(0.1)
+    return []
+
+
+@pytest.fixture
+def server(port: int) -> Generator[subprocess.Popen, None, None]:  # type: ignore[type-arg]
+    server = start(port, ["--workers", "2"])
+    yield server
+    stop(server)
+
+
+def start(port: int, args: List[str]) -> subprocess.Popen:  # type: ignore[type-arg]
+    remove_db()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "app.runner",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--db",
+            TEST_DB_NAME,
+            *args,
+        ]
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return server
+
+
+def stop(server: subprocess.Popen) -> None:  # type: ignore[type-arg]
+    if server.poll() is None:
+        server.kill()
+        server.wait()
+    remove_db()
+
+
+def remove_db() -> None:
+    for suffix in ("", "-wal", "-shm", ".log", ".log.1", ".snapshot", ".lock"):
+        if os.path.exists(TEST_DB_NAME + suffix):
+            os.remove(TEST_DB_NAME + suffix)
+
+
+@pytest.fixture
+def port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        free: int = probe.getsockname()[1]
+        return free
@@ -0,0 +1,132 @@
+import os
+from typing import Dict, List, Optional
+
+from app.core.cache_version import PRINCIPALS_CACHE, CacheVersionWatcher
+from app.core.entities import UserInfo
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.facade import BTCWalletService
+from app.core.principal_cache import PrincipalCache, PrincipalCacheStats
+from app.core.user.user_interactor import RegisterUserRequest
+from app.core.wallet.wallet_interactor import AddWalletRequest
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from tests.test_exchange_rate import FakeClock
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+
+class FakeUsers:
+    def __init__(self, *users: UserInfo):
+        self.users: Dict[str, UserInfo] = {user.api_key: user for user in users}
+        self.loads: List[str] = []
+
+    def get_user(self, api_key: str) -> Optional[UserInfo]:
+        self.loads.append(api_key)
+        return self.users.get(api_key)
+
+
+def test_should_load_each_key_once() -> None:
+    users = FakeUsers(UserInfo("a", "a@"))
+    cache = PrincipalCache()
+
+    assert cache.get("a", users.get_user) == UserInfo("a", "a@")
+    assert cache.get("a", users.get_user) == UserInfo("a", "a@")
+    assert users.loads == ["a"]
+    assert cache.stats == PrincipalCacheStats(hits=1, misses=1, evictions=0, size=1)
+
+
+def test_should_not_cache_unknown_keys() -> None:
+    users = FakeUsers()
+    cache = PrincipalCache()
+
+    assert cache.get("a", users.get_user) is None
+    users.users["a"] = UserInfo("a", "a@")
+    assert cache.get("a", users.get_user) == UserInfo("a", "a@")
+    assert cache.stats.size == 1
+
+
+def test_should_expire_after_ttl() -> None:
+    users, clock = FakeUsers(UserInfo("a", "a@")), FakeClock()
+    cache = PrincipalCache(ttl=10, clock=clock)
+
+    cache.get("a", users.get_user)
+    clock.now += 9
+    cache.get("a", users.get_user)
+    clock.now += 1
+    cache.get("a", users.get_user)
+    assert users.loads == ["a", "a"]
+
+
+def test_should_evict_least_recently_used() -> None:
+    users = FakeUsers(*(UserInfo(key, key) for key in "abc"))
+    cache = PrincipalCache(max_size=2)
+
+    cache.get("a", users.get_user)
+    cache.get("b", users.get_user)
+    cache.get("a", users.get_user)
+    cache.get("c", users.get_user)
+    cache.get("a", users.get_user)
+    cache.get("b", users.get_user)
+    assert users.loads == ["a", "b", "c", "b"]
+    assert cache.stats.evictions == 2
+
+
+def test_should_invalidate() -> None:
+    users = FakeUsers(UserInfo("a", "a@"), UserInfo("b", "b@"))
+    cache = PrincipalCache()
+    cache.get("a", users.get_user)
+    cache.get("b", users.get_user)
+
+    cache.invalidate("a")
+    cache.get("a", users.get_user)
+    cache.get("b", users.get_user)
+    assert users.loads == ["a", "b", "a"]
+
+    cache.clear()
+    assert cache.stats.size == 0
+
+
+def test_should_clear_when_bumped_by_another_process() -> None:
+    # two repositories on one database stand in for two worker processes
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
+    repository, other_worker = SQLiteRepository(TEST_DB_NAME), SQLiteRepository(
+        TEST_DB_NAME
+    )
+    users, clock = FakeUsers(UserInfo("a", "a@")), FakeClock()
+    version = CacheVersionWatcher(repository, PRINCIPALS_CACHE, interval=1, clock=clock)
+    cache = PrincipalCache(clock=clock, version=version)
+
+    cache.get("a", users.get_user)
+    assert other_worker.bump_cache_version(PRINCIPALS_CACHE) == 1
+    cache.get("a", users.get_user)
+    assert users.loads == ["a"]
+
+    clock.now += 1
+    cache.get("a", users.get_user)
+    cache.get("a", users.get_user)
+    assert users.loads == ["a", "a"]
+
+    repository.close()
+    other_worker.close()
+    os.remove(TEST_DB_NAME)
+
+
+def test_should_share_cache_between_interactors() -> None:
+    repository = SQLiteRepository(db_name=TEST_DB_NAME)
+    cache = PrincipalCache()
+    service = BTCWalletService.create(
+        repository,
+        repository,
+        repository,
+        repository,
+        rate_provider=StubExchangeRateProvider(),
+        principal_cache=cache,
+    )
+
+    api_key = service.register_user(RegisterUserRequest("test")).api_key
+    assert api_key is not None
+    service.add_wallet(AddWalletRequest(api_key))
+    service.get_transactions(api_key)
+    assert cache.stats == PrincipalCacheStats(hits=2, misses=0, evictions=0, size=1)
+
+    repository.close()
+    os.remove(TEST_DB_NAME)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.admin.admin_interactor import AdminInteractor, ProfileRequest
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.profiling import StackSampler
+from app.infrastructure.memory.memory_repository import MemoryRepository
+from app.runner.setup import setup
+from tests.test_admin_service import ADMIN_API_KEY
+
+
+def spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_should_sample_every_thread() -> None:
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        collapsed = StackSampler(interval=0.001).sample(0.2)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert collapsed is not None
+    stacks = dict(line.rsplit(" ", 1) for line in collapsed.splitlines())
+    spinning = [stack for stack in stacks if stack.startswith("spinner;")]
+    assert spinning
+    assert all(";spin (test_profiling.py:" in stack for stack in spinning)
+    assert all(int(count) > 0 for count in stacks.values())
+
+
+def test_should_take_one_profile_at_a_time() -> None:
+    sampler = StackSampler()
+    interactor = AdminInteractor(MemoryRepository(), profiler=sampler)
+    thread = threading.Thread(target=sampler.sample, args=(0.5,))
+    thread.start()
+    time.sleep(0.1)
+
+    assert interactor.profile(ProfileRequest(ADMIN_API_KEY, 0.1)).status_code == 409
+    assert interactor.profile(ProfileRequest(ADMIN_API_KEY, 61)).status_code == 400
+    thread.join()
+
+
+def test_should_serve_profiles() -> None:
+    app = setup(repository=MemoryRepository(), rate_provider=StubExchangeRateProvider())
+    with TestClient(app) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        address = client.post("/wallets", params={"api_key": api_key}).json()[
+            "wallet_info"
+        ]["wallet_address"]
+        admin = {"api_key": ADMIN_API_KEY}
+
+        unknown = client.post(
+            "/profile/requests", params={**admin, "route": "GET /nowhere"}
+        )
+        # a bad key cannot tell known routes from unknown ones
+        refused = [
+            client.post(
+                "/profile/requests", params={"api_key": "", "route": route}
+            ).json()["status_code"]
+            for route in ("GET /nowhere", "GET /wallets/{address}")
+        ]
+        armed = client.post(
+            "/profile/requests",
+            params={**admin, "route": "GET /wallets/{address}", "count": "2"},
+        )
+        for _ in range(3):
+            client.get(f"/wallets/{address}", params={"api_key": api_key})
+        profiles = client.get("/profile/requests", params=admin).json()["profiles"]
+        sampled = client.post("/profile", params={**admin, "seconds": "0.1"})
+
+    assert unknown.json()["status_code"] == 400
+    assert refused == [401, 401]
+    assert armed.json()["status_code"] == 200
+    assert [(p["route"], p["requested"], p["captured"]) for p in profiles] == [
+        ("GET /wallets/{address}", 2, 2)
+    ]
+    assert "get_wallet_info" in profiles[0]["report"]
+    assert sampled.headers["content-disposition"].startswith("attachment;")
+    assert sampled.text.endswith("\n")
@@ -1,9 +1,17 @@
 import os
-from typing import Generator
+import sqlite3
+import threading
+from typing import Generator, List
 
 import pytest
 
-from app.core.entities import Transaction, UserInfo, Wallet
+from app.core.entities import (
+    StatisticsBucket,
+    StatisticsInfo,
+    Transaction,
+    UserInfo,
+    Wallet,
+)
 from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
 
 TEST_DB_NAME = "tst.db"
@@ -29,8 +37,8 @@ def test_should_fetch_all_transactions(sqlite_repository: SQLiteRepository) -> N
             assert transaction.wallet_address_from == "wallet_address_2"
             assert transaction.wallet_address_to == "wallet_address_2"
 
-        assert transaction.btc_amount == i
-        assert transaction.fee_pct == i
+        assert transaction.amount_sat == i * 100
+        assert transaction.fee_bps == i * 100
         assert transaction.exchange_rate == i
 
 
@@ -53,14 +61,39 @@ def test_should_get_user_transactions(sqlite_repository: SQLiteRepository) -> No
             assert transaction.wallet_address_from == "wallet_address_2"
             assert transaction.wallet_address_to == "wallet_address_1"
 
-        assert transaction.btc_amount == i
-        assert transaction.fee_pct == i
+        assert transaction.amount_sat == i * 100
+        assert transaction.fee_bps == i * 100
         assert transaction.exchange_rate == i
 
 
+def test_should_page_through_transactions(
+    sqlite_repository: SQLiteRepository,
+) -> None:
+    user = UserInfo(api_key="api_key_1", email="email_1")
+    user_pages = [
+        sqlite_repository.get_user_transactions(user, since=since, limit=2)
+        for since in (None, 2, 4)
+    ]
+    wallet_pages = [
+        sqlite_repository.get_wallet_transactions("wallet_address_1", since, 2)
+        for since in (None, 2, 3)
+    ]
+
+    assert [[t.transaction_id for t in page] for page in user_pages] == [
+        [1, 2],
+        [3],
+        [],
+    ]
+    assert [[t.transaction_id for t in page] for page in wallet_pages] == [
+        [1, 2],
+        [3],
+        [],
+    ]
+
+
 def test_should_get_wallet_user(sqlite_repository: SQLiteRepository) -> None:
     user = sqlite_repository.get_wallet_user(
-        wallet=Wallet(wallet_address="wallet_address_1", btc_balance=2)
+        wallet=Wallet(wallet_address="wallet_address_1", balance_sat=2000)
     )
 
     assert user.api_key == "api_key_1"
@@ -71,7 +104,7 @@ def test_should_get_wallet(sqlite_repository: SQLiteRepository) -> None:
     wallet = sqlite_repository.get_wallet(wallet_address="wallet_address_1")
 
     assert wallet is not None and wallet.wallet_address == "wallet_address_1"
-    assert wallet.btc_balance == 1
+    assert wallet.balance_sat == 1000
 
 
 def test_should_get_wallet_transactions(sqlite_repository: SQLiteRepository) -> None:
@@ -93,20 +126,173 @@ def test_should_get_wallet_transactions(sqlite_repository: SQLiteRepository) ->
             assert transaction.wallet_address_from == "wallet_address_2"
             assert transaction.wallet_address_to == "wallet_address_1"
 
-        assert transaction.btc_amount == i
-        assert transaction.fee_pct == i
+        assert transaction.amount_sat == i * 100
+        assert transaction.fee_bps == i * 100
         assert transaction.exchange_rate == i
 
 
 def test_should_update_wallet_balance(sqlite_repository: SQLiteRepository) -> None:
     sqlite_repository.update_wallet_balance(
-        wallet_address="wallet_address_1", new_btc_balance=2
+        wallet_address="wallet_address_1", new_balance_sat=2000
     )
 
     wallet = sqlite_repository.get_wallet(wallet_address="wallet_address_1")
 
     assert wallet is not None and wallet.wallet_address == "wallet_address_1"
-    assert wallet.btc_balance == 2
+    assert wallet.balance_sat == 2000
+
+
+def test_should_execute_transfer(sqlite_repository: SQLiteRepository) -> None:
+    applied = sqlite_repository.execute_transfer(
+        Transaction(
+            wallet_address_from="wallet_address_2",
+            wallet_address_to="wallet_address_1",
+            amount_sat=1000,
+            fee_bps=5000,
+            exchange_rate=5,
+        )
+    )
+    assert applied is True
+
+    wallet_from = sqlite_repository.get_wallet(wallet_address="wallet_address_2")
+    wallet_to = sqlite_repository.get_wallet(wallet_address="wallet_address_1")
+    assert wallet_from is not None and wallet_from.balance_sat == 1000
+    assert wallet_to is not None and wallet_to.balance_sat == 1500
+
+    transactions = sqlite_repository.get_wallet_transactions("wallet_address_2")
+    assert len(transactions) == 4
+    assert transactions[-1].amount_sat == 1000
+    assert transactions[-1].fee_bps == 5000
+    assert transactions[-1].exchange_rate == 5
+
+
+def test_should_reject_transfer_with_insufficient_funds(
+    sqlite_repository: SQLiteRepository,
+) -> None:
+    applied = sqlite_repository.execute_transfer(
+        Transaction(
+            wallet_address_from="wallet_address_1",
+            wallet_address_to="wallet_address_2",
+            amount_sat=1001,
+            fee_bps=0,
+            exchange_rate=1,
+        )
+    )
+    assert applied is False
+
+    wallet_from = sqlite_repository.get_wallet(wallet_address="wallet_address_1")
+    wallet_to = sqlite_repository.get_wallet(wallet_address="wallet_address_2")
+    assert wallet_from is not None and wallet_from.balance_sat == 1000
+    assert wallet_to is not None and wallet_to.balance_sat == 2000
+    assert len(sqlite_repository.fetch_all_transactions()) == 4
+
+
+def test_should_not_lose_updates_under_concurrent_transfers(
+    sqlite_repository: SQLiteRepository,
+) -> None:
+    results: List[bool] = []
+
+    def transfer() -> None:
+        results.append(
+            sqlite_repository.execute_transfer(
+                Transaction(
+                    wallet_address_from="wallet_address_1",
+                    wallet_address_to="wallet_address_2",
+                    amount_sat=125,
+                    fee_bps=0,
+                    exchange_rate=1,
+                )
+            )
+        )
+
+    threads = [threading.Thread(target=transfer) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 8
+    wallet_from = sqlite_repository.get_wallet(wallet_address="wallet_address_1")
+    wallet_to = sqlite_repository.get_wallet(wallet_address="wallet_address_2")
+    assert wallet_from is not None and wallet_from.balance_sat == 0
+    assert wallet_to is not None and wallet_to.balance_sat == 3000
+    assert len(sqlite_repository.fetch_all_transactions()) == 4 + 8
+
+
+def test_should_maintain_statistics(sqlite_repository: SQLiteRepository) -> None:
+    assert sqlite_repository.get_statistics() == StatisticsInfo(4, 30)
+
+    sqlite_repository.execute_transfer(
+        Transaction("wallet_address_2", "wallet_address_1", 500, 5000, 1)
+    )
+    assert sqlite_repository.get_statistics() == StatisticsInfo(5, 280)
+
+
+def test_should_round_fees_down_to_whole_satoshis(
+    sqlite_repository: SQLiteRepository,
+) -> None:
+    # 333 sat at 1.5% is a fee of 4.995 sat
+    sqlite_repository.execute_transfer(
+        Transaction("wallet_address_2", "wallet_address_1", 333, 150, 1)
+    )
+
+    wallet_from = sqlite_repository.get_wallet(wallet_address="wallet_address_2")
+    wallet_to = sqlite_repository.get_wallet(wallet_address="wallet_address_1")
+    assert wallet_from is not None and wallet_from.balance_sat == 1667
+    assert wallet_to is not None and wallet_to.balance_sat == 1329
+    assert sqlite_repository.get_statistics() == StatisticsInfo(5, 34)
+    assert sqlite_repository.reconcile_statistics() == StatisticsInfo(5, 34)
+
+
+def test_should_reconcile_statistics(sqlite_repository: SQLiteRepository) -> None:
+    with sqlite_repository.pool.connection() as connection:
+        connection.execute("UPDATE statistics SET transaction_count = 0;")
+        connection.commit()
+    assert sqlite_repository.get_statistics() == StatisticsInfo(0, 30)
+
+    assert sqlite_repository.reconcile_statistics() == StatisticsInfo(4, 30)
+    assert sqlite_repository.get_statistics() == StatisticsInfo(4, 30)
+
+
+def test_should_roll_up_transactions_by_time(
+    sqlite_repository: SQLiteRepository,
+) -> None:
+    with sqlite_repository.pool.connection() as connection:
+        connection.executemany(
+            """INSERT INTO transactions (wallet_id_from, wallet_id_to, amount_sat, fee_bps, btc_usd_exchange_rate, created_at)
+               VALUES (?, ?, ?, ?, ?, ?);""",
+            [
+                (1, 2, 100_000_000, 5000, 10, 3599),
+                (1, 1, 200_000_000, 0, 10, 3600),
+                (2, 2, 400_000_000, 0, 20, 7200),
+            ],
+        )
+        connection.commit()
+
+    buckets = sqlite_repository.get_statistics_buckets("hour", 0, 7200)
+    assert buckets == [
+        StatisticsBucket(0, 1, 100_000_000, 10, 50_000_000),
+        StatisticsBucket(3600, 1, 200_000_000, 20, 0),
+        StatisticsBucket(7200, 1, 400_000_000, 80, 0),
+    ]
+    assert sqlite_repository.get_statistics_buckets("day", 0, 0) == [
+        StatisticsBucket(0, 3, 700_000_000, 110, 50_000_000)
+    ]
+    assert (
+        sqlite_repository.get_statistics_buckets(
+            "hour", 0, 7200, wallet_address="wallet_address_1"
+        )
+        == buckets[:2]
+    )
+    assert sqlite_repository.get_statistics_buckets(
+        "hour", 0, 7200, user_email="email_2"
+    ) == [buckets[0], buckets[2]]
+    assert (
+        sqlite_repository.get_statistics_buckets(
+            "hour", 0, 7200, wallet_address="unknown"
+        )
+        == []
+    )
 
 
 def test_should_get_user(sqlite_repository: SQLiteRepository) -> None:
@@ -127,7 +313,7 @@ def test_should_get_user_by_email(sqlite_repository: SQLiteRepository) -> None:
 
 def test_should_get_user_wallets(sqlite_repository: SQLiteRepository) -> None:
     sqlite_repository.update_wallet_balance(
-        wallet_address="wallet_address_1", new_btc_balance=2
+        wallet_address="wallet_address_1", new_balance_sat=2000
     )
 
     wallets = sqlite_repository.get_user_wallets(
@@ -136,7 +322,91 @@ def test_should_get_user_wallets(sqlite_repository: SQLiteRepository) -> None:
     assert len(wallets) == 1
 
     assert wallets[0].wallet_address == "wallet_address_1"
-    assert wallets[0].btc_balance == 2
+    assert wallets[0].balance_sat == 2000
+
+
+def test_should_not_scan_tables(sqlite_repository: SQLiteRepository) -> None:
+    statements: List[str] = []
+    user = UserInfo(api_key="api_key_1", email="email_1")
+
+    with sqlite_repository.pool.connection() as connection:
+        connection.set_trace_callback(statements.append)
+        sqlite_repository.get_user(api_key=user.api_key)
+        sqlite_repository.get_user_by_email(email=user.email)
+        sqlite_repository.get_user_wallets(user=user)
+        sqlite_repository.get_wallet(wallet_address="wallet_address_1")
+        sqlite_repository.get_wallet_user(
+            wallet=Wallet(wallet_address="wallet_address_1", balance_sat=1000)
+        )
+        sqlite_repository.get_wallet_transactions(wallet_address="wallet_address_1")
+        sqlite_repository.get_user_transactions(user=user)
+        sqlite_repository.get_statistics()
+        connection.set_trace_callback(None)
+
+        queries = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        assert len(queries) == 8
+        for query in queries:
+            plan = connection.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+            # scans of LIMITed subquery results are fine, table scans are not
+            scans = [
+                row[3]
+                for row in plan
+                if row[3].startswith("SCAN") and "subquery" not in row[3]
+            ]
+            assert scans == [], query
+
+
+def test_should_upgrade_existing_database() -> None:
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
+
+    connection = sqlite3.connect(TEST_DB_NAME)
+    connection.executescript("""CREATE TABLE users (id INTEGER PRIMARY KEY,
+                               email TEXT NOT NULL UNIQUE,
+                               api_key TEXT NOT NULL UNIQUE);
+           CREATE TABLE wallets (id INTEGER PRIMARY KEY,
+                                 address TEXT NOT NULL UNIQUE,
+                                 balance_in_btc FLOAT NOT NULL);
+           CREATE TABLE users_wallets (id INTEGER PRIMARY KEY,
+                                       user_id INTEGER NOT NULL,
+                                       wallet_id INTEGER NOT NULL);
+           CREATE TABLE transactions (id INTEGER PRIMARY KEY,
+                                      wallet_id_from INTEGER NOT NULL,
+                                      wallet_id_to INTEGER NOT NULL,
+                                      amount_in_btc FLOAT NOT NULL,
+                                      fee_pct FLOAT,
+                                      btc_usd_exchange_rate FLOAT NOT NULL);
+           INSERT INTO users VALUES (1, 'email_1', 'api_key_1');
+           INSERT INTO wallets VALUES (1, 'wallet_address_1', 1);
+           INSERT INTO users_wallets VALUES (1, 1, 1);
+           INSERT INTO transactions VALUES (1, 1, 1, 0.5, 0.015, 1);""")
+    connection.close()
+
+    repository = SQLiteRepository(db_name=TEST_DB_NAME)
+    expected = {"users_wallets": {"users", "wallets"}, "transactions": {"wallets"}}
+    with repository.pool.connection() as connection:
+        for table, parents in expected.items():
+            foreign_keys = connection.execute(
+                f"PRAGMA foreign_key_list({table});"
+            ).fetchall()
+            assert {row[2] for row in foreign_keys} == parents
+        types = connection.execute(
+            """SELECT typeof(w.balance_sat), typeof(t.amount_sat), typeof(t.fee_bps)
+               FROM wallets w, transactions t;"""
+        ).fetchall()
+        assert types == [("integer", "integer", "integer")]
+
+    wallet = repository.get_wallet("wallet_address_1")
+    assert wallet is not None and wallet.balance_sat == 100_000_000
+    assert repository.get_wallet_transactions("wallet_address_1") == [
+        Transaction("wallet_address_1", "wallet_address_1", 50_000_000, 150, 1)
+    ]
+    assert repository.get_wallet_user(wallet).email == "email_1"
+    assert repository.get_statistics() == StatisticsInfo(1, 750_000)
+    repository.close()
+
+    if os.path.exists(TEST_DB_NAME):
+        os.remove(TEST_DB_NAME)
 
 
 def should_fill_tables_with_test_data(
@@ -146,11 +416,11 @@ def should_fill_tables_with_test_data(
     sqlite_repository.register_user(user=UserInfo(api_key="api_key_2", email="email_2"))
 
     sqlite_repository.add_wallet(
-        wallet=Wallet(wallet_address="wallet_address_1", btc_balance=1),
+        wallet=Wallet(wallet_address="wallet_address_1", balance_sat=1000),
         user=UserInfo(api_key="api_key_1", email="email_1"),
     )
     sqlite_repository.add_wallet(
-        wallet=Wallet(wallet_address="wallet_address_2", btc_balance=2),
+        wallet=Wallet(wallet_address="wallet_address_2", balance_sat=2000),
         user=UserInfo(api_key="api_key_2", email="email_2"),
     )
 
@@ -158,8 +428,8 @@ def should_fill_tables_with_test_data(
         transaction=Transaction(
             wallet_address_from="wallet_address_1",
             wallet_address_to="wallet_address_2",
-            btc_amount=1,
-            fee_pct=1,
+            amount_sat=100,
+            fee_bps=100,
             exchange_rate=1,
         )
     )
@@ -167,8 +437,8 @@ def should_fill_tables_with_test_data(
         transaction=Transaction(
             wallet_address_from="wallet_address_1",
             wallet_address_to="wallet_address_1",
-            btc_amount=2,
-            fee_pct=2,
+            amount_sat=200,
+            fee_bps=200,
             exchange_rate=2,
         )
     )
@@ -177,8 +447,8 @@ def should_fill_tables_with_test_data(
         transaction=Transaction(
             wallet_address_from="wallet_address_2",
             wallet_address_to="wallet_address_1",
-            btc_amount=3,
-            fee_pct=3,
+            amount_sat=300,
+            fee_bps=300,
             exchange_rate=3,
         )
     )
@@ -186,8 +456,8 @@ def should_fill_tables_with_test_data(
         transaction=Transaction(
             wallet_address_from="wallet_address_2",
             wallet_address_to="wallet_address_2",
-            btc_amount=4,
-            fee_pct=4,
+            amount_sat=400,
+            fee_bps=400,
             exchange_rate=4,
         )
     )
@@ -199,6 +469,8 @@ def sqlite_repository() -> Generator[SQLiteRepository, None, None]:
     if os.path.exists(TEST_DB_NAME):
         os.remove(TEST_DB_NAME)
 
-    yield should_fill_tables_with_test_data(SQLiteRepository(db_name=TEST_DB_NAME))
+    repository = SQLiteRepository(db_name=TEST_DB_NAME)
+    yield should_fill_tables_with_test_data(repository)
+    repository.close()
     if os.path.exists(TEST_DB_NAME):
         os.remove(TEST_DB_NAME)
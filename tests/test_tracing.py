@@ -0,0 +1,134 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.exchange_rate import StubExchangeRateProvider, TimedExchangeRateProvider
+from app.core.tracing import SERVER, Span, Tracer, child_span
+from app.infrastructure.otlp.file_exporter import OTLPFileExporter
+from app.runner.setup import setup
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+PARENT_ID = "b7ad6b7169203331"
+
+
+class ListExporter:
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def export(self, spans: Sequence[Span]) -> None:
+        self.spans.extend(spans)
+
+    def close(self) -> None:
+        pass
+
+
+def read_spans(path: Path) -> List[Dict[str, Any]]:
+    spans = []
+    for line in path.read_text().splitlines():
+        for resource in json.loads(line)["resourceSpans"]:
+            for scope in resource["scopeSpans"]:
+                spans.extend(scope["spans"])
+    return spans
+
+
+def attribute(span: Dict[str, Any], key: str) -> Optional[Any]:
+    for item in span["attributes"]:
+        if item["key"] == key:
+            return next(iter(item["value"].values()))
+    return None
+
+
+def test_should_trace_transfer_down_to_statements(tmp_path: Path) -> None:
+    trace_file = tmp_path / "traces.jsonl"
+    app = setup(
+        db_name=str(tmp_path / "bw.db"),
+        rate_provider=TimedExchangeRateProvider(StubExchangeRateProvider(), "stub"),
+        tracer=Tracer(OTLPFileExporter(str(trace_file)), sample_ratio=1.0),
+    )
+    with TestClient(app) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        addresses = [
+            client.post("/wallets", params={"api_key": api_key}).json()["wallet_info"][
+                "wallet_address"
+            ]
+            for _ in range(2)
+        ]
+        response = client.post(
+            "/transactions",
+            params={
+                "api_key": api_key,
+                "wallet_address_from": addresses[0],
+                "wallet_address_to": addresses[1],
+                "btc_amount": 0.1,
+            },
+        )
+    trace_id = response.headers["traceparent"].split("-")[1]
+
+    spans = [span for span in read_spans(trace_file) if span["traceId"] == trace_id]
+    by_name = {span["name"]: span for span in spans}
+    root = by_name["POST /transactions"]
+    assert root["kind"] == SERVER
+    assert "parentSpanId" not in root
+    assert attribute(root, "http.status_code") == "200"
+    chain = [
+        "WalletCheckHandler",
+        "UserCheckHandler",
+        "BalanceCheckHandler",
+        "ExchangeRateHandler",
+        "PrepareTransactionHandler",
+        "MakeTransactionHandler",
+    ]
+    parent = root
+    for handler in chain:
+        span = by_name[f"transaction.{handler}"]
+        assert span["parentSpanId"] == parent["spanId"]
+        parent = span
+    rate = by_name["rate.stub"]
+    assert rate["parentSpanId"] == by_name["transaction.ExchangeRateHandler"]["spanId"]
+    # the unit of work applies the transfer once the chain has run
+    transfer = by_name["repository.execute_transfers"]
+    assert transfer["parentSpanId"] == root["spanId"]
+    statements = [
+        str(attribute(span, "db.statement"))
+        for span in spans
+        if span["name"] == "sqlite" and span["parentSpanId"] == transfer["spanId"]
+    ]
+    assert any(statement.startswith("UPDATE") for statement in statements)
+
+
+def test_should_follow_callers_sampling_decision() -> None:
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sample_ratio=0.0)
+
+    with tracer.request_span("unsampled") as span:
+        assert span is None
+        with child_span("child") as child:
+            assert child is None
+    with tracer.request_span("declined", f"00-{TRACE_ID}-{PARENT_ID}-00") as span:
+        assert span is None
+    with tracer.request_span("continued", f"00-{TRACE_ID}-{PARENT_ID}-01") as span:
+        assert span is not None
+    tracer.flush()
+
+    assert [(s.name, s.trace_id, s.parent_id) for s in exporter.spans] == [
+        ("continued", TRACE_ID, PARENT_ID)
+    ]
+
+
+def test_should_record_errors() -> None:
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sample_ratio=1.0)
+
+    with pytest.raises(KeyError):
+        with tracer.request_span("request"):
+            with child_span("lookup"):
+                raise KeyError("missing")
+    tracer.flush()
+
+    assert [(s.name, s.error) for s in exporter.spans] == [
+        ("lookup", "KeyError: 'missing'"),
+        ("request", "KeyError: 'missing'"),
+    ]
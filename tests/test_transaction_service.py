@@ -1,15 +1,17 @@
-import os
-from typing import Generator
-
 import pytest
 
+from app.core.entities import Transaction
+from app.core.exchange_rate import StubExchangeRateProvider
 from app.core.facade import BTCWalletService
-from app.core.transaction.transaction_CoR import FEE_PERCENTAGE, MakeTransactionRequest
+from app.core.money import transfer_fee
+from app.core.transaction.transaction_CoR import (
+    FEE_BASIS_POINTS,
+    MakeTransactionRequest,
+)
 from app.core.user.user_interactor import RegisterUserRequest
 from app.core.wallet.wallet_CoR import DEFAULT_INITIAL_BALANCE
 from app.core.wallet.wallet_interactor import AddWalletRequest, GetWalletRequest
-from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
-from tests.test_sqlite_repository import TEST_DB_NAME
+from app.runner.setup import IRepository
 
 
 def test_get_user_transactions_invalid_credentials(service: BTCWalletService) -> None:
@@ -47,13 +49,13 @@ def test_make_transaction_same_user(service: BTCWalletService) -> None:
     assert wallet_response.wallet_info is not None
     wallet_address_2 = wallet_response.wallet_info.wallet_address
 
-    btc_amount = 0.1
+    amount_sat = 10_000_000
     make_transaction_response = service.make_transaction(
         MakeTransactionRequest(
             api_key=api_key,
             wallet_address_from=wallet_address_1,
             wallet_address_to=wallet_address_2,
-            btc_amount=btc_amount,
+            amount_sat=amount_sat,
         )
     )
     assert make_transaction_response.success is True
@@ -67,8 +69,8 @@ def test_make_transaction_same_user(service: BTCWalletService) -> None:
     assert len(response.transactions) == 1
     assert response.transactions[0].wallet_address_from == wallet_address_1
     assert response.transactions[0].wallet_address_to == wallet_address_2
-    assert response.transactions[0].btc_amount == btc_amount
-    assert response.transactions[0].fee_pct == 0.0
+    assert response.transactions[0].amount_sat == amount_sat
+    assert response.transactions[0].fee_bps == 0
     assert response.transactions[0].exchange_rate is not None
 
     wallet_response = service.get_wallet(GetWalletRequest(api_key, wallet_address_1))
@@ -76,7 +78,7 @@ def test_make_transaction_same_user(service: BTCWalletService) -> None:
     assert wallet_response.status_code == 200
     assert wallet_response.wallet_info is not None
     assert (
-        wallet_response.wallet_info.btc_balance == DEFAULT_INITIAL_BALANCE - btc_amount
+        wallet_response.wallet_info.balance_sat == DEFAULT_INITIAL_BALANCE - amount_sat
     )
 
     wallet_response = service.get_wallet(GetWalletRequest(api_key, wallet_address_2))
@@ -84,7 +86,7 @@ def test_make_transaction_same_user(service: BTCWalletService) -> None:
     assert wallet_response.status_code == 200
     assert wallet_response.wallet_info is not None
     assert (
-        wallet_response.wallet_info.btc_balance == DEFAULT_INITIAL_BALANCE + btc_amount
+        wallet_response.wallet_info.balance_sat == DEFAULT_INITIAL_BALANCE + amount_sat
     )
 
 
@@ -105,13 +107,13 @@ def test_make_transaction_different_user(service: BTCWalletService) -> None:
     assert wallet_response.wallet_info is not None
     wallet_address_2 = wallet_response.wallet_info.wallet_address
 
-    btc_amount = 0.1
+    amount_sat = 10_000_000
     make_transaction_response = service.make_transaction(
         MakeTransactionRequest(
             api_key=api_key_1,
             wallet_address_from=wallet_address_1,
             wallet_address_to=wallet_address_2,
-            btc_amount=btc_amount,
+            amount_sat=amount_sat,
         )
     )
     assert make_transaction_response.success is True
@@ -125,8 +127,8 @@ def test_make_transaction_different_user(service: BTCWalletService) -> None:
     assert len(response.transactions) == 1
     assert response.transactions[0].wallet_address_from == wallet_address_1
     assert response.transactions[0].wallet_address_to == wallet_address_2
-    assert response.transactions[0].btc_amount == btc_amount
-    assert response.transactions[0].fee_pct == FEE_PERCENTAGE
+    assert response.transactions[0].amount_sat == amount_sat
+    assert response.transactions[0].fee_bps == FEE_BASIS_POINTS
     assert response.transactions[0].exchange_rate is not None
 
     response = service.get_transactions(api_key_2)
@@ -137,8 +139,8 @@ def test_make_transaction_different_user(service: BTCWalletService) -> None:
     assert len(response.transactions) == 1
     assert response.transactions[0].wallet_address_from == wallet_address_1
     assert response.transactions[0].wallet_address_to == wallet_address_2
-    assert response.transactions[0].btc_amount == btc_amount
-    assert response.transactions[0].fee_pct == FEE_PERCENTAGE
+    assert response.transactions[0].amount_sat == amount_sat
+    assert response.transactions[0].fee_bps == FEE_BASIS_POINTS
     assert response.transactions[0].exchange_rate is not None
 
     wallet_response = service.get_wallet(GetWalletRequest(api_key_1, wallet_address_1))
@@ -146,7 +148,7 @@ def test_make_transaction_different_user(service: BTCWalletService) -> None:
     assert wallet_response.status_code == 200
     assert wallet_response.wallet_info is not None
     assert (
-        wallet_response.wallet_info.btc_balance == DEFAULT_INITIAL_BALANCE - btc_amount
+        wallet_response.wallet_info.balance_sat == DEFAULT_INITIAL_BALANCE - amount_sat
     )
 
     wallet_response = service.get_wallet(GetWalletRequest(api_key_2, wallet_address_2))
@@ -154,17 +156,193 @@ def test_make_transaction_different_user(service: BTCWalletService) -> None:
     assert wallet_response.status_code == 200
     assert wallet_response.wallet_info is not None
     assert (
-        wallet_response.wallet_info.btc_balance
-        == DEFAULT_INITIAL_BALANCE + (1 - FEE_PERCENTAGE) * btc_amount
+        wallet_response.wallet_info.balance_sat
+        == DEFAULT_INITIAL_BALANCE
+        + amount_sat
+        - transfer_fee(amount_sat, FEE_BASIS_POINTS)
+    )
+
+
+def test_make_transaction_insufficient_funds(service: BTCWalletService) -> None:
+    register_response = service.register_user(RegisterUserRequest("test_email"))
+    assert register_response.api_key is not None
+    api_key = register_response.api_key
+
+    wallet_response = service.add_wallet(AddWalletRequest(api_key=api_key))
+    assert wallet_response.wallet_info is not None
+    wallet_address_1 = wallet_response.wallet_info.wallet_address
+
+    wallet_response = service.add_wallet(AddWalletRequest(api_key=api_key))
+    assert wallet_response.wallet_info is not None
+    wallet_address_2 = wallet_response.wallet_info.wallet_address
+
+    response = service.make_transaction(
+        MakeTransactionRequest(
+            api_key=api_key,
+            wallet_address_from=wallet_address_1,
+            wallet_address_to=wallet_address_2,
+            amount_sat=DEFAULT_INITIAL_BALANCE + 1,
+        )
+    )
+    assert response.success is False
+    assert response.status_code == 402
+
+    response = service.get_transactions(api_key)
+    assert response.transactions == []
+
+
+def test_make_transactions_batch(service: BTCWalletService) -> None:
+    register_response = service.register_user(RegisterUserRequest("test_email_1"))
+    assert register_response.api_key is not None
+    api_key_1 = register_response.api_key
+
+    register_response = service.register_user(RegisterUserRequest("test_email_2"))
+    assert register_response.api_key is not None
+    api_key_2 = register_response.api_key
+
+    wallet_response = service.add_wallet(AddWalletRequest(api_key=api_key_1))
+    assert wallet_response.wallet_info is not None
+    wallet_address_1 = wallet_response.wallet_info.wallet_address
+
+    wallet_response = service.add_wallet(AddWalletRequest(api_key=api_key_2))
+    assert wallet_response.wallet_info is not None
+    wallet_address_2 = wallet_response.wallet_info.wallet_address
+
+    amount_sat = 50_000_000
+    responses = service.make_transactions(
+        [
+            MakeTransactionRequest(
+                api_key_1, wallet_address_1, wallet_address_2, amount_sat
+            ),
+            MakeTransactionRequest(
+                api_key_2, wallet_address_1, wallet_address_2, amount_sat
+            ),
+            MakeTransactionRequest(
+                api_key_1, wallet_address_1, wallet_address_2, amount_sat
+            ),
+            MakeTransactionRequest(
+                api_key_1, wallet_address_1, wallet_address_2, amount_sat
+            ),
+        ]
     )
+    assert [response.status_code for response in responses] == [200, 401, 200, 402]
+
+    response = service.get_transactions(api_key_1)
+    assert response.transactions is not None
+    assert len(response.transactions) == 2
+
+    wallet_response = service.get_wallet(GetWalletRequest(api_key_1, wallet_address_1))
+    assert wallet_response.wallet_info is not None
+    assert wallet_response.wallet_info.balance_sat == 0
+
+    wallet_response = service.get_wallet(GetWalletRequest(api_key_2, wallet_address_2))
+    assert wallet_response.wallet_info is not None
+    assert wallet_response.wallet_info.balance_sat == DEFAULT_INITIAL_BALANCE + 2 * (
+        amount_sat - transfer_fee(amount_sat, FEE_BASIS_POINTS)
+    )
+
+
+def test_get_user_transactions_paged(service: BTCWalletService) -> None:
+    api_key = service.register_user(RegisterUserRequest("test_email")).api_key
+    assert api_key is not None
+    wallets = [service.add_wallet(AddWalletRequest(api_key)) for _ in range(2)]
+    addresses = [w.wallet_info.wallet_address for w in wallets if w.wallet_info]
+    for _ in range(3):
+        service.make_transaction(
+            MakeTransactionRequest(api_key, addresses[0], addresses[1], 10_000_000)
+        )
+
+    response = service.get_transactions(api_key, limit=2)
+    assert response.transactions is not None
+    assert len(response.transactions) == 2
+    assert response.next_since == response.transactions[-1].transaction_id
+
+    response = service.get_transactions(api_key, since=response.next_since, limit=2)
+    assert response.transactions is not None
+    assert len(response.transactions) == 1
+    assert response.next_since is None
+
+    assert service.get_transactions(api_key, limit=0).status_code == 400
+
+    stream = service.stream_transactions(api_key)
+    assert stream.pages is not None
+    assert [len(page) for page in stream.pages] == [3]
+    assert service.stream_transactions("").status_code == 401
+
+
+def test_make_transaction_not_positive(
+    service: BTCWalletService, backend: IRepository
+) -> None:
+    api_key = service.register_user(RegisterUserRequest("test_email")).api_key
+    assert api_key is not None
+    wallets = [service.add_wallet(AddWalletRequest(api_key)) for _ in range(2)]
+    addresses = [w.wallet_info.wallet_address for w in wallets if w.wallet_info]
+
+    for amount_sat in (0, -50_000_000):
+        response = service.make_transaction(
+            MakeTransactionRequest(api_key, addresses[0], addresses[1], amount_sat)
+        )
+        assert response.success is False
+        assert response.status_code == 400
+        # past the handlers, the repository refuses it as well
+        transaction = Transaction(addresses[0], addresses[1], amount_sat, 0, 4e4)
+        assert backend.execute_transfers([transaction]) == [False]
+
+    history = service.get_transactions(api_key)
+    assert history.transactions == []
+    wallet_response = service.get_wallet(GetWalletRequest(api_key, addresses[0]))
+    assert wallet_response.wallet_info is not None
+    assert wallet_response.wallet_info.balance_sat == DEFAULT_INITIAL_BALANCE
+
+
+def test_make_transaction_idempotent_retry(service: BTCWalletService) -> None:
+    api_key = service.register_user(RegisterUserRequest("test_email")).api_key
+    assert api_key is not None
+    wallets = [service.add_wallet(AddWalletRequest(api_key)) for _ in range(2)]
+    addresses = [w.wallet_info.wallet_address for w in wallets if w.wallet_info]
+    request = MakeTransactionRequest(
+        api_key, addresses[0], addresses[1], 10_000_000, idempotency_key="retry"
+    )
+
+    first = service.make_transaction(request)
+    assert first.status_code == 200
+    retried = service.make_transactions([request, request])
+    assert [r.status_code for r in retried] == [200, 200]
+    history = service.get_transactions(api_key)
+    assert history.transactions is not None
+    assert len(history.transactions) == 1
+
+    reused = service.make_transaction(
+        MakeTransactionRequest(
+            api_key, addresses[0], addresses[1], 20_000_000, idempotency_key="retry"
+        )
+    )
+    assert reused.success is False
+    assert reused.status_code == 422
+
+    # keys are per user
+    other_key = service.register_user(RegisterUserRequest("other_email")).api_key
+    assert other_key is not None
+    other = service.add_wallet(AddWalletRequest(other_key)).wallet_info
+    assert other is not None
+    response = service.make_transaction(
+        MakeTransactionRequest(
+            other_key,
+            other.wallet_address,
+            addresses[0],
+            10_000_000,
+            idempotency_key="retry",
+        )
+    )
+    assert response.status_code == 200
 
 
 @pytest.fixture
-def service() -> Generator[BTCWalletService, None, None]:
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
-
-    repository = SQLiteRepository(db_name=TEST_DB_NAME)
-    yield BTCWalletService.create(repository, repository, repository, repository)
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
+def service(backend: IRepository) -> BTCWalletService:
+    return BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+    )
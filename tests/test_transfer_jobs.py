@@ -0,0 +1,277 @@
+import os
+import time
+from typing import List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.entities import JOB_DONE, JOB_QUEUED
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.facade import BTCWalletService
+from app.core.transaction.transaction_CoR import (
+    JOB_KEY_PREFIX,
+    MakeTransactionRequest,
+)
+from app.core.transaction.transfer_workers import TransferWorkerConfig, job_request
+from app.core.user.user_interactor import RegisterUserRequest
+from app.core.wallet.wallet_CoR import DEFAULT_INITIAL_BALANCE
+from app.core.wallet.wallet_interactor import AddWalletRequest, GetWalletRequest
+from app.runner.setup import IRepository, setup
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+
+def create_service(
+    backend: IRepository, config: TransferWorkerConfig
+) -> BTCWalletService:
+    return BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+        transfer_workers=config,
+    )
+
+
+def wallets(service: BTCWalletService) -> Tuple[str, List[str]]:
+    api_key = service.register_user(RegisterUserRequest("test")).api_key
+    assert api_key is not None
+    addresses = []
+    for _ in range(2):
+        wallet_info = service.add_wallet(AddWalletRequest(api_key)).wallet_info
+        assert wallet_info is not None
+        addresses.append(wallet_info.wallet_address)
+    return api_key, addresses
+
+
+def test_should_queue_and_run_transfers(backend: IRepository) -> None:
+    service = create_service(backend, TransferWorkerConfig(workers=1, batch_size=2))
+    workers = service.transfer_workers
+    assert workers is not None
+    api_key, addresses = wallets(service)
+
+    submitted = [
+        service.submit_transaction(
+            MakeTransactionRequest(api_key, addresses[0], addresses[1], amount_sat)
+        )
+        for amount_sat in (60_000_000, 60_000_000, 1000)
+    ]
+    assert [r.status_code for r in submitted] == [202, 202, 202]
+    jobs = [r.job for r in submitted if r.job is not None]
+    assert [job.status for job in jobs] == [JOB_QUEUED] * 3
+    job_ids = [job.job_id for job in jobs if job.job_id is not None]
+    assert len(set(job_ids)) == 3
+
+    assert workers.run_once() == 2
+    assert workers.run_once() == 1
+    assert workers.run_once() == 0
+
+    polled = [service.get_transfer_job(api_key, job_id) for job_id in job_ids]
+    assert [r.status_code for r in polled] == [200, 200, 200]
+    done = [r.job for r in polled if r.job is not None]
+    assert [job.status for job in done] == [JOB_DONE] * 3
+    # the second overdraws the wallet once the first is through
+    assert [job.status_code for job in done] == [200, 402, 200]
+    assert [job.success for job in done] == [True, False, True]
+
+    response = service.get_transactions(api_key)
+    assert response.transactions is not None
+    assert len(response.transactions) == 2
+
+
+def test_should_hide_jobs_of_other_users(backend: IRepository) -> None:
+    service = create_service(backend, TransferWorkerConfig(workers=1))
+    api_key, addresses = wallets(service)
+    other_key = service.register_user(RegisterUserRequest("other")).api_key
+    assert other_key is not None
+
+    response = service.submit_transaction(
+        MakeTransactionRequest("", addresses[0], addresses[1], 1000)
+    )
+    assert response.status_code == 401
+    response = service.submit_transaction(
+        MakeTransactionRequest(api_key, addresses[0], addresses[1], 1000)
+    )
+    assert response.job is not None and response.job.job_id is not None
+    job_id = response.job.job_id
+
+    assert service.get_transfer_job(other_key, job_id).status_code == 404
+    assert service.get_transfer_job(api_key, job_id + 1).status_code == 404
+    assert service.get_transfer_job(api_key, job_id).status_code == 200
+
+
+def test_should_queue_a_key_once(backend: IRepository) -> None:
+    service = create_service(backend, TransferWorkerConfig(workers=1))
+    workers = service.transfer_workers
+    assert workers is not None
+    api_key, addresses = wallets(service)
+    request = MakeTransactionRequest(
+        api_key, addresses[0], addresses[1], 1000, idempotency_key="k"
+    )
+
+    first = service.submit_transaction(request)
+    second = service.submit_transaction(request)
+    assert first.job is not None and second.job is not None
+    assert first.job.job_id == second.job.job_id
+    reused = service.submit_transaction(
+        MakeTransactionRequest(
+            api_key, addresses[0], addresses[1], 2000, idempotency_key="k"
+        )
+    )
+    assert reused.status_code == 422
+
+    assert workers.run_once() == 1
+    # a synchronous retry under the key is answered from the queued transfer
+    assert service.make_transaction(request).status_code == 200
+    response = service.get_transactions(api_key)
+    assert response.transactions is not None
+    assert len(response.transactions) == 1
+
+
+def test_should_keep_job_keys_apart_from_client_keys(backend: IRepository) -> None:
+    service = create_service(backend, TransferWorkerConfig(workers=1))
+    workers = service.transfer_workers
+    assert workers is not None
+    api_key, addresses = wallets(service)
+    job = service.submit_transaction(
+        MakeTransactionRequest(api_key, addresses[0], addresses[1], 1000)
+    ).job
+    assert job is not None and job.job_id is not None
+
+    # a client key that looks like a job's is just another key
+    response = service.make_transaction(
+        MakeTransactionRequest(
+            api_key,
+            addresses[0],
+            addresses[1],
+            2000,
+            idempotency_key=f"transfer-job-{job.job_id}",
+        )
+    )
+    assert response.status_code == 200
+    # and the prefix of job keys is refused
+    request = MakeTransactionRequest(
+        api_key,
+        addresses[0],
+        addresses[1],
+        3000,
+        idempotency_key=f"{JOB_KEY_PREFIX}{job.job_id}",
+    )
+    assert service.make_transaction(request).status_code == 400
+    assert service.submit_transaction(request).status_code == 400
+
+    assert workers.run_once() == 1
+    done = service.get_transfer_job(api_key, job.job_id).job
+    assert done is not None and done.status_code == 200
+    response = service.get_transactions(api_key)
+    assert response.transactions is not None
+    assert sorted(t.amount_sat for t in response.transactions) == [1000, 2000]
+
+
+def test_should_not_transfer_twice_when_a_lease_runs_out(
+    backend: IRepository,
+) -> None:
+    # every claim has run out as soon as it is made
+    service = create_service(
+        backend, TransferWorkerConfig(workers=1, lease_seconds=-1.0)
+    )
+    workers = service.transfer_workers
+    assert workers is not None
+    api_key, addresses = wallets(service)
+    service.submit_transaction(
+        MakeTransactionRequest(api_key, addresses[0], addresses[1], 10_000_000)
+    )
+
+    # a worker that transferred and died before storing the outcome
+    jobs = backend.claim_transfer_jobs(1, -1.0)
+    assert len(jobs) == 1
+    assert service.make_transactions([job_request(jobs[0])])[0].status_code == 200
+
+    assert workers.run_once() == 1
+    job = service.get_transfer_job(api_key, jobs[0].job_id or 0).job
+    assert job is not None
+    assert job.status == JOB_DONE
+    assert job.status_code == 200
+    response = service.get_transactions(api_key)
+    assert response.transactions is not None
+    assert len(response.transactions) == 1
+    assert workers.run_once() == 0
+
+
+def test_should_run_jobs_on_worker_threads(backend: IRepository) -> None:
+    service = create_service(
+        backend, TransferWorkerConfig(workers=3, batch_size=4, poll_interval=0.01)
+    )
+    workers = service.transfer_workers
+    assert workers is not None
+    api_key, addresses = wallets(service)
+
+    workers.start()
+    job_ids = []
+    for _ in range(20):
+        job = service.submit_transaction(
+            MakeTransactionRequest(api_key, addresses[0], addresses[1], 1000)
+        ).job
+        assert job is not None and job.job_id is not None
+        job_ids.append(job.job_id)
+    workers.stop()
+    # whatever was left when the threads stopped
+    while workers.run_once():
+        pass
+
+    jobs = [service.get_transfer_job(api_key, job_id).job for job_id in job_ids]
+    assert [job.status_code for job in jobs if job is not None] == [200] * 20
+    wallet = service.get_wallet(GetWalletRequest(api_key, addresses[1])).wallet_info
+    assert wallet is not None
+    assert wallet.balance_sat == DEFAULT_INITIAL_BALANCE + 20 * 1000
+
+
+def test_should_reject_empty_pools() -> None:
+    with pytest.raises(ValueError):
+        TransferWorkerConfig(workers=0)
+    with pytest.raises(ValueError):
+        TransferWorkerConfig(batch_size=0)
+
+
+def test_should_serve_transfer_jobs() -> None:
+    with TestClient(
+        setup(TEST_DB_NAME, rate_provider=StubExchangeRateProvider())
+    ) as client:
+        api_key = client.post("/users", params={"email": "test"}).json()["api_key"]
+        addresses = [
+            client.post("/wallets", params={"api_key": api_key}).json()["wallet_info"][
+                "wallet_address"
+            ]
+            for _ in range(2)
+        ]
+        params = {
+            "api_key": api_key,
+            "wallet_address_from": addresses[0],
+            "wallet_address_to": addresses[1],
+            "btc_amount": 0.1,
+        }
+        headers = {"Idempotency-Key": "transfer-1"}
+        for _ in range(2):
+            response = client.post("/transactions", params=params, headers=headers)
+            assert response.json()["status_code"] == 200
+
+        queued = client.post(
+            "/transactions", params={**params, "asynchronous": "true"}
+        ).json()
+        assert queued["status_code"] == 202
+        assert queued["job_status"] == JOB_QUEUED
+        job_id = queued["job_id"]
+
+        path = f"/transactions/jobs/{job_id}"
+        response = client.get(path, params={"api_key": "nobody"})
+        assert response.json()["status_code"] == 404
+        for _ in range(500):
+            job = client.get(path, params={"api_key": api_key}).json()
+            if job["job_status"] == JOB_DONE:
+                break
+            time.sleep(0.01)
+        assert job["result"]["status_code"] == 200
+
+        response = client.get("/transactions", params={"api_key": api_key}).json()
+        assert len(response["transactions"]) == 2
+    os.remove(TEST_DB_NAME)
@@ -0,0 +1,82 @@
+import os
+from typing import Generator, List
+
+import pytest
+
+from app.core.entities import UserInfo, Wallet
+from app.core.exchange_rate import StubExchangeRateProvider
+from app.core.transaction.transaction_CoR import MakeTransactionRequest
+from app.core.transaction.transaction_interactor import TransactionInteractor
+from app.core.unit_of_work import UnitOfWorkStats, WalletUnitOfWork
+from app.core.wallet.wallet_interactor import AddWalletRequest, WalletInteractor
+from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
+from tests.test_sqlite_repository import TEST_DB_NAME
+
+USER = UserInfo(api_key="key", email="email")
+
+
+def test_should_serve_repeat_lookups_from_memory(
+    repository: SQLiteRepository,
+) -> None:
+    unit_of_work = WalletUnitOfWork(repository)
+    wallet = unit_of_work.get_wallet("a")
+    assert wallet is not None
+
+    assert unit_of_work.get_wallet("a") is wallet
+    assert unit_of_work.get_wallet_user(wallet) == USER
+    assert unit_of_work.get_user(USER.api_key) is unit_of_work.get_wallet_user(wallet)
+    assert unit_of_work.get_user_wallets(USER)[0] is wallet
+    assert unit_of_work.stats == UnitOfWorkStats(hits=3, misses=3, flushed=0)
+
+
+def test_should_stage_new_wallets_until_commit(repository: SQLiteRepository) -> None:
+    unit_of_work = WalletUnitOfWork(repository)
+    unit_of_work.add_wallet(Wallet("c", 100), USER)
+
+    assert unit_of_work.get_wallet("c") == Wallet("c", 100)
+    assert repository.get_wallet("c") is None
+
+    unit_of_work.commit()
+    assert repository.get_wallet("c") == Wallet("c", 100)
+    assert unit_of_work.stats.flushed == 1
+
+
+def test_should_report_saved_lookups_per_call(repository: SQLiteRepository) -> None:
+    stats: List[UnitOfWorkStats] = []
+    transactions = TransactionInteractor(
+        repository, StubExchangeRateProvider(), on_stats=stats.append
+    )
+    wallets = WalletInteractor(
+        repository, StubExchangeRateProvider(), on_stats=stats.append
+    )
+
+    response = transactions.make_transaction(
+        MakeTransactionRequest(USER.api_key, "a", "b", 25)
+    )
+    assert response.status_code == 200
+    # the caller owns wallet "a", so its api key lookup is a hit, and so
+    # are both wallet reads of the staged transfer
+    assert stats[-1] == UnitOfWorkStats(hits=3, misses=4, flushed=1)
+
+    response = wallets.add_wallet(AddWalletRequest(USER.api_key))
+    assert response.status_code == 200
+    assert stats[-1].hits == 3
+    assert stats[-1].flushed == 1
+
+    responses = transactions.make_transactions(
+        [MakeTransactionRequest(USER.api_key, "a", "b", 25)] * 4
+    )
+    assert [r.status_code for r in responses] == [200, 200, 200, 402]
+    assert stats[-1].misses == 4
+    assert stats[-1].flushed == 3
+
+
+@pytest.fixture
+def repository() -> Generator[SQLiteRepository, None, None]:
+    repository = SQLiteRepository(db_name=TEST_DB_NAME)
+    repository.register_user(USER)
+    repository.add_wallet(Wallet("a", 100), USER)
+    repository.add_wallet(Wallet("b", 100), USER)
+    yield repository
+    repository.close()
+    os.remove(TEST_DB_NAME)
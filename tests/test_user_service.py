@@ -1,12 +1,9 @@
-import os
-from typing import Generator
-
 import pytest
 
+from app.core.exchange_rate import StubExchangeRateProvider
 from app.core.facade import BTCWalletService
 from app.core.user.user_interactor import RegisterUserRequest
-from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
-from tests.test_sqlite_repository import TEST_DB_NAME
+from app.runner.setup import IRepository
 
 
 def test_create_user(service: BTCWalletService) -> None:
@@ -41,11 +38,11 @@ def test_user_initialization(service: BTCWalletService) -> None:
 
 
 @pytest.fixture
-def service() -> Generator[BTCWalletService, None, None]:
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
-
-    repository = SQLiteRepository(db_name=TEST_DB_NAME)
-    yield BTCWalletService.create(repository, repository, repository, repository)
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
+def service(backend: IRepository) -> BTCWalletService:
+    return BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+    )
@@ -1,8 +1,6 @@
-import os
-from typing import Generator
-
 import pytest
 
+from app.core.exchange_rate import StubExchangeRateProvider
 from app.core.facade import BTCWalletService
 from app.core.transaction.transaction_CoR import MakeTransactionRequest
 from app.core.user.user_interactor import RegisterUserRequest
@@ -12,8 +10,7 @@ from app.core.wallet.wallet_interactor import (
     FetchWalletTransactionsRequest,
     GetWalletRequest,
 )
-from app.infrastructure.sqlite.sqlite_repository import SQLiteRepository
-from tests.test_sqlite_repository import TEST_DB_NAME
+from app.runner.setup import IRepository
 
 
 def test_add_wallet_invalid_credentials(service: BTCWalletService) -> None:
@@ -45,8 +42,8 @@ def test_add_wallet_success(service: BTCWalletService) -> None:
     assert response.status_code == 200
     assert response.wallet_info is not None
     assert response.wallet_info.wallet_address is not None
-    assert response.wallet_info.btc_balance is not None
-    assert response.wallet_info.btc_balance == DEFAULT_INITIAL_BALANCE
+    assert response.wallet_info.balance_sat is not None
+    assert response.wallet_info.balance_sat == DEFAULT_INITIAL_BALANCE
     assert response.wallet_info.usd_balance is not None
 
 
@@ -76,8 +73,8 @@ def test_get_wallet_initial_wallet(service: BTCWalletService) -> None:
     assert response.status_code == 200
     assert response.wallet_info is not None
     assert response.wallet_info.wallet_address is not None
-    assert response.wallet_info.btc_balance is not None
-    assert response.wallet_info.btc_balance == DEFAULT_INITIAL_BALANCE
+    assert response.wallet_info.balance_sat is not None
+    assert response.wallet_info.balance_sat == DEFAULT_INITIAL_BALANCE
     assert response.wallet_info.usd_balance is not None
 
 
@@ -114,13 +111,13 @@ def test_get_wallet_transactions_with_transactions(service: BTCWalletService) ->
     assert wallet_response.wallet_info is not None
     wallet_address_2 = wallet_response.wallet_info.wallet_address
 
-    btc_amount = 0.1
+    amount_sat = 10_000_000
     make_transaction_response = service.make_transaction(
         MakeTransactionRequest(
             api_key=api_key,
             wallet_address_from=wallet_address_1,
             wallet_address_to=wallet_address_2,
-            btc_amount=btc_amount,
+            amount_sat=amount_sat,
         )
     )
     assert make_transaction_response.success is True
@@ -133,7 +130,7 @@ def test_get_wallet_transactions_with_transactions(service: BTCWalletService) ->
     assert response.status_code == 200
     assert response.transactions is not None
     assert len(response.transactions) == 1
-    assert response.transactions[0].btc_amount == btc_amount
+    assert response.transactions[0].amount_sat == amount_sat
     assert response.transactions[0].wallet_address_from == wallet_address_1
     assert response.transactions[0].wallet_address_to == wallet_address_2
 
@@ -144,17 +141,17 @@ def test_get_wallet_transactions_with_transactions(service: BTCWalletService) ->
     assert response.status_code == 200
     assert response.transactions is not None
     assert len(response.transactions) == 1
-    assert response.transactions[0].btc_amount == btc_amount
+    assert response.transactions[0].amount_sat == amount_sat
     assert response.transactions[0].wallet_address_from == wallet_address_1
     assert response.transactions[0].wallet_address_to == wallet_address_2
 
 
 @pytest.fixture
-def service() -> Generator[BTCWalletService, None, None]:
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
-
-    repository = SQLiteRepository(db_name=TEST_DB_NAME)
-    yield BTCWalletService.create(repository, repository, repository, repository)
-    if os.path.exists(TEST_DB_NAME):
-        os.remove(TEST_DB_NAME)
+def service(backend: IRepository) -> BTCWalletService:
+    return BTCWalletService.create(
+        backend,
+        backend,
+        backend,
+        backend,
+        rate_provider=StubExchangeRateProvider(),
+    )